@@ -1,6 +1,6 @@
 #!src/Python-3.12.3/.localpython/bin/python3
 
-import os, cgi, cgitb, math
+import os, cgi, cgitb, math, subprocess
 cgitb.enable()
 
 #form = cgi.FieldStorage()
@@ -13,6 +13,14 @@ for basename in os.listdir(dirname):
     if os.path.isdir(filename):
         dirpaths.append(filename)
 
+# Get the position of the queued projects in the job queue (this also starts the ones that fit in the free slots)
+queue_positions = {}
+proc = subprocess.Popen('src/Python-3.12.3/.localpython/bin/python3 config/job-queue.py list', shell=True, stdout=subprocess.PIPE)
+for line in proc.stdout.read().decode('utf-8').splitlines():
+    fields = line.split('\t')
+    if fields[1] == 'queued':
+        queue_positions[fields[0]] = fields[2]
+
 # Funtion to get directory size
 def get_size(start_path):
     total_size = 0
@@ -56,6 +64,9 @@ else:
 		except:
 			status='Status file not available'
 
+		if status == 'queued' and f[0] in queue_positions:
+			status = 'queued (position ' + queue_positions[f[0]] + ' in the job queue)'
+
 		if status != 'Status file not available':
 			print('''
 				<!-- <div style="background-color:#79e59d; border:solid green 1px; border-radius:5px; padding:10px;"> -->
@@ -98,12 +98,15 @@ if pid_easymap != 0:
 
 # Append 'status: killed' to status file
 with open('./user_projects/'+projectName+'/2_logs/status', 'a') as status_file:
-	status_file.write('status:killed')
+	status_file.write('status:killed\n')
 
 # Write to log
 log_file = './user_projects/'+projectName+'/2_logs/log.log'
 subprocess.call('echo $(date)": Project interrupted by the user." >> ' + log_file, shell=True)
 
+# Start the queued projects that fit in the slots freed by this one
+subprocess.call('src/Python-3.12.3/.localpython/bin/python3 config/job-queue.py schedule', shell=True, stdout=subprocess.DEVNULL)
+
 
 
 
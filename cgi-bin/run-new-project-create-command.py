@@ -38,4 +38,6 @@ print(processedCmdString)
 # For testing only
 #cmdString = './easymap.sh test ins sim nano pbinprok2.fa complete.gff TAIR10_gene_info.txt n/p n/p n/p se n/p n/p n/p se n/p n/p n/p n/p 1+li n/p 10+100,0+500,100+1+50+se n/p'
 
-subprocess.Popen(processedCmdString, cwd=r'./', shell=True, stdout=subprocess.PIPE)
+# The project is added to the job queue, which starts it when there are free slots for it (config/config)
+queueCmdString = 'src/Python-3.12.3/.localpython/bin/python3 config/job-queue.py submit ' + processedCmdString.split(' ', 1)[1]
+subprocess.call(queueCmdString, cwd=r'./', shell=True, stdout=subprocess.DEVNULL)
@@ -35,9 +35,9 @@ n = 0
 with open("./config") as con_file:
 	for lines in con_file:
 		n += 1
-		if lines[:5] == "user_":
+		if lines.startswith("user_projects-size-limit:"):
 			size_limit = lines.rstrip().split(":")[1]
-		if lines[:3] == "max":
+		if lines.startswith("max-simultaneous-jobs:"):
 			simultaneous_limit = lines.rstrip().split(":")[1]
 
 # Check whether it is possible to keep running the project
@@ -0,0 +1,237 @@
+#
+# This script keeps the queue of projects of easymap (user_projects/.job-queue.json). New projects are not
+# started right away: they are added to the queue and started when there are free slots for them, so
+# projects submitted at the same time from the command line and the web interface do not overload the
+# machine and no project is rejected because too many are running.
+#
+# Actions:
+#	submit		Create the folder of a new project with status 'queued', add it to the queue and start the
+#				projects that fit. The arguments of easymap.sh are given after the action, and the priority
+#				and memory (gigabytes, memory-per-project by default) of the project before it:
+#				job-queue.py -priority 1 -memory 8 submit <arguments of easymap.sh>. Prints the folder of
+#				the project.
+#				With job-queue.py -project <project folder> submit (no arguments of easymap.sh), the project
+#				is an existing one that is resumed (easymap.sh resume): it keeps its folder and the arguments
+#				it was created with, and it is queued like a new project.
+#	schedule	Remove from the queue the projects that have finished, failed, been stopped or removed, and
+#				start the queued projects that fit in the free slots. Run by easymap.sh when a project ends
+#				and by the web interface when a project is stopped.
+#	list		Like schedule, and then print one line per project in the queue: folder, state, position in
+#				the queue (0 if running), priority, CPUs and gigabytes of memory.
+#
+# Slots (config/config):
+#	max-simultaneous-jobs	projects running at the same time (0 = no limit)
+#	queue-cpu-slots			CPUs shared by the running projects. Each project takes as many as threads it
+#							uses (0 = all the CPUs of the machine)
+#	queue-memory-slots		gigabytes of memory shared by the running projects (0 = all the memory of the machine)
+#	memory-per-project		gigabytes taken by each running project, unless it was submitted with -memory
+# Queued projects are started by priority (higher first) and, with the same priority, in the order they
+# were submitted. When the first project in the queue does not fit in the free slots, the projects behind
+# it wait too, so a big project is not delayed forever by smaller ones. A project that asks for more than
+# the total slots is given the total, so it can always run on its own.
+#
+# Queued projects are started with './easymap.sh start <project folder>' in their own session ('./easymap.sh
+# start <project folder> resume' for resumed projects), and the output of easymap.sh is written to
+# 2_logs/easymap.out.
+#
+
+import argparse, os, sys, json, fcntl, time, subprocess
+
+parser = argparse.ArgumentParser()
+parser.add_argument('action', choices=set(('submit','schedule','list')))
+parser.add_argument('-priority', action="store", dest='priority', type=int, default=0)
+parser.add_argument('-memory', action="store", dest='memory', type=float)
+parser.add_argument('-project', action="store", dest='project')
+parser.add_argument('command', nargs=argparse.REMAINDER)
+args = parser.parse_args()
+
+# Paths are relative to the easymap folder, wherever the script is run from
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+queue_file = 'user_projects/.job-queue.json'
+lock_file = 'user_projects/.job-queue.lock'
+finished_states = set(('finished', 'error', 'killed'))
+
+def read_config():
+	config = {}
+	with open('config/config') as con_file:
+		for line in con_file:
+			if not line.startswith('#') and ':' in line:
+				key, value = line.rstrip().split(':', 1)
+				config[key.strip()] = value.strip()
+	return config
+
+def config_number(config, key, default):
+	try:
+		return float(config[key])
+	except (KeyError, ValueError):
+		return default
+
+def total_memory_gb():
+	with open('/proc/meminfo') as meminfo:
+		for line in meminfo:
+			if line.startswith('MemTotal:'):
+				return float(line.split()[1]) / 1048576
+	return 0
+
+# Slots of the machine and of each project
+def get_slots(config):
+	max_threads = int(config_number(config, 'max-threads-per-project', 1)) or os.cpu_count()
+	slots = {
+		'jobs': int(config_number(config, 'max-simultaneous-jobs', 0)),
+		'cpu': int(config_number(config, 'queue-cpu-slots', 0)) or os.cpu_count(),
+		'memory': config_number(config, 'queue-memory-slots', 0) or total_memory_gb(),
+		'memory_per_project': config_number(config, 'memory-per-project', 4),
+		'max_threads': max_threads}
+	return slots
+
+# Threads of a project, as easymap.sh sets them: argument [24] can lower the maximum, but never exceed it
+def project_threads(command, slots):
+	threads = command[23] if len(command) > 23 else ''
+	if not threads.isdigit() or int(threads) == 0 or int(threads) > slots['max_threads']:
+		return slots['max_threads']
+	return int(threads)
+
+def load_queue():
+	if os.path.isfile(queue_file):
+		with open(queue_file) as fp:
+			try:
+				return json.load(fp)
+			except ValueError:
+				pass
+	return {'seq': 0, 'jobs': []}
+
+def save_queue(queue):
+	with open(queue_file + '.tmp', 'w') as fp:
+		json.dump(queue, fp, indent=1, sort_keys=True)
+	os.chmod(queue_file + '.tmp', 0o666)
+	os.rename(queue_file + '.tmp', queue_file)
+
+# Last status of a project, or None if its folder or its status file do not exist
+def project_status(folder):
+	status = None
+	try:
+		with open(folder + '/2_logs/status') as status_file:
+			for line in status_file:
+				if line.startswith('status:'):
+					status = line.split(':')[1].strip()
+	except (IOError, OSError):
+		return None
+	return status
+
+def easymap_alive(pid):
+	try:
+		with open('/proc/' + str(pid) + '/cmdline') as fp:
+			return 'easymap.sh' in fp.read()
+	except (IOError, OSError):
+		return False
+
+def start_job(job):
+	with open(os.devnull) as devnull, open(job['folder'] + '/2_logs/easymap.out', 'w') as out:
+		proc = subprocess.Popen(['./easymap.sh', 'start', job['folder']] + (['resume'] if job.get('resume') else []), stdin=devnull, stdout=out, stderr=subprocess.STDOUT, start_new_session=True)
+	job['state'] = 'running'
+	job['pid'] = proc.pid
+	job['started'] = time.time()
+
+def schedule(queue, slots):
+	jobs = []
+	for job in queue['jobs']:
+		status = project_status(job['folder'])
+		if status is None or status in finished_states:
+			continue
+		if job['state'] == 'running' and not easymap_alive(job['pid']):
+			continue
+		jobs.append(job)
+	queue['jobs'] = jobs
+
+	running = [job for job in jobs if job['state'] == 'running']
+	free_jobs = slots['jobs'] - len(running) if slots['jobs'] > 0 else len(jobs)
+	free_cpu = slots['cpu'] - sum(min(job['cpu'], slots['cpu']) for job in running)
+	free_memory = slots['memory'] - sum(min(job['memory'], slots['memory']) for job in running)
+	for job in queued_jobs(jobs):
+		cpu = min(job['cpu'], slots['cpu'])
+		memory = min(job['memory'], slots['memory'])
+		if free_jobs < 1 or cpu > free_cpu or memory > free_memory:
+			break
+		start_job(job)
+		free_jobs -= 1
+		free_cpu -= cpu
+		free_memory -= memory
+
+def queued_jobs(jobs):
+	return sorted((job for job in jobs if job['state'] == 'queued'), key=lambda job: (-job['priority'], job['seq']))
+
+def submit(queue, slots):
+	command = args.command
+	if command and command[0] == '--':
+		command = command[1:]
+	if args.project:
+		return submit_resume(queue, slots)
+	if not command:
+		sys.exit('No arguments of easymap.sh were given.')
+	# Same folder name as easymap.sh gives to new projects
+	folder = 'user_projects/' + time.strftime('%Y-%m-%d-%H:%M:%S') + '_' + command[0]
+	while os.path.exists(folder):
+		time.sleep(1)
+		folder = 'user_projects/' + time.strftime('%Y-%m-%d-%H:%M:%S') + '_' + command[0]
+	for subfolder in ('', '/1_intermediate_files', '/2_logs', '/3_workflow_output'):
+		os.mkdir(folder + subfolder)
+	with open(folder + '/2_logs/command', 'w') as fp:
+		fp.write(' '.join(command) + '\n')
+	with open(folder + '/2_logs/status', 'w') as fp:
+		fp.write('status:queued\n')
+	os.chmod(folder + '/2_logs/status', 0o666)
+	with open(folder + '/2_logs/log.log', 'w') as fp:
+		fp.write(time.strftime('%Y-%m-%d > %H:%M:%S') + ': Project {' + folder + '} queued.\n')
+	add_job(queue, slots, folder, command, False)
+	return folder
+
+# Existing project that is resumed. easymap.sh has already checked that it can be resumed
+def submit_resume(queue, slots):
+	folder = 'user_projects/' + os.path.basename(args.project.rstrip('/'))
+	if not os.path.isfile(folder + '/2_logs/command'):
+		sys.exit('Project ' + args.project + ' cannot be resumed: its command file (2_logs/command) could not be found.')
+	if any(job['folder'] == folder and project_status(folder) not in finished_states for job in queue['jobs']):
+		sys.exit('Project ' + args.project + ' is already in the job queue.')
+	with open(folder + '/2_logs/command') as fp:
+		command = fp.read().split()
+	with open(folder + '/2_logs/status', 'a') as fp:
+		fp.write('status:queued\n')
+	with open(folder + '/2_logs/log.log', 'a') as fp:
+		fp.write('\n' + time.strftime('%Y-%m-%d > %H:%M:%S') + ': Project {' + folder + '} queued to be resumed.\n')
+	add_job(queue, slots, folder, command, True)
+	return folder
+
+def add_job(queue, slots, folder, command, resume):
+	queue['seq'] += 1
+	queue['jobs'].append({
+		'folder': folder,
+		'seq': queue['seq'],
+		'priority': args.priority,
+		'cpu': project_threads(command, slots),
+		'memory': args.memory if args.memory is not None else slots['memory_per_project'],
+		'resume': resume,
+		'state': 'queued',
+		'pid': 0,
+		'submitted': time.time()})
+
+if not os.path.isdir('user_projects'):
+	os.mkdir('user_projects')
+
+with open(lock_file, 'a') as lock:
+	fcntl.flock(lock, fcntl.LOCK_EX)
+	if os.stat(lock_file).st_uid == os.getuid():
+		os.chmod(lock_file, 0o666)
+	slots = get_slots(read_config())
+	queue = load_queue()
+	if args.action == 'submit':
+		folder = submit(queue, slots)
+	schedule(queue, slots)
+	save_queue(queue)
+
+if args.action == 'submit':
+	print(folder)
+
+if args.action == 'list':
+	positions = dict((job['folder'], position + 1) for position, job in enumerate(queued_jobs(queue['jobs'])))
+	for job in queue['jobs']:
+		print('%s\t%s\t%d\t%d\t%d\t%g' % (job['folder'], job['state'], positions.get(job['folder'], 0), job['priority'], job['cpu'], job['memory']))
@@ -26,6 +26,13 @@
 # [21] $sim_recsel										.                      rfd+pos+mod+nre
 # [22] $sim_seq											.                      rd+rl+fl+ber+gbs
 # [23] $stringency
+# [24] $threads (optional)								.                      Number of threads, limited by config/config
+#
+# A project that did not finish (error, killed process, full disk...) can be resumed with:
+#  ./easymap.sh resume <project folder>
+# The project is submitted to the job queue (config/job-queue.py) and, when there are free slots for it,
+# run again in its folder with the arguments it was created with. The stages whose inputs and outputs
+# have not changed are skipped (see workflows/stages.sh).
 
 # sim-mut.py
 # nbr:		${20}[0]
@@ -67,10 +74,73 @@ source src/virtualenv-20.28.0/easymap-env/bin/activate
 # Obtain and store date and time in format with no spaces
 timestamp=$(date "+%F-%T")
 
+# The stages run by each execution of a project are told apart in 2_logs/metrics.jsonl by this value
+export stage_execution=$timestamp
+
+############################################################
+# A project that is resumed is checked and submitted to the job queue, which starts it with 'start <project folder> resume'
+resume=0
+if [ "$1" == 'resume' ]; then
+	resume_project=user_projects/$(basename "$2")
+	if ! [ -f $resume_project/2_logs/command ]; then
+		echo "Project $2 cannot be resumed: its folder or its command file (2_logs/command) could not be found."
+		exit
+	fi
+	resume_status=$(grep '^status:' $resume_project/2_logs/status | tail -1)
+	if [ "$resume_status" == 'status:finished' ]; then
+		echo "Project $2 finished correctly, there is nothing to resume."
+		exit
+	fi
+	# Two workflows must not write in the same folder: a project can be resumed if it ended with an error, if it was
+	# stopped, or if the easymap process that ran it is not alive anymore (the machine was restarted, the process was killed...)
+	case "$resume_status" in
+		status:error*|status:killed*) ;;
+		status:queued*)
+			echo "Project $2 cannot be resumed: it is waiting in the job queue."
+			exit
+			;;
+		*)
+			resume_pid=$(grep '^pid easymap' $resume_project/2_logs/status | tail -1 | cut -d' ' -f3)
+			if [ -z "$resume_pid" ] || ps -p $resume_pid -o args= 2> /dev/null | grep -q easymap; then
+				echo "Project $2 cannot be resumed: it is still running or waiting in the job queue."
+				exit
+			fi
+			;;
+	esac
+	python3 config/job-queue.py -project $resume_project submit > /dev/null || exit
+	echo "Project $2 has been submitted to the job queue to be resumed."
+	exit
+fi
+
+############################################################
+# Projects submitted to the job queue (config/job-queue.py) are started with 'start <project folder>'
+# when there are free slots for them. The queue has already created their folder and command file.
+# Resumed projects are started with 'start <project folder> resume': the arguments they were created
+# with are recovered, and the stages that have not changed are skipped
+queued=0
+if [ "$1" == 'start' ]; then
+	queued_project=user_projects/$(basename "$2")
+	if [ "$(grep '^status:' $queued_project/2_logs/status 2> /dev/null | tail -1)" != 'status:queued' ]; then
+		echo "Project $2 is not waiting in the job queue."
+		exit
+	fi
+	if [ "$3" == 'resume' ]; then
+		rm -f $queued_project/2_logs/resume_stale
+		resume=1
+		export stage_resume=1
+	fi
+	set -- $(cat $queued_project/2_logs/command)
+	queued=1
+fi
+
+# When the project ends (correctly or not), start the queued projects that fit in the slots it frees
+trap 'python3 config/job-queue.py schedule > /dev/null 2>&1' EXIT
+
 ############################################################
 # Get command arguments and assign them to variables
 
 project_name=user_projects/$timestamp"_"$1
+if [ $queued == 1 ]; then project_name=$queued_project; fi
 workflow=$2
 data_source=$3
 ref_seq=$4
@@ -93,6 +163,7 @@ sim_mut=${20}
 sim_recsel=${21}
 sim_seq=${22}
 stringency=${23}
+threads=${24}
 
 ############################################################
 # Several necessary checking/preparation steps before actually running easymap
@@ -114,11 +185,13 @@ f1=1_intermediate_files
 f2=2_logs
 f3=3_workflow_output
 
-# Create project folder and subfolders
-mkdir $project_name
-mkdir $project_name/$f1
-mkdir $project_name/$f2
-mkdir $project_name/$f3
+# Create project folder and subfolders. Resumed and queued projects keep their folders and files
+if [ $resume == 0 ] && [ $queued == 0 ]; then
+	mkdir $project_name
+	mkdir $project_name/$f1
+	mkdir $project_name/$f2
+	mkdir $project_name/$f3
+fi
 
 # Change permisssion so www-data can read and write in all folders of the project
 #chmod -R 777 $project_name
@@ -126,9 +199,14 @@ mkdir $project_name/$f3
 # Deprecated
 # Delete intermediate and final files from previous executions, For that, check whether dirs have any
 # have content (folders or files) and, if so, remove it
-[ "$(ls -A $project_name/$f1)" ] && rm --recursive $project_name/$f1/*
-[ "$(ls -A $project_name/$f2)" ] && rm --recursive $project_name/$f2/*
-[ "$(ls -A $project_name/$f3)" ] && rm --recursive $project_name/$f3/*
+if [ $resume == 0 ] && [ $queued == 0 ]; then
+	[ "$(ls -A $project_name/$f1)" ] && rm --recursive $project_name/$f1/*
+	[ "$(ls -A $project_name/$f2)" ] && rm --recursive $project_name/$f2/*
+	[ "$(ls -A $project_name/$f3)" ] && rm --recursive $project_name/$f3/*
+fi
+
+# Store the arguments of the project, needed to resume it
+[ $resume == 0 ] && [ $queued == 0 ] && echo "$@" > $project_name/$f2/command
 
 # Define path of log file and create it
 my_log_file=$project_name/$f2/log.log
@@ -138,6 +216,14 @@ touch $my_log_file
 my_status_file=$project_name/$f2/status
 touch $my_status_file
 chmod 666 $my_status_file
+
+# Set the number of threads for the multithreaded steps of the workflows. The maximum is read from
+# config/config (max-threads-per-project, 0 = all the CPUs of the machine). The optional argument
+# [24] can lower the number of threads used by the project, but never exceed the maximum
+max_threads=`grep '^max-threads-per-project:' config/config | cut -d':' -f2 | tr -d '[:space:]'`
+if ! [[ "$max_threads" =~ ^[0-9]+$ ]]; then max_threads=1; fi
+if [ $max_threads == 0 ]; then max_threads=`nproc`; fi
+if ! [[ "$threads" =~ ^[0-9]+$ ]] || [ $threads == 0 ] || [ $threads -gt $max_threads ]; then threads=$max_threads; fi
 echo 'status:running' >> $my_status_file
 echo 'pid easymap '$$ >> $my_status_file
 
@@ -154,11 +240,17 @@ fi
 ############################################################
 # Start easymap
 
-echo $(date "+%F > %T")": Execution of project {" $project_name "} started." > $my_log_file
+# The log of a resumed project keeps the messages of the previous executions
+if [ $resume == 0 ]; then
+	echo $(date "+%F > %T")": Execution of project {" $project_name "} started." > $my_log_file
+else
+	echo "" >> $my_log_file
+	echo $(date "+%F > %T")": Execution of project {" $project_name "} resumed." >> $my_log_file
+fi
 echo "" >> $my_log_file
 
 echo "Program:										" $0 >> $my_log_file
-echo "Project name:									" $timestamp"_"$1 >> $my_log_file
+echo "Project name:									" $(basename $project_name) >> $my_log_file
 echo "Workflow:										" $2 >> $my_log_file
 echo "Data source:									" $3 >> $my_log_file
 echo "Reference sequence:							" $4 >> $my_log_file
@@ -181,6 +273,7 @@ echo "Simulator (sim-mut.py) command:				" ${20} >> $my_log_file
 echo "Simulator (sim-recsel.py) command:			" ${21} >> $my_log_file
 echo "Simulator (sim-seq.py) command:				" ${22} >> $my_log_file
 echo "Stringency:									" ${23} >> $my_log_file
+echo "Threads:										" $threads >> $my_log_file
 
 echo "" >> $my_log_file
 echo "######################################################" >> $my_log_file
@@ -259,7 +352,7 @@ fi
 # Run the chosen analysis workflow
 
 if [ $workflow == 'ins' ]; then
-	workflow_result=`./workflows/workflow-ins.sh $my_log_file $project_name $workflow $data_source $lib_type_sample $ins_seq $read_s $read_f $read_r $gff_file $ann_file`
+	workflow_result=`./workflows/workflow-ins.sh $my_log_file $project_name $workflow $data_source $lib_type_sample $ins_seq $read_s $read_f $read_r $gff_file $ann_file $threads`
 
 	if [ $workflow_result == 0 ]; then
 		echo $(date "+%F > %T")": Analysis workflow finished correctly." >> $my_log_file
@@ -272,7 +365,7 @@ if [ $workflow == 'ins' ]; then
 fi
 
 if [ $workflow == 'snp' ]; then
-	workflow_result=`./workflows/workflow-snp.sh $my_log_file $project_name $workflow $data_source $lib_type_sample $ins_seq $read_s $read_f $read_r $gff_file $ann_file $read_s_ctrl $read_f_ctrl $read_r_ctrl $cross_type $is_ref_strain $control_parental $snp_analysis_type $lib_type_ctrl $stringency`
+	workflow_result=`./workflows/workflow-snp.sh $my_log_file $project_name $workflow $data_source $lib_type_sample $ins_seq $read_s $read_f $read_r $gff_file $ann_file $read_s_ctrl $read_f_ctrl $read_r_ctrl $cross_type $is_ref_strain $control_parental $snp_analysis_type $lib_type_ctrl $stringency $threads`
 
 	if [ $workflow_result == 0 ]; then
 		echo $(date "+%F > %T")": Analysis workflow finished correctly." >> $my_log_file
@@ -1,8 +1,11 @@
 # This script contains the functions used for drawing the programs output images. The functions are called from graphic-output.py when they are needed. 
 
-import argparse, math
+import argparse, math, os, sys
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 from io import BytesIO
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import stage_cache, va_store
 
 #Common arguments
 parser = argparse.ArgumentParser()
@@ -63,40 +66,23 @@ args = parser.parse_args()
 def fa_vs_pos():
     #Input 1
     input1 = args.input_snp
-    f1 = open(input1, 'r')
-    lines = f1.readlines()	
+    table = va_store.load(input1)
 
     #Input 2
-    input2 = args.input_f_snp
-    f2 = open(input2, 'r')
-    lines_f = f2.readlines()	
     contig_source = args.input_f_snp
 
 
-    # Function to parse fasta file (based on one of the Biopython IOs)
-    def read_fasta(fp):
-        name, seq = None, []
-        for line in fp:
-            line = line.rstrip()
-            if line.startswith('>'):
-                if name: yield (name, ''.join(seq))
-                name, seq = line, []
-            else:
-                seq.append(line)
-        if name: yield (name, ''.join(seq))
-
 
-    # Read contig fasta file
+    # Read contig lengths from the genome manifest
     contig_lengths = list()
 
-    with open(contig_source) as fp:
-        fastalist = list()
-        for name_contig, seq_contig in read_fasta(fp):
-            innerlist = list()
-            innerlist.append(name_contig.strip('>'))
-            innerlist.append(len(seq_contig))
-            fastalist.append(innerlist)
-            contig_lengths.append(len(seq_contig))
+    fastalist = list()
+    for name_contig, length_contig in stage_cache.fasta_lengths(contig_source):
+        innerlist = list()
+        innerlist.append(name_contig)
+        innerlist.append(length_contig)
+        fastalist.append(innerlist)
+        contig_lengths.append(length_contig)
 
     max_contig_len = 0
     for i in contig_lengths:
@@ -192,13 +178,16 @@ def fa_vs_pos():
             if args.my_mut == 'af_control':
                 r, g, b = 245, 120, 44
 
-            for l, line in enumerate(lines):
-                sp = line.split()
-                if i[0].lower() == sp[0].lower() :
-                    fa = float(sp[6])/(float(sp[6])+float(sp[5]))
-                    fa_img = int(80/100.0*height) - int(fa/scaling_factor_y) - 1
-                    pos_img = int(int(sp[1])/scaling_factor_x) + 70
-                    draw.ellipse((pos_img-2, fa_img-2, pos_img+2, fa_img+2), fill=(r, g, b))
+            # Variants of the contig (names compared without case) and their allele frequencies
+            codes = [code for code, name in enumerate(table.chroms) if name.lower() == i[0].lower()]
+            rows = np.isin(table.chrom, codes)
+            positions = table.pos[rows].tolist()
+            depths = table.depths[rows].astype(float)
+
+            for pos, fa in zip(positions, (depths[:, 1]/(depths[:, 1]+depths[:, 0])).tolist()):
+                fa_img = int(80/100.0*height) - int(fa/scaling_factor_y) - 1
+                pos_img = int(pos/scaling_factor_x) + 70
+                draw.ellipse((pos_img-2, fa_img-2, pos_img+2, fa_img+2), fill=(r, g, b))
 
             if args.my_snp_analysis_type == 'f2wt' and args.my_mut == 'snp':
                 
@@ -244,19 +233,15 @@ def fa_vs_pos():
 
 
                 #Mapping variants
-                for l, line in enumerate(lines):
-                    sp = line.split()
-                    if i[0].lower() == sp[0].lower():
-                        #f2 mut
-                        fa = float(sp[8])/(float(sp[8])+float(sp[7]))
-                        fa_img = int(80/100.0*height) - int(fa/scaling_factor_y)
-                        pos_img = int(int(sp[1])/scaling_factor_x) + int(70)
-                        draw.ellipse((pos_img-2, fa_img-2, pos_img+2, fa_img+2), fill=(245, 120, 44)) 
-                        #f2wt snps
-                        fa = float(sp[6])/(float(sp[6])+float(sp[5]))
-                        fa_img = int(80/100.0*height) - int(fa/scaling_factor_y) - 1
-                        pos_img = int(int(sp[1])/scaling_factor_x) + 70
-                        draw.ellipse((pos_img-2, fa_img-2, pos_img+2, fa_img+2), fill=(31, 120, 180))
+                for pos, fa_mut, fa_wt in zip(positions, (depths[:, 3]/(depths[:, 3]+depths[:, 2])).tolist(), (depths[:, 1]/(depths[:, 1]+depths[:, 0])).tolist()):
+                    #f2 mut
+                    fa_img = int(80/100.0*height) - int(fa_mut/scaling_factor_y)
+                    pos_img = int(pos/scaling_factor_x) + int(70)
+                    draw.ellipse((pos_img-2, fa_img-2, pos_img+2, fa_img+2), fill=(245, 120, 44)) 
+                    #f2wt snps
+                    fa_img = int(80/100.0*height) - int(fa_wt/scaling_factor_y) - 1
+                    pos_img = int(pos/scaling_factor_x) + 70
+                    draw.ellipse((pos_img-2, fa_img-2, pos_img+2, fa_img+2), fill=(31, 120, 180))
 
 
             my_cross = str(args.my_cross)
@@ -466,30 +451,17 @@ def candidates_zoom():
     contig_source = args.input_f_snp
 
 
-    # Function to parse fasta file (based on one of the Biopython IOs)
-    def read_fasta(fp):
-        name, seq = None, []
-        for line in fp:
-            line = line.rstrip()
-            if line.startswith('>'):
-                if name: yield (name, ''.join(seq))
-                name, seq = line, []
-            else:
-                seq.append(line)
-        if name: yield (name, ''.join(seq))
-
 
-    # Read contig fasta file
+    # Read contig lengths from the genome manifest
     contig_lengths = list()
 
-    with open(contig_source) as fp:
-        fastalist = list()
-        for name_contig, seq_contig in read_fasta(fp):
-            innerlist = list()
-            innerlist.append(name_contig.strip('>'))
-            innerlist.append(len(seq_contig))
-            fastalist.append(innerlist)
-            contig_lengths.append(len(seq_contig))
+    fastalist = list()
+    for name_contig, length_contig in stage_cache.fasta_lengths(contig_source):
+        innerlist = list()
+        innerlist.append(name_contig)
+        innerlist.append(length_contig)
+        fastalist.append(innerlist)
+        contig_lengths.append(length_contig)
 
     for line in lines_map:
         if line.startswith('?'):
@@ -765,8 +737,7 @@ def insertions_overview_and_histograms():
 
     #Input 2
     finput = args.input_f
-    f2 = open(finput, 'r')
-    flines = f2.readlines()	
+    flines = ['>' + name_contig for name_contig, length_contig in stage_cache.fasta_lengths(finput)]
     #define a superlist with innerlists, each of them containing all the info of each contig 
     superlist = list()
 
@@ -787,29 +758,16 @@ def insertions_overview_and_histograms():
 
     contig_source = args.input_f
 
-    # Function to parse fasta file (based on one of the Biopython IOs)
-    def read_fasta(fp):
-        name, seq = None, []
-        for line in fp:
-            line = line.rstrip()
-            if line.startswith('>'):
-                if name: yield (name, ''.join(seq))
-                name, seq = line, []
-            else:
-                seq.append(line)
-        if name: yield (name, ''.join(seq))
-
     long_contigs=list()
-    # Read contig fasta file
-    with open(contig_source) as fp:
-        fastalist = list()
-        for name_contig, seq_contig in read_fasta(fp):
-            innerlist = list()
-            innerlist.append(name_contig.strip('>'))
-            innerlist.append(len(seq_contig))
-            if int(len(seq_contig)) > 700000:
-                fastalist.append(innerlist)
-                long_contigs.append(name_contig.strip('>').lower())
+    # Read contig lengths from the genome manifest
+    fastalist = list()
+    for name_contig, length_contig in stage_cache.fasta_lengths(contig_source):
+        innerlist = list()
+        innerlist.append(name_contig)
+        innerlist.append(length_contig)
+        if length_contig > 700000:
+            fastalist.append(innerlist)
+            long_contigs.append(name_contig.lower())
     try:
         max_list = list()
         for c in fastalist:
@@ -1395,13 +1353,11 @@ def gene_plot():
 
     #Input varanalyzer
     input = args.input_va
-    f3 = open(input, 'r')
-    lines_va = f3.readlines()	
+    lines_va = stage_cache.text_lines(input)
 
     #Input gff
     input = args.gff
-    f4 = open(input, 'r')
-    lines_gff = f4.readlines()	
+    lines_gff = stage_cache.text_lines(input)
 
     # Function to parse fasta file (based on one of the Biopython IOs)
     def read_fasta(fp):
@@ -11,18 +11,22 @@ parser.add_argument('-out', action="store", dest = 'out', required = "True")
 args = parser.parse_args()
 
 
+#Histogram of the depths (without the positions with depth 0). The file is the histogram written by
+#scripts_snp/depth_measures_generation.py (depth, number of positions) or the output of samtools depth (contig, position, depth)
 def read_file(f):
 	dic = {}
 	with open(f,"r") as coverage_file:
 		for lines in coverage_file:
+			if lines.startswith("#"):
+				continue
 			lines = lines.rstrip()
 			column = lines.split("\t")
-			if int(column[2]) in dic:
-				if not int(column[2]) == 0:
-					dic[int(column[2])]+=1
+			if len(column) == 2:
+				depth, positions = int(column[0]), int(column[1])
 			else:
-				if not int(column[2]) == 0:
-					dic[int(column[2])] = 1
+				depth, positions = int(column[2]), 1
+			if not depth == 0:
+				dic[depth] = dic.get(depth, 0) + positions
 
 
 	list_of_values= list(dic.values())
@@ -910,6 +910,95 @@ if mut_type == 'snp':
 	'		<br><a href="report_images.zip" target="_blank">Click to download all image files</a>' + '\n'
 	)
 
+#__________________________________Performance report________________________________________________________________
+# Resources used by the stages of the last execution of the project, from 2_logs/metrics.jsonl (see workflows/stage-metrics.py)
+import json
+from os.path import dirname
+
+def format_bytes(n):
+	if n is None:
+		return '-'
+	for unit in ['B', 'KB', 'MB', 'GB']:
+		if n < 1024:
+			return str(round(n, 1)) + ' ' + unit
+		n = n / 1024.0
+	return str(round(n, 1)) + ' TB'
+
+def format_time(seconds):
+	if seconds < 60:
+		return str(round(seconds, 1)) + ' s'
+	if seconds < 3600:
+		return str(int(seconds // 60)) + ' min ' + str(int(seconds % 60)) + ' s'
+	return str(int(seconds // 3600)) + ' h ' + str(int(seconds % 3600 // 60)) + ' min'
+
+metrics_file = join(dirname(input_log), 'metrics.jsonl')
+stages = []
+if isfile(metrics_file):
+	with open(metrics_file, 'r') as f1:
+		for line in f1:
+			try:
+				stages.append(json.loads(line))
+			except ValueError:
+				continue
+
+if stages:
+	execution = stages[-1]['execution']
+	stages = sorted([stage for stage in stages if stage['execution'] == execution], key=lambda stage: stage['start'])
+	first_start = stages[0]['start']
+	total_time = max(max(stage['start'] + stage['wall_time'] for stage in stages) - first_start, 0.001)
+
+	output.write(
+	'		<hr class="easymap">' + '\n'
+	'		<h2>Performance</h2>' + '\n'
+	'		<p>Resources used by each stage of the analysis. CPU usage is the CPU time divided by the wall time, that is, the number of CPUs the stage kept busy on average. Peak memory is the highest RSS of all the processes of the stage.</p>' + '\n'
+	'		<table id="t" style="width:100%">' + '\n'
+	'		<tr>' + '\n'
+	'			<td style="width:28%"><b>Stage</b></td>' + '\n'
+	'			<td><b>Script</b></td>' + '\n'
+	'			<td><b>Threads</b></td>' + '\n'
+	'			<td><b>Wall time</b></td>' + '\n'
+	'			<td><b>CPU time</b></td>' + '\n'
+	'			<td><b>CPU usage</b></td>' + '\n'
+	'			<td><b>Peak memory</b></td>' + '\n'
+	'			<td><b>Input</b></td>' + '\n'
+	'			<td><b>Output</b></td>' + '\n'
+	'		</tr>' + '\n'
+	)
+	for stage in stages:
+		output.write(
+		'		<tr>' + '\n'
+		'			<td>' + stage['stage'] + '</td>' + '\n'
+		'			<td>' + stage['script'] + '</td>' + '\n'
+		'			<td>' + str(stage['threads'] or '-') + '</td>' + '\n'
+		'			<td>' + format_time(stage['wall_time']) + '</td>' + '\n'
+		'			<td>' + format_time(stage['cpu_time']) + '</td>' + '\n'
+		'			<td>' + str(round(stage['cpu_time'] / max(stage['wall_time'], 0.001), 1)) + '</td>' + '\n'
+		'			<td>' + format_bytes(stage['peak_rss']) + '</td>' + '\n'
+		'			<td>' + format_bytes(stage['input_bytes']) + '</td>' + '\n'
+		'			<td>' + format_bytes(stage['output_bytes']) + '</td>' + '\n'
+		'		</tr>' + '\n'
+		)
+	output.write(
+	'		</table>' + '\n'
+	'		<br>' + '\n'
+	'		<b>Timeline</b> (total: ' + format_time(total_time) + ')<br><br>' + '\n'
+	'		<table style="width:100%">' + '\n'
+	)
+	# One bar per stage, placed according to its start time and as long as its wall time
+	for stage in stages:
+		left = 100.0 * (stage['start'] - first_start) / total_time
+		width = 100.0 * stage['wall_time'] / total_time
+		output.write(
+		'		<tr>' + '\n'
+		'			<td style="width:28%; font-size:12px">' + stage['stage'] + '</td>' + '\n'
+		'			<td><div style="position:relative; height:14px;"><div style="position:absolute; left:' + str(round(left, 2)) + '%; width:' + str(round(width, 2)) + '%; min-width:1px; height:12px; background-color:rgb(139, 167, 214);" title="' + format_time(stage['wall_time']) + '"></div></div></td>' + '\n'
+		'		</tr>' + '\n'
+		)
+	output.write(
+	'		</table>' + '\n'
+	'		<br>' + '\n'
+	)
+
 output.write('</div>')
 output.close()
 
@@ -56,6 +56,7 @@ fi
 
 [ -d user_data ] || mkdir user_data
 [ -d user_projects ] || mkdir user_projects
+[ -d index_cache ] || mkdir index_cache
 
 [ -d web_interface/tmp_upload_files ] || mkdir web_interface/tmp_upload_files
 
@@ -125,6 +126,9 @@ easymap-env/bin/python3 -m pip install --upgrade pip
 [ -d cache ] || mkdir cache
 easymap-env/bin/pip -qq install Pillow --cache-dir cache
 
+# Install NumPy with pip (columnar variant tables, workflows/va_store.py)
+easymap-env/bin/pip -qq install numpy --cache-dir cache
+
 cd ../..
 
 ################################################################################
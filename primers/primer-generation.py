@@ -1,5 +1,7 @@
 import math
-import argparse
+import argparse, os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import stage_cache
 #Script used in order to obtain primers.
 
 parser = argparse.ArgumentParser()
@@ -227,26 +229,13 @@ if mode != 1:
 
 
 
-	# Function to parse fasta file (based on one of the Biopython IOs)
-	def read_fasta(fp):
-		name, seq = None, []
-		for line in fp:
-			line = line.rstrip()
-			if line.startswith('>'):
-				if name: yield (name, ''.join(seq))
-				name, seq = line, []
-			else:
-				seq.append(line)
-		if name: yield (name, ''.join(seq))
-
 
 
 	def genome_selection(contig,genome):
-		with open(genome) as fp:
-			for name_contig, seq_contig in read_fasta(fp):
-				if name_contig[1:].lower() == contig:
-					genome = seq_contig
-			return genome
+		for name_contig, seq_contig in stage_cache.fasta_contigs(genome):
+			if name_contig[1:].lower() == contig:
+				genome = seq_contig
+		return genome
 
 	def rule_1(oligo,sense,oligo2):
 		last_element = len(oligo)
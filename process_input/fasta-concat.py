@@ -1,10 +1,14 @@
 
 #
 # This script receives a list of fasta files, reads the content of each one
-# and writes it to a single fasta-formatted file.
+# and writes it to a single fasta-formatted file. It also writes the genome
+# manifest (genome.fa.fai and genome.fa.stats, see workflows/stage_cache.py),
+# so the workflows can get the contig lengths without reading the sequences.
 #
 
-import argparse, os, shutil, fnmatch
+import argparse, os, sys, shutil, fnmatch
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import stage_cache
 
 # Process command arguments
 parser = argparse.ArgumentParser()
@@ -59,3 +63,6 @@ for ref_file in ref_files:
 
 # Close output file
 output.close()
+
+# Index and base statistics of the genome
+stage_cache.write_genome_manifest(output_dir + '/genome.fa')
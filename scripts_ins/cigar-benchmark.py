@@ -0,0 +1,82 @@
+#This script measures the cost per read of the CIGAR and FLAG parsing of sam_fields.py, compared with the tokenizer that
+#the insertion scripts used before (each character appended to a string, split on tabs, 'M' in i tests, and the flag
+#decomposed by subtracting powers of two).
+#The reads are taken from a SAM or BAM file (-a) or, without it, generated with the CIGAR codes of local alignments.
+#
+#Example: python3 cigar-benchmark.py -a alignment4.bam -n 200000
+
+import argparse, random, time
+import sam_fields
+from sam_reader import sam_lines
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-a', action="store", dest = 'input')
+parser.add_argument('-n', action="store", dest = 'reads', type=int, default = 200000)
+args = parser.parse_args()
+
+#CIGAR and FLAG of the reads
+reads = []
+if args.input:
+	for line in sam_lines(args.input):
+		if not line.startswith('@'):
+			sp = line.split('\t', 6)
+			reads.append((sp[5], int(sp[1])))
+			if len(reads) == args.reads:
+				break
+else:
+	rng = random.Random(1)
+	for n in range(args.reads):
+		left = str(rng.randint(1, 60)) + 'S' if rng.random() < 0.3 else ''
+		right = str(rng.randint(1, 60)) + 'S' if rng.random() < 0.3 else ''
+		reads.append((left + str(rng.randint(40, 100)) + 'M' + right, rng.choice((0, 16, 83, 99, 147, 163))))
+
+flags = (2048, 1024, 512, 256, 128, 64, 32, 16, 8, 4, 2, 1, 0)
+
+#Previous parsing: covered nucleotides, clip pattern and direction
+def previous(cigar, flag):
+	x = ''
+	x2 = ''
+	l = 0
+	for i in cigar:
+		if i == 'M' or i == 'D' or i == 'I' or i == 'N' or i == 'S' or i == 'H' or i == 'P' or i == 'X' :
+			x += str(i) + '\t'
+		else:
+			x += str(i)
+	sp2 = x.split()
+	for i in sp2:
+		if 'M' in i:
+			l = int(l) + int(i.replace('M', ''))
+			x2 += '1'
+		if 'D' in i:
+			l = int(l) + int(i.replace('D', ''))
+		if 'I' in i:
+			l = int(l) - int(i.replace('I', ''))
+		if 'S' in i:
+			x2 += '0'
+	f = flag
+	decomposed = []
+	while f not in flags:
+		for i in flags:
+			if i <= f:
+				decomposed.append(i)
+				f = f - i
+				break
+	else:
+		decomposed.append(f)
+	return l, x2, 16 in decomposed
+
+def shared(cigar, flag):
+	alignment = sam_fields.cigar(cigar)
+	return alignment.covered, alignment.side, sam_fields.has_flag(flag, sam_fields.REVERSE)
+
+def uncached(cigar, flag):
+	alignment = sam_fields.parse_cigar(cigar)
+	return alignment.covered, alignment.side, sam_fields.has_flag(flag, sam_fields.REVERSE)
+
+print('Reads: ' + str(len(reads)) + ', different CIGAR codes: ' + str(len(set(cigar for cigar, flag in reads))))
+for name, function in (('previous tokenizer', previous), ('sam_fields, no cache', uncached), ('sam_fields', shared)):
+	start = time.perf_counter()
+	for cigar, flag in reads:
+		function(cigar, flag)
+	elapsed = time.perf_counter() - start
+	print(name + ':\t' + str(round(elapsed * 1e9 / max(1, len(reads)))) + ' ns per read')
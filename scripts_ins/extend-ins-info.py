@@ -3,31 +3,20 @@
 
 # This scrip retrieves the upstream and downstream sequences of each insertion site and the reconstructed sequences of the 5 and 3 prime ends of the insertion and adds the information to the insertions_output.txt file.
 
-import argparse
+import argparse, os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import stage_cache
 parser = argparse.ArgumentParser()
 parser.add_argument('--project-name', action="store", dest='project_name', required=True)
 args = parser.parse_args()
 project = args.project_name
 
 # Input files: fasta genome and insertions_output.txt
-fp = open(project + '/1_intermediate_files/gnm_ref_merged/genome.fa', 'r')
 input_file = open(project + '/3_workflow_output/insertions_output.txt', 'r')
 
-# This function parses the information from the fasta files
-def read_fasta(fp):
-	name, seq = None, []
-	for line in fp:
-		line = line.rstrip()
-		if line.startswith('>'):
-			if name: yield (name, ''.join(seq))
-			name, seq = line, []
-		else:
-			seq.append(line)
-	if name: yield (name, ''.join(seq))
-
 # We create a list of all the contigs with the format [[contig_name, sequence], [contig_name, sequence] ...]
 fastalist = list()
-for name_contig, seq_contig in read_fasta(fp):
+for name_contig, seq_contig in stage_cache.fasta_contigs(project + '/1_intermediate_files/gnm_ref_merged/genome.fa'):
 	fastalist.append([name_contig.lower(), seq_contig])
 
 # We retrieve the upstream and downstream sequences of each insertion from the fastalist. We also create a new list with the complete lines
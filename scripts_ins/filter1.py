@@ -1,18 +1,23 @@
 #This module filters the reads from a SAM file and extracts the unaligned reads with aligned pairs in a fastq file.
+#
+#The filter can run as a streaming stage between two aligners: the input (-a) and the output (-b) default to '-', the
+#standard input (SAM or BAM) and the standard output. The fastq output is compressed with gzip when its name ends with
+#'.gz' or with -gzip.
 
 import argparse
+from sam_reader import sam_lines, fastq_output
 
 #We create the input and output objects
 parser = argparse.ArgumentParser()
-parser.add_argument('-a', action="store", dest = 'input')
-parser.add_argument('-b', action="store", dest = 'output')
+parser.add_argument('-a', action="store", dest = 'input', default = '-')
+parser.add_argument('-b', action="store", dest = 'output', default = '-')
+parser.add_argument('-gzip', action="store_true", dest = 'gzip')
 args = parser.parse_args()
 
-#Now we select in the .sam file the unpaired reads whose mates are paired 
-with open(str(args.input), 'r') as f1: 					#We open the input file and create the output as objects (f1, f2)
-	with open(str(args.output), 'w') as f2:
-		for line in f1:								#To read through the lines of the file
-			if not line.startswith('@'):			#We create a contition to eliminate the headers in the sam file
-				sp = line.split() 					#Now we split each line into an array
-				if sp[2] != '*' and sp[5] == '*': 	#Sp[2] is not an asterisk because the read takes the contig name of its mate when they are not aligned. The CIGAR (sp[5]) reveals if the read hasnt been aligned with an asterisk.
-						f2.write('@'+sp[0] + '\n' + sp[9] + '\n' + '+' + '\n' + sp[10] + '\n' ) #The selected reads are written as a fastq file
\ No newline at end of file
+#Now we select in the .sam file the unpaired reads whose mates are paired. The input can be a SAM or BAM file, or '-' for the standard input
+with fastq_output(args.output, args.gzip) as f2:		#We create the output as an object (f2)
+	for line in sam_lines(args.input):			#To read through the lines of the input
+		if not line.startswith('@'):			#We create a contition to eliminate the headers in the sam file
+			sp = line.split() 					#Now we split each line into an array
+			if sp[2] != '*' and sp[5] == '*': 	#Sp[2] is not an asterisk because the read takes the contig name of its mate when they are not aligned. The CIGAR (sp[5]) reveals if the read hasnt been aligned with an asterisk.
+					f2.write('@'+sp[0] + '\n' + sp[9] + '\n' + '+' + '\n' + sp[10] + '\n' ) #The selected reads are written as a fastq file
\ No newline at end of file
@@ -1,17 +1,23 @@
 #This module filters the reads from a SAM file extracting the localy aligned reads to a fastq file.
+#
+#The filter can run as a streaming stage between two aligners: the input (-a) and the output (-b) default to '-', the
+#standard input (SAM or BAM) and the standard output. The fastq output is compressed with gzip when its name ends with
+#'.gz' or with -gzip.
 
 import argparse
+from sam_reader import sam_lines, fastq_output
+import sam_fields
 
 parser = argparse.ArgumentParser()
-parser.add_argument('-a', action="store", dest = 'input')
-parser.add_argument('-b', action="store", dest = 'output')
+parser.add_argument('-a', action="store", dest = 'input', default = '-')
+parser.add_argument('-b', action="store", dest = 'output', default = '-')
+parser.add_argument('-gzip', action="store_true", dest = 'gzip')
 args = parser.parse_args()
 
-#We will select in the .sam file the locally aligned reads
-with open(str(args.input), 'r') as f1: 																#We open the input file and create the output, both as objects (f1, f2)
-	with open(str(args.output), 'w') as f2: 
-		for line in f1:						
-			if not line.startswith('@'): 															#We create a contition to discard the headers in the sam file
-				sp = line.split() 																	#Now we split each line into an array 
-				if 'S' in sp[5]: 																	#If the read is locally aligned the cigar will contain an "S" 
-						f2.write('@'+sp[0] + '\n' + sp[9] + '\n' + '+' + '\n' + sp[10] + '\n' ) 	#The selected reads are written as a fastq file
+#We will select in the .sam file the locally aligned reads. The input can be a SAM or BAM file, or '-' for the standard input
+with fastq_output(args.output, args.gzip) as f2: 														#We create the output as an object (f2)
+	for line in sam_lines(args.input):
+		if not line.startswith('@'): 															#We create a contition to discard the headers in the sam file
+			sp = line.split() 																	#Now we split each line into an array 
+			if sam_fields.cigar(sp[5]).soft_clipped: 											#If the read is locally aligned the cigar will contain an "S" 
+					f2.write('@'+sp[0] + '\n' + sp[9] + '\n' + '+' + '\n' + sp[10] + '\n' ) 	#The selected reads are written as a fastq file
@@ -2,6 +2,7 @@
 
 #Comando de pruebas: python3 lin-primers_v3.py -sam_in alignment4.sam -var_in variants.txt -sam_out out
 import argparse
+import sam_reader, sam_fields
 parser = argparse.ArgumentParser()
 parser.add_argument('-sam_in', action="store", dest = 'input_sam')
 parser.add_argument('-var_in', action="store", dest = 'input_var')
@@ -12,10 +13,9 @@ args = parser.parse_args()
 import time
 start_time = time.time()
 
-#Input 
+#Input (SAM, BAM or '-' for the standard input)
 input1 = args.input_sam
-f1 = open(input1, 'r')
-sam_lines = f1.readlines()	
+sam_lines = list(sam_reader.sam_lines(input1))
 
 input2 = args.input_var
 f2 = open(input2, 'r')
@@ -44,28 +44,12 @@ for insertion in var_list:
 			sequence = sp[9]
 			quality = sp[10]
 			if chromosome == ins_chromosome and position in range(ins_position - 200, ins_position + 200):
-					x = ''
-					x2 = ''
-					for i in cigar: 
-						if i == 'M' or i == 'D' or i == 'I' or i == 'N' or i == 'S' or i == 'H' or i == 'P' or i == 'X' : 
-							x += str(i) + '\t'
-						else:
-							x += str(i)
-					sp2 = x.split()
-					for i in sp2:
-						if 'M' in i:
-							x2 += '1'
-						if 'S' in i:
-							x2 += '0'
+					alignment = sam_fields.cigar(cigar)
 
 					# 5' reads
-					if x2.startswith('1') and x2.endswith('0'): 
+					if alignment.side == 'right':
 						# Number of read nts
-						for i in reversed(sp2):
-							if 'S' in i:
-								num = i.replace('S', '')
-								l = int(num)
-								break
+						l = alignment.right_clip
 
 						# Extract non-readen nts as new reads in the output file
 						sequence2 = sequence[len(sequence)-l: ]
@@ -73,13 +57,9 @@ for insertion in var_list:
 						f5.write('@'+ sp[0] + '\n' + sequence2 + '\n' + '+' + '\n' + quality2 + '\n' ) 
 
 					# 3' reads
-					elif x2.startswith('0') and x2.endswith('1'):												
+					elif alignment.side == 'left' and not alignment.right_clip:
 						# Number of read nts
-						for i in sp2: 				 										
-							if 'S' in i:
-								num = i.replace('S', '')
-								l = int(num)
-								break
+						l = alignment.left_clip
 
 						# Extract non-readen nts as new reads in the output file
 						sequence2 = sequence[ :l]
@@ -1,5 +1,17 @@
-#This module will process the information in the .sam file to obtain the absolute frequency of aligments ending per nucleotide during local aligments. 
-import argparse
+#This module will process the information in the .sam file to obtain the absolute frequency of aligments ending per nucleotide during local aligments.
+#
+#The alignments are read once. For each read clipped on one side, the position where its alignment ends (the junction) is
+#added to the junctions of its contig and side, and its aligned nucleotides are added as a start and an end event (end = last
+#position + 1) to the read depth events of its contig and side. The junctions are then counted, and the read depth of every
+#position comes from one cumulative sum of the difference array of the events, so the memory used depends on the number of
+#reads and on the span of the contig they cover, not on the number of bases of the reads.
+import argparse, os, sys
+from array import array
+import numpy as np
+from sam_reader import sam_lines
+import sam_fields
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import stage_cache
 parser = argparse.ArgumentParser()
 parser.add_argument('-a', action="store", dest = 'input')
 parser.add_argument('-b', action="store", dest = 'output')
@@ -7,177 +19,89 @@ parser.add_argument('-c', action="store", dest = 'finput')
 parser.add_argument('-m', action="store", dest = 'mode', default='P')
 args = parser.parse_args()
 
-#Input file 
+#Input file (SAM, BAM or '-' for the standard input)
 input = args.input
-f1 = open(input, 'r')
-lines = f1.readlines()	
 
 #fasta input
 fasta_input = str(args.finput)
-fasta_f1 = open(fasta_input, 'r')
-fasta_lines = fasta_f1.readlines()
 
 #Output: If the paired-reads analysis is being performed we will oppen the output to append data to the file, else we create the output and open it in write mode
 if args.mode == 'pe':
 	output = args.output
 	f2 = open(output, 'a')
-elif args.mode == 'se': 
+elif args.mode == 'se':
 	output = args.output
 	f2 = open(output, 'w')
 
 #create a list with all the genome contigs
 contigs = []
-for i, line in enumerate(fasta_lines):
-	if line.startswith('>'):						 #fasta sequences start with '>'
-		sp = line.split(' ') 						 #because some names have whitespaces and extra info that is not written to sam file
-		cont = sp[0].strip() 						 #strip() is to remove the '\r\n' hidden chars
-		cont = cont[1:]      						 #to remove the first character of a string (>)
-		if cont not in contigs:
-			contigs.append(cont)
-
-#Analyze SAM file:									 We create three dictionaries in which we will compute the absolute frequency of how many times  
-for c in contigs: 									 #a reads alignment finishes in each nucleotide, separating the information according to which  
-	di_left = dict()								 #side of the read is aligned (left or right). d2_1 and d2_2 are lists of all the positions  
-	di_right = dict()								 #in which a reads aligment finishes, repeated as many times as that happens, required for the creation of the dictionaries
-	di_total = dict()
-	di_rd_left = dict()
-	di_rd_right = dict()
-	di_rd_total = dict()
-	d2_1 = []
-	d2_2 = []
-	rd_left = []
-	rd_right = []
-	for i, line in enumerate(lines):
-		if not line.startswith('@'):
-			sp = line.split('\t')
-			cont = sp[2]
-			if cont == c and cont != '*':				
-				p = int(sp[3]) 						 #Read position
-				cigar = sp[5].strip() 				 #Then we define the CIGAR parameter, from which we will extract the aligned nucleotides of each read 
-				if cigar != '*':					 #and their relative position (left/right)
-					x = ''							 #X is a string containing the cigar separating the M and S characters by a tabulation
-					x2 = ''							 #X2 is a string containing ones and zeros that will map the position of the M and S characters 
-					l = 0							 #to determine the part of the read that is aligned
-					l2 = 0
-
-					for i in cigar: 
-						if i == 'M' or i == 'D' or i == 'I' or i == 'N' or i == 'S' or i == 'H' or i == 'P' or i == 'X' : 
-							x += str(i) + '\t'
-						else:
-							x += str(i)
-
-					sp2 = x.split()
-					for i in sp2:
-						if 'M' in i:
-							x2 += '1'
-						if 'S' in i:
-							x2 += '0'
-					if x2.startswith('0'): 			 
-						d2_2.append(str(p))
-
-						for i in sp2:
-							if 'M' in i:
-								num = i.replace('M', '')
-								l2 = int(l2) + int(num)
-						pf = int(p) + int(l2) - 1
-						for n in range(p, pf + 1):
-							rd_right.append(n)
-
-					elif x2.endswith('0'):
-						for i in sp2: 				 
-							if 'M' in i:
-								num = i.replace('M', '')
-								l = int(l) + int(num)
-							if 'D' in i:
-								num = i.replace('D', '')
-								l = int(l) + int(num)
-							if 'I' in i:
-								num = i.replace('I', '')
-								l = int(l) - int(num)
-						pf = int(p) + int(l) - 1
-						d2_1.append(str(pf))
-
-						for i in sp2:
-							if 'M' in i:
-								num = i.replace('M', '')
-								l2 = int(l2) + int(num)
-						pf = int(p) + int(l2) - 1
-						for n in range(p, pf + 1):
-							rd_left.append(n)
-						
-					elif x2 == '1':
-						pass
-
-	#Key count										 #The "key count" is the transformation of the information in the lists (d2_1 and d2_2) in dictionaries
-	#TOTAL DICTIONARY								 #acumulating the read depth of each nucleotide
-	for i in d2_1:
-		try: 
-			di_total[i] =  1 + di_total[i]
-		
-		except KeyError:
-			di_total[i] = 1
-			
-	for i in d2_2:
-		try: 
-			di_total[i] =  1 + di_total[i]
-		except KeyError:
-			di_total[i] = 1
-
-	
-	for i in rd_left:
-		try: 
-			di_rd_total[i] =  1 + di_rd_total[i]
-		except KeyError:
-			di_rd_total[i] = 1
-	
-	for i in rd_right:
-		try: 
-			di_rd_total[i] =  1 + di_rd_total[i]
-		except KeyError:
-			di_rd_total[i] = 1
-
-	#LEFF AND RIGHT DICTIONARIES
-	for i in d2_1:
-		try: 
-			di_left[i] = 1 + di_left[i]
-		
-		except KeyError:
-			di_left[i] = 1
-
-	for i in d2_2:
-		try: 
-			di_right[i] =  1 + di_right[i]
-		except KeyError:
-			di_right[i] = 1
-		
-
-	for i in rd_left:
-		try: 
-			di_rd_left[i] =  1 + di_rd_left[i]
-		except KeyError:
-			di_rd_left[i] = 1
-	
-	for i in rd_right:
-		try: 
-			di_rd_right[i] =  1 + di_rd_right[i]
-		except KeyError:
-			di_rd_right[i] = 1
-
-	#Writting in the output file
-	for key,value in sorted(di_left.items(), key=lambda i: int(i[0])):
-		f2.write('LOCAL\t' + c + '\t' + str(key) + '\t'+ str(value) + '\tLEFT\n')
-
-	for key,value in sorted(di_right.items(), key=lambda i: int(i[0])):
-		f2.write('LOCAL\t' + c + '\t' + str(key) + '\t'+ str(value) + '\tRIGHT\n')
-
-	for key,value in sorted(di_total.items(), key=lambda i: int(i[0])):
-		f2.write('LOCAL\t' + c + '\t' + str(key) + '\t'+ str(value) + '\tTOTAL\n')
-
-	for key,value in sorted(di_rd_total.items(), key=lambda i: int(i[0])):
-		f2.write('LOCAL_RD\t' + c + '\t' + str(key) + '\t'+ str(value) + '\tTOTAL_RD\n')
-
-	for key,value in sorted(di_rd_left.items(), key=lambda i: int(i[0])):
-		f2.write('LOCAL_RD\t' + c + '\t' + str(key) + '\t'+ str(value) + '\tLEFT_RD\n')
-
-	for key,value in sorted(di_rd_right.items(), key=lambda i: int(i[0])):
-		f2.write('LOCAL_RD\t' + c + '\t' + str(key) + '\t'+ str(value) + '\tRIGHT_RD\n')
+for name_contig, length_contig in stage_cache.fasta_lengths(fasta_input):
+	if name_contig not in contigs:
+		contigs.append(name_contig)
+
+#For each contig: junctions of the reads aligned on their left side (clipped on the right) and on their right side (clipped
+#on the left), and start and end events of the aligned nucleotides of those reads
+junctions = dict((c, {'LEFT': array('q'), 'RIGHT': array('q')}) for c in contigs)
+events = dict((c, {'LEFT': (array('q'), array('q')), 'RIGHT': (array('q'), array('q'))}) for c in contigs)
+
+#Analyze SAM file
+for line in sam_lines(input):
+	if line.startswith('@'):
+		continue
+	sp = line.split('\t', 6)
+	if len(sp) < 6 or sp[2] not in junctions:
+		continue
+	p = int(sp[3]) 								 #Read position
+	cigar = sp[5].strip() 						 #Then we define the CIGAR parameter, from which we will extract the aligned nucleotides of each read
+	if cigar == '*':
+		continue
+
+	alignment = sam_fields.cigar(cigar)
+	aligned = alignment.matches
+	if alignment.side == 'left': 				 #Clipped on the left: the junction is the first aligned position
+		side = 'RIGHT'
+		junction = p
+	elif alignment.side == 'right': 			 #Clipped on the right: the junction is the last position of the alignment
+		side = 'LEFT'
+		junction = p + alignment.covered - 1
+	else:
+		continue
+
+	junctions[sp[2]][side].append(junction)
+	if aligned > 0:
+		starts, ends = events[sp[2]][side]
+		starts.append(p)
+		ends.append(p + aligned)
+
+#Read depth of each position from start to end of a contig, from its events
+def depth(starts, ends, start, end):
+	difference = np.zeros(end - start + 1, dtype=np.int64)
+	if len(starts):
+		difference += np.bincount(np.frombuffer(starts, dtype=np.int64) - start, minlength=len(difference))
+		difference -= np.bincount(np.frombuffer(ends, dtype=np.int64) - start, minlength=len(difference))
+	return np.cumsum(difference)[:-1]
+
+def write_rows(analysis, c, positions, values, label):
+	f2.writelines([analysis + '\t' + c + '\t' + str(key) + '\t' + str(value) + '\t' + label + '\n' for key, value in zip(positions.tolist(), values.tolist())])
+
+#Writting in the output file
+for c in contigs:
+	left = np.frombuffer(junctions[c]['LEFT'], dtype=np.int64)
+	right = np.frombuffer(junctions[c]['RIGHT'], dtype=np.int64)
+	for values, label in ((left, 'LEFT'), (right, 'RIGHT'), (np.concatenate((left, right)), 'TOTAL')):
+		positions, counts = np.unique(values, return_counts=True)
+		write_rows('LOCAL', c, positions, counts, label)
+
+	left_starts, left_ends = events[c]['LEFT']
+	right_starts, right_ends = events[c]['RIGHT']
+	if not (len(left_starts) or len(right_starts)):
+		continue
+	start = min(min(starts) for starts in (left_starts, right_starts) if len(starts))
+	end = max(max(ends) for ends in (left_ends, right_ends) if len(ends))
+	di_rd_left = depth(left_starts, left_ends, start, end)
+	di_rd_right = depth(right_starts, right_ends, start, end)
+	for di, label in ((di_rd_left + di_rd_right, 'TOTAL_RD'), (di_rd_left, 'LEFT_RD'), (di_rd_right, 'RIGHT_RD')):
+		covered = np.flatnonzero(di)
+		write_rows('LOCAL_RD', c, covered + start, di[covered], label)
+
+f2.close()
@@ -1,180 +1,91 @@
-#This module will process the information in the .sam file to obtain the read depth per nucleotide aligned. 
+#This module will process the information in the .sam file to obtain the read depth per nucleotide aligned.
+#
+#The alignments are read once. Each aligned read adds a start and an end event (end = last position + 1) to the
+#events of its contig and direction, and the read depth of every position of a contig comes from one cumulative sum of
+#the difference array of its events, so the memory used depends on the number of reads and on the span of the contig
+#they cover, not on the number of bases of the reads. The depth of all the reads (TOTAL) is the sum of the forward (F)
+#and reverse (R) depths.
 
-import argparse
+import argparse, os, sys
+from array import array
+import numpy as np
+from sam_reader import sam_lines
+import sam_fields
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import stage_cache
 parser = argparse.ArgumentParser()
 parser.add_argument('-a', action="store", dest = 'input')
 parser.add_argument('-b', action="store", dest = 'output')
 parser.add_argument('-c', action="store", dest = 'finput')
 args = parser.parse_args()
 
-#Input file 
+#Input file (SAM, BAM or '-' for the standard input)
 input = str(args.input)
-f1 = open(input, 'r')
-lines = f1.readlines()	
 
 #fasta input
 fasta_input = str(args.finput)
-fasta_f1 = open(fasta_input, 'r')
-fasta_lines = fasta_f1.readlines()
 
 #Output file
 output = str(args.output)
 f2 = open(output, 'w')
 f2.write('@' + 'ANALYSIS\t' + 'Contig' + '\t' + 'NT' + '\t' + 'RD' + '\t' + 'Direction/Position' + '\n') #We write the header to the file
 
-#A list of the values that make up the flag for each read
-flags = (2048, 1024, 512, 256, 128, 64, 32, 16, 8, 4, 2, 1, 0)
-
 #We create a list with all the contigs in the refference genome
 contigs = []
-for i, line in enumerate(fasta_lines):
-	if line.startswith('>'): #fasta sequences start with '>'
-		sp = line.split(' ')  #because some names have whitespaces and extra info that is not written to sam file
-		cont = sp[0].strip()  #strip() is to remove the '\r\n' hidden chars
-		cont = cont[1:]       #to remove the first char of string (>)
-		if cont not in contigs:
-			contigs.append(cont)
+for name_contig, length_contig in stage_cache.fasta_lengths(fasta_input):
+	if name_contig not in contigs:
+		contigs.append(name_contig)
+
+#Events of the reads of each contig and direction: start positions and end positions (last position + 1)
+events = dict((c, {'F': (array('q'), array('q')), 'R': (array('q'), array('q'))}) for c in contigs)
 
 #analyze SAM file
-for c in contigs:  
-	di_f = dict() 										#Dictionary for the forward reads
-	di_r = dict() 										#Dictionary for the reverse reads
-	di_total = dict() 									#Dictionary for all reads
-	for i, line in enumerate(lines): 
-		if not line.startswith('@'):
-			sp = line.split('\t')
-			contig = sp[2] 								#This variable reads the name of the contig in each line..
-			if c == contig: 							#.. then compares it to the "c" to group the reads accorting to which contig they belong
-														#We define the CIGAR parameter, from which we will extract the aligned nucleotides
-				cigar = sp[5].strip()
-				if cigar != '*': 						#Discards unaligned reads
-				
-					#Total dictionary______________________________________________________________________________________________
-										
-					x = '' 								#The varialbe X will generate a list of each part of the CIGAR code
-					l = 0 								#The variable l will contain the sum of the nucleotides aligned in the genome for each read
-			
-					#The following lines read through the CIGAR separating by \t each letter with its corresponding digits
-					for i in cigar: 
-						if i == 'M' or i == 'D' or i == 'I' or i == 'N' or i == 'S' or i == 'H' or i == 'P' or i == 'X' : 
-							x += str(i) + '\t'
-						else:
-							x += str(i)
-					sp2 = x.split()
-			
-					#We read through the split X variable and perform the operations necesary to determine l:
-					for i in sp2:
-						if 'M' in i: 					#For aligned nucleotides we add the number
-							num = i.replace('M', '')
-							l = int(l) + int(num)
-						if 'D' in i: 					#For deletions in the read we add the number of deleted nucleotides
-							num = i.replace('D', '')
-							l = int(l) + int(num)
-						if 'I' in i: 					#For insertions in the read we substract the number of inserted nucleotides
-							num = i.replace('I', '')
-							l = int(l) - int(num)
-					
-					#We determine the start and ending of an aligment and write in the dictionary the accumulated read depth of each nucleotide 
-					if sp[3] != '0':
-						p = int(sp[3]) 					#Initial position
-						pf = p + int(l) - 1 			#Final position
-						for i in range(p,(pf+1)):  		#i will take the value of each nucleotide in the refference sequence aligned to complete a dictionary
-							try: 						#with the read depths of each nucleotide read
-								di_total[i] =  1 + di_total[i]
-							except KeyError:
-								di_total[i] = 1
-				
+for line in sam_lines(input):
+	if line.startswith('@'):
+		continue
+	sp = line.split('\t', 6)
+	if len(sp) < 6 or sp[2] not in events:
+		continue
+	cigar = sp[5].strip()
+	if cigar == '*' or sp[3] == '0': 					#Discards unaligned reads
+		continue
+
+	#Nucleotides of the genome covered by the read: aligned nucleotides and deletions, minus insertions
+	l = sam_fields.cigar(cigar).covered
+	if l <= 0:
+		continue
+
+	#The flag 16 marks reverse reads, using this information we will determine the direction of each read
+	if sam_fields.has_flag(int(sp[1]), sam_fields.REVERSE):
+		direction = 'R'
+	else:
+		direction = 'F'
 
-				
-					#Determining alignment direction
-					f = int(sp[1]) 						#We add the flag to a variable
-					l=[] 								#This list will contain the deconstructed flag
-					
-					while f not in flags: 				#We substract gradually the values from the flags list from the flag of the read adding each substracted value to the list
-						for i in flags:
-							if i <= f: 
-								l.append(i)
-								f = f - i 
-								break
-					else: 
-						l.append(f)
+	p = int(sp[3]) 										#Initial position
+	starts, ends = events[sp[2]][direction]
+	starts.append(p)
+	ends.append(p + l)
 
-					if 16 in l: 						#The flag 16 marks reverse reads, using this information we will determine the direction of each read
-						direction = 'R'
-					else: #
-						direction = 'F'
-					
-					#Forward dictionary______________________________________________________________________________________________
-					if direction == 'F':
-						x = '' 
-						l = 0
-					
-						for i in cigar: 
-							if i == 'M' or i == 'D' or i == 'I' or i == 'N' or i == 'S' or i == 'H' or i == 'P' or i == 'X' : 
-								x += str(i) + '\t'
-							else:
-								x += str(i)
-						sp2 = x.split()
-					
-						for i in sp2:
-							if 'M' in i:
-								num = i.replace('M', '')
-								l = int(l) + int(num)
-							if 'D' in i:
-								num = i.replace('D', '')
-								l = int(l) + int(num)
-							if 'I' in i:
-								num = i.replace('I', '')
-								l = int(l) - int(num)
-							
-						if sp[3] != '0':
-							p = int(sp[3]) 
-							pf = p + int(l) - 1 
-							for i in range(p,(pf+1)):
-								try: 
-									di_f[i] =  1 + di_f[i]
-								except KeyError:
-									di_f[i] = 1
-						
-					#Reverse dictionary______________________________________________________________________________________________
-					elif direction == 'R':
-						x = '' 
-						l = 0
-					
-						for i in cigar: 
-							if i == 'M' or i == 'D' or i == 'I' or i == 'N' or i == 'S' or i == 'H' or i == 'P' or i == 'X' : 
-								x += str(i) + '\t'
-							else:
-								x += str(i)
-						sp2 = x.split()
-					
-						for i in sp2:
-							if 'M' in i:
-								num = i.replace('M', '')
-								l = int(l) + int(num)
-							if 'D' in i:
-								num = i.replace('D', '')
-								l = int(l) + int(num)
-							if 'I' in i:
-								num = i.replace('I', '')
-								l = int(l) - int(num)
-							
-						if sp[3] != '0':
-							p = int(sp[3]) 
-							pf = p + int(l) - 1 
-							for i in range(p,(pf+1)):
-								try: 
-									di_r[i] =  1 + di_r[i]
-								except KeyError:
-									di_r[i] = 1
-						
+#Read depth of each position from start to end of a contig, from its events
+def depth(starts, ends, start, end):
+	difference = np.zeros(end - start + 1, dtype=np.int64)
+	if len(starts):
+		difference += np.bincount(np.frombuffer(starts, dtype=np.int64) - start, minlength=len(difference))
+		difference -= np.bincount(np.frombuffer(ends, dtype=np.int64) - start, minlength=len(difference))
+	return np.cumsum(difference)[:-1]
 
-	#Finally we sort the dictionaries and write it to an output file	
-	for key,value in sorted(di_total.items(), key=lambda i: int(i[0])):
-		f2.write('PAIRED\t' +  c + '\t' + str(key) + '\t'+ str(value) + '\tTOTAL\n')
+#Finally we write the positions with reads of each contig, sorted
+for c in contigs:
+	f_starts, f_ends = events[c]['F']
+	r_starts, r_ends = events[c]['R']
+	if not (len(f_starts) or len(r_starts)):
+		continue
+	start = min(min(starts) for starts in (f_starts, r_starts) if len(starts))
+	end = max(max(ends) for ends in (f_ends, r_ends) if len(ends))
+	di_f = depth(f_starts, f_ends, start, end)
+	di_r = depth(r_starts, r_ends, start, end)
+	for di, label in ((di_f + di_r, 'TOTAL'), (di_f, 'F'), (di_r, 'R')):
+		covered = np.flatnonzero(di)
+		f2.writelines(['PAIRED\t' + c + '\t' + str(key) + '\t' + str(value) + '\t' + label + '\n' for key, value in zip((covered + start).tolist(), di[covered].tolist())])
 
-	for key,value in sorted(di_f.items(), key=lambda i: int(i[0])):
-		f2.write('PAIRED\t' + c + '\t' + str(key) + '\t'+ str(value) + '\tF\n')
-	
-	for key,value in sorted(di_r.items(), key=lambda i: int(i[0])):
-		f2.write('PAIRED\t' +  c + '\t' + str(key) + '\t'+ str(value) + '\tR\n')
\ No newline at end of file
+f2.close()
\ No newline at end of file
@@ -0,0 +1,90 @@
+#
+# CIGAR and FLAG fields of the SAM lines, shared by the scripts that read alignments:
+#
+#	import sam_fields
+#	alignment = sam_fields.cigar(sp[5])
+#	if alignment.left_clip and not sam_fields.has_flag(int(sp[1]), sam_fields.REVERSE): ...
+#
+# cigar(text) returns the operations of a CIGAR code and the values that the scripts use, computed once per
+# different CIGAR (most reads of a sample share a few CIGAR codes, so the next reads with the same code only cost a
+# dictionary lookup):
+#	operations		tuple of (length, operation) pairs, e.g. ((5, 'S'), (95, 'M')). Empty for '*'
+#	span			reference span: bases of the genome covered by the alignment (M, D, N, = and X)
+#	covered			bases counted as covered by the insertion analyses: M + D - I (the end of an alignment that
+#					starts at POS is POS + covered - 1 in output_analysis.txt)
+#	matches			aligned bases (M)
+#	left_clip		bases soft clipped before the alignment (S before the first M), 0 if none
+#	right_clip		bases soft clipped after the alignment (S after the last M), 0 if none
+#	soft_clipped	total of soft clipped bases
+#	side			side of the read that is clipped: 'left' (left_clip, the read may also be clipped on the right),
+#					'right' (only right_clip) or None (not clipped)
+#
+# FLAG bits are tested with has_flag(flag, bit), with the names of the SAM specification.
+#
+# Run scripts_ins/cigar-benchmark.py to measure the cost per read.
+#
+
+import re
+from collections import namedtuple
+
+PAIRED = 0x1
+PROPER_PAIR = 0x2
+UNMAPPED = 0x4
+MATE_UNMAPPED = 0x8
+REVERSE = 0x10
+MATE_REVERSE = 0x20
+READ1 = 0x40
+READ2 = 0x80
+SECONDARY = 0x100
+QC_FAIL = 0x200
+DUPLICATE = 0x400
+SUPPLEMENTARY = 0x800
+
+def has_flag(flag, bit):
+	return flag & bit != 0
+
+Cigar = namedtuple('Cigar', 'operations span covered matches left_clip right_clip soft_clipped side')
+
+_operation = re.compile(r'(\d+)([MIDNSHP=X])')
+_cache = {}
+_cache_size = 100000
+
+def parse_cigar(text):
+	operations = tuple([(int(length), operation) for length, operation in _operation.findall(text)])
+	span = covered = matches = soft_clipped = left_clip = right_clip = 0
+	first = None				#length of the first M or S operation (0 for M)
+	for length, operation in operations:
+		if operation == 'M':
+			span += length
+			covered += length
+			matches += length
+			if first is None:
+				first = 0
+			right_clip = 0
+		elif operation == 'S':
+			soft_clipped += length
+			if first is None:
+				first = left_clip = length
+			right_clip = length
+		elif operation == 'D':
+			span += length
+			covered += length
+		elif operation == 'I':
+			covered -= length
+		elif operation == 'N' or operation == '=' or operation == 'X':
+			span += length
+	if left_clip:
+		side = 'left'
+	elif right_clip:
+		side = 'right'
+	else:
+		side = None
+	return Cigar(operations, span, covered, matches, left_clip, right_clip, soft_clipped, side)
+
+def cigar(text):
+	alignment = _cache.get(text)
+	if alignment is None:
+		if len(_cache) >= _cache_size:
+			_cache.clear()
+		alignment = _cache[text] = parse_cigar(text)
+	return alignment
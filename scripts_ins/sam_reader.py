@@ -0,0 +1,62 @@
+#
+# Shared by the scripts that read alignments. The workflows no longer keep SAM files on disk: the
+# aligner output is piped into BAM files, or straight into the scripts through their standard input.
+#
+# sam_lines(source) yields the lines (header included) of:
+#	- a BAM file (the source ends with '.bam'), decoded by samtools view
+#	- the standard input (the source is '-'), in SAM or BAM format (BAM is recognized by its compression
+#	  header and decoded by samtools view), so the scripts can read the output of an aligner through a pipe
+#	- a SAM file (any other source)
+#
+# fastq_output(destination, compress) opens the FASTQ output of the read filters: the standard output (the destination
+# is '-') or a file, compressed with gzip when compress is set or the name ends with '.gz'.
+#
+
+import os, sys, io, gzip, subprocess, shutil, threading
+
+samtools = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'samtools1', 'samtools')
+
+def sam_lines(source):
+	if source == '-':
+		if sys.stdin.buffer.peek(2)[:2] == b'\x1f\x8b':
+			proc = subprocess.Popen([samtools, 'view', '-h', '-'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+			def feed():
+				try:
+					shutil.copyfileobj(sys.stdin.buffer, proc.stdin)
+				except (IOError, OSError):
+					pass
+				finally:
+					proc.stdin.close()
+			feeder = threading.Thread(target=feed)
+			feeder.daemon = True
+			feeder.start()
+			for line in io.TextIOWrapper(proc.stdout):
+				yield line
+			proc.stdout.close()
+			if proc.wait() != 0:
+				raise IOError('samtools view could not read the standard input')
+		else:
+			for line in sys.stdin:
+				yield line
+
+	elif source.endswith('.bam'):
+		proc = subprocess.Popen([samtools, 'view', '-h', source], stdout=subprocess.PIPE, universal_newlines=True)
+		for line in proc.stdout:
+			yield line
+		proc.stdout.close()
+		if proc.wait() != 0:
+			raise IOError('samtools view could not read ' + source)
+
+	else:
+		with open(source, 'r') as fp:
+			for line in fp:
+				yield line
+
+def fastq_output(destination, compress=False):
+	if destination == '-':
+		if compress:
+			return io.TextIOWrapper(gzip.GzipFile(fileobj=sys.stdout.buffer, mode='wb', compresslevel=1))
+		return os.fdopen(sys.stdout.fileno(), 'w', 1 << 20, closefd=False)
+	if compress or destination.endswith('.gz'):
+		return gzip.open(destination, 'wt', compresslevel=1)
+	return open(destination, 'w')
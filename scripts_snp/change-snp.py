@@ -1,7 +1,15 @@
 #Aim:  Using the variants file generated from the parental control (in case you are dealing with an outcross in a reference background and you have sequenced the polimorfic parental as a control.) and
 #      using the gnm_ref file, the variants located in the control will be replaced in the reference genome.
+#
+# The variants are grouped by contig and sorted by position once. The genome is then streamed line by line: the bases of each line are copied
+# to a buffer (bytearray) with the variants of the line applied, and the buffer is written in lines of 80 bases as soon as it is full, so the memory
+# used does not depend on the size of the genome or of its contigs.
+# Each variant replaces the REF bases at its position by the ALT bases, so SNVs, insertions and deletions can be applied. If there are several variants
+# at the same position the last one in the file is used, and variants that overlap the bases replaced by a previous one are not applied.
 
-import argparse
+import argparse, os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import stage_cache
 parser = argparse.ArgumentParser()
 parser.add_argument('-var', '-v', action = 'store', dest = 'v_file')
 parser.add_argument('-gnm_ref', '-r', action = 'store', dest = 'gnm_ref')
@@ -13,47 +21,71 @@ v_file = args.v_file
 gnm_ref= args.gnm_ref
 out = args.output
 
-#data in var file should be translated into chromosome: [position,change] format. A list of list will be used.
-variants_list = []
-with open(v_file,"r") as variants:
+line_width = 80
+buffer_size = line_width * 16384
+
+#data in var file is grouped by contig: contig: {position: (length of REF, ALT)}
+variants_by_contig = {}
+with open(v_file,"rb") as variants:
 	for line in variants:
-		if line.startswith("#"):
-			pass
-		line.rstrip()
-		l = []
-		spl = line.split("\t")
-		l.extend([spl[0],spl[1],spl[3]]) # 0 = chromosme, 1 = position, 3= Alt Base
-		variants_list.append(l)
-
-# Function to divide a long string ('data') into chunks of defined length ('batch_size')
-def batch_gen(data, batch_size):
-	for i in range(0, len(data), batch_size):
-		yield data[i:i+batch_size]
-
-#data of the genome reference will be stored in a list of contigs using the Biopython function
-
-# Function to parse fasta file (based on one of the Biopython IOs)
-def read_fasta(fp):
-	name, seq = None, []
+		if line.startswith(b"#") or not line.strip():
+			continue
+		spl = line.rstrip(b"\r\n").split(b"\t") # 0 = chromosme, 1 = position, 2 = Ref bases, 3 = Alt bases
+		variants_by_contig.setdefault(spl[0].decode('utf-8'), {})[int(spl[1]) - 1] = (len(spl[2]), spl[3])
+
+#Variants of a contig sorted by position: [start (0-based), length of REF, ALT]
+def contig_variants(header):
+	name = (header[1:].split() or [b''])[0].decode('utf-8')
+	variants = variants_by_contig.get(name, {})
+	return [(start, ref_length, alt) for start, (ref_length, alt) in sorted(variants.items())]
+
+#Write the full lines of the buffer (all of it at the end of a contig) and keep the rest
+def flush(buffer, output_file, end_of_contig):
+	full = len(buffer) if end_of_contig else len(buffer) // line_width * line_width
+	for i in range(0, full, line_width):
+		output_file.write(buffer[i:i+line_width] + b"\n")
+	del buffer[:full]
+
+with open(gnm_ref,"rb") as fp, open(out,"wb") as output_file:
+	buffer = bytearray()
+	variants = []
+	k = 0			#next variant of the contig
+	position = 0	#bases of the contig read
+	skip = 0		#bases of the contig still to be removed by the last variant
 	for line in fp:
-		line = line.rstrip()
-		if line.startswith('>'):
-			if name: yield (name, ''.join(seq))
-			name, seq = line, []
-		else:
-			seq.append(line)
-	if name: yield (name, ''.join(seq))
-
-#Iteration through contigs. Sequences will be separed in a list, the elements in the list will be replaced
-with open(gnm_ref,"r") as fp:
-	for contig in read_fasta(fp): #contig[0] = name, contig[1] = sequence
-		contig_mutated = list(contig[1]) #String to a list in order to change positions 		
-		for variant in variants_list:
-			if variant[0] == contig[0][1:]: #If the contig is the same (deleting >)
-				contig_mutated[int(variant[1])-1] = variant[2].rstrip() #Change the position for the variant one
-		contig_mutated = "".join(contig_mutated) #recreate the string
-		#Write the brand new fasta
-		with open(out,"a") as output_file:
-			output_file.write(contig[0]+"\n")
-			for chunk in batch_gen(contig_mutated,80):
-				output_file.write(chunk+"\n")
\ No newline at end of file
+		line = line.rstrip(b"\r\n")
+		if line.startswith(b">"):
+			flush(buffer, output_file, True)
+			output_file.write(line + b"\n")
+			variants = contig_variants(line)
+			k = 0
+			position = 0
+			skip = 0
+			continue
+		line_end = position + len(line)
+		i = 0
+		while i < len(line):
+			if skip:
+				removed = min(skip, len(line) - i)
+				i += removed
+				skip -= removed
+				continue
+			if k < len(variants) and variants[k][0] < line_end:
+				start, ref_length, alt = variants[k]
+				k += 1
+				if start < position + i:		#overlaps the previous variant
+					continue
+				buffer += line[i:start - position]
+				buffer += alt
+				i = start - position
+				skip = ref_length
+				continue
+			buffer += line[i:]
+			i = len(line)
+		position = line_end
+		if len(buffer) >= buffer_size:
+			flush(buffer, output_file, False)
+	flush(buffer, output_file, True)
+
+# Index and base statistics of the new genome (genome manifest)
+stage_cache.write_genome_manifest(out)
@@ -1,39 +1,111 @@
-import subprocess
+# This script estimates the read depth of an alignment from a sample of the genome. A number of regions (-regions) of a
+# given size (-region_size) are drawn at random positions of the whole genome (so each contig is sampled according to its
+# length), the depth of every position of the regions is measured with 'samtools depth -a' (several regions at the same time,
+# -threads) and only the histogram of the depths is kept. The regions are drawn with a fixed seed (-seed), so the same
+# alignment always gives the same result.
+#
+# Output: summary of the depths of the sampled positions ('#' lines) and the histogram, one line per depth:
+#	#positions	1000000
+#	#mean	23.41
+#	#median	23
+#	#p5	11		(also p25, p75 and p95)
+#	0	1520	(depth, number of positions)
+#	1	230
+#	...
+# graphic_output/graphic-alignment.py draws the histogram.
+
+import subprocess, os, sys, random, bisect
 import argparse
+from multiprocessing.pool import ThreadPool
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import stage_cache
 parser = argparse.ArgumentParser()
 parser.add_argument('-genome', action="store", dest='genome', required=True)
 parser.add_argument('-bam', action="store", dest='bam', required=True)
 parser.add_argument('-out',action = "store", dest ='out', required=True)
+parser.add_argument('-threads',action = "store", dest ='threads', type=int, default=1)
+parser.add_argument('-regions',action = "store", dest ='regions', type=int, default=40)
+parser.add_argument('-region_size',action = "store", dest ='region_size', type=int, default=25000)
+parser.add_argument('-seed',action = "store", dest ='seed', type=int, default=1)
 args = parser.parse_args()
 
 contig_source = args.genome
 bam = args.bam
 
-def read_fasta(fp):
-	name, seq = None, []
-	for line in fp:
-		line = line.rstrip()
-		if line.startswith('>'):
-			if name: yield (name, ''.join(seq))
-			name, seq = line, []
-		else:
-			seq.append(line)
-	if name: yield (name, ''.join(seq))
-
-with open(contig_source) as fp:
-	dic = {}
-	for name_contig, seq_contig in read_fasta(fp):
-		if name_contig not in dic:
-			dic[name_contig] = ""
-		l = len(seq_contig)	
-		dic[name_contig] = l 
+# Contigs longer than 200 kb (organelles and small scaffolds, with depths unlike the rest of the genome, are not sampled),
+# or all the contigs if there are none so long
+contigs = [(name_contig, int(length_contig)) for name_contig, length_contig in stage_cache.fasta_lengths(contig_source) if int(length_contig) > 0]
+if any(length_contig > 200000 for name_contig, length_contig in contigs):
+	contigs = [(name_contig, length_contig) for name_contig, length_contig in contigs if length_contig > 200000]
+
+# Random regions of the genome. Positions are drawn from the concatenation of the contigs, and the regions of each
+# contig are merged when they overlap so no position is counted twice
+def sample_regions(contigs, n_regions, region_size, seed):
+	starts = []
+	total = 0
+	for name_contig, length_contig in contigs:
+		starts.append(total)
+		total += length_contig
+	rng = random.Random(seed)
+	by_contig = {}
+	for n in range(n_regions):
+		offset = rng.randrange(total)
+		c = bisect.bisect_right(starts, offset) - 1
+		name_contig, length_contig = contigs[c]
+		start = min(offset - starts[c], max(0, length_contig - region_size))
+		by_contig.setdefault(c, []).append((start + 1, min(start + region_size, length_contig)))
+	regions = []
+	for c in sorted(by_contig):
+		merged = []
+		for start, end in sorted(by_contig[c]):
+			if merged and start <= merged[-1][1] + 1:
+				merged[-1][1] = max(merged[-1][1], end)
+			else:
+				merged.append([start, end])
+		regions += [contigs[c][0] + ':' + str(start) + '-' + str(end) for start, end in merged]
+	return regions
+
+# Histogram of the depths of a region
+def region_depth(region):
+	histogram = {}
+	depth_output = subprocess.check_output(['./samtools1/samtools', 'depth', '-a', '-r', region, bam])
+	for line in depth_output.splitlines():
+		depth = int(line.rsplit(b'\t', 1)[1])
+		histogram[depth] = histogram.get(depth, 0) + 1
+	return histogram
+
+# The workflows index the BAM files when they create them
+if not os.path.exists(bam + '.bai') and not os.path.exists(bam[:-3] + 'bai'):
+	subprocess.call(['./samtools1/samtools', 'index', '-b', bam, bam[:-3]+'bai'])
+
+histogram = {}
+if contigs:
+	pool = ThreadPool(max(1, args.threads))
+	for region_histogram in pool.imap_unordered(region_depth, sample_regions(contigs, args.regions, args.region_size, args.seed)):
+		for depth in region_histogram:
+			histogram[depth] = histogram.get(depth, 0) + region_histogram[depth]
+	pool.close()
+
+depths = sorted(histogram)
+positions = sum(histogram.values())
 
+# Lowest depth of a fraction of the sampled positions (the depth of position fraction*positions in the sorted depths)
+def percentile(fraction):
+	target = fraction * positions
+	seen = 0
+	for depth in depths:
+		seen += histogram[depth]
+		if seen >= target:
+			return depth
+	return 0
 
 t = open(args.out,"w")
-subprocess.call(['./samtools1/samtools', 'index', '-b', bam, bam[:-3]+'bai'])		
-for contig in dic:
-	if dic[contig] > 200000:
-		depth_output = subprocess.check_output(['./samtools1/samtools', 'depth', '-a', '-r',contig[1:]+":100000-200000", bam])
-		t.write(depth_output.decode('utf-8'))
-	
-t.close()
\ No newline at end of file
+t.write('#positions\t' + str(positions) + '\n')
+if positions:
+	t.write('#mean\t' + str(round(sum(depth * histogram[depth] for depth in depths) / float(positions), 2)) + '\n')
+	t.write('#median\t' + str(percentile(0.5)) + '\n')
+	for p in (5, 25, 75, 95):
+		t.write('#p' + str(p) + '\t' + str(percentile(p / 100.0)) + '\n')
+for depth in depths:
+	t.write(str(depth) + '\t' + str(histogram[depth]) + '\n')
+t.close()
@@ -14,10 +14,20 @@
     #"interval_width" When the most likely position is chosen, width increse the interval. 
     #"control_modality" takes as values ref and noref, meaning if the line sequenced is from the reference background or not.
     #"snp_analysis_type" It referes to the control used, can be a parental (par) or a F2WT bulk (f2wt)
+    #"threads" number of processes. The windows of the chromosomes are computed in parallel, and the results are read in the order of the chromosomes
+    #   in the genome, so the output is the same with any number of processes
+    #"sweep" (optional) list of window_size:window_space settings. The mapping is repeated with each of them from the same filtered SNPs, and the candidate
+    #   region of each setting is written to "sweep_output" (the output file with .sweep at the end by default), followed by a consensus interval:
+    #   the chromosome chosen by most settings and the region shared by the candidate regions of those settings (or the span of them if they do not overlap)
 
 # Example of use: python3 map-mutation.py -file name_of_va_file -output name_of_output -window_space 500000 -window_space 250000 -fasta genome_used.fa -mode out -interval_width 1000000 -control_modality noref -snp_analysis_type par
+# Sweep: python3 map-mutation.py ... -sweep 600000:500000 350000:250000 250000:25000 -sweep_output name_of_sweep_output
 
-import argparse
+import argparse, os, sys, multiprocessing
+from queue import Empty
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import stage_cache, va_store
+from snp_analysis import chromosome_snps, filtered_snps, calculation_average, chromosomal_position	#AF filter and windows of a chromosome
 parser = argparse.ArgumentParser()
 parser.add_argument('-file', action="store", dest = 'input', required = "True")
 parser.add_argument('-output', action="store", dest = 'output', required = "True")
@@ -29,6 +39,9 @@ parser.add_argument('-interval_width', action="store", dest = 'interval_width',
 parser.add_argument('-control_modality', action="store", dest = 'modality') #ref = parental in reference background; noref = parental not in reference background
 parser.add_argument('-snp_analysis_type', action='store', dest = 'control', required = "True") #Depending on which control is being used: par, f2wt
 parser.add_argument('-known_mutation', action="store", default = 'n/p', dest = 'mut1')
+parser.add_argument('-sweep', action="store", dest = 'sweep', nargs='+', default = []) #window_size:window_space settings
+parser.add_argument('-sweep_output', action="store", dest = 'sweep_output')
+parser.add_argument('-threads', action="store", dest = 'threads', type=int, default = 1)
 
 args = parser.parse_args()
 
@@ -53,171 +66,6 @@ result.close()
 if args.mut1 != "n/p": mut1 = args.mut1
 else: mut1 = "no"
 
-# Gets all the parameters from a file. Uses arguments chromosome and input file. Creates a dictionary per chromosome. dic[POSITION-SNP]=[list other values stored] 
-def getinfo(chro, inpu):
-    n = 0 			#counter n will be used in order not to take into account the header
-    dicpos = {}
-    with open(inpu,"r") as inpu: 
-        for lines in inpu: #inpu.readlines()
-            if n == 0:
-                n +=1
-                continue
-            indiv = lines.split("\t")
-            if indiv[0] != chro:
-                continue
-            dicpos[indiv[1]] = []
-            for n in range(2,len(indiv)):
-                dicpos[indiv[1]].append(indiv[n].rstrip())
-    return dicpos
-
-#Calculates average of a list of AF in a window.	
-def calculation_average(li):
-    average_list = sum(li)/len(li)
-    return average_list
-
-#From the dictionary generated in getinfo, knowing the chromosome and its lenght, the function generates windows according to the parameters size and space between them.
-def chromosomal_position(size,space, SNP, ch, chromosomal_lenght, mode, modality, control): 
-    #Depending on whether we are dealing with ref or noref outcross the SNPs are filtered according to an AF.
-    if modality == "ref":
-        c = 0.7 
-    elif modality == "noref" or "n": #if we are dealing with a backcross, eventhough it is in the ref background we are looking for high AF SNP, that's why modality is n
-        c = 0.3	
-    windowsize = float(size)
-    windowspace = float(space)
-    i = 0 	#is the value in the middle of the windows and the one will be used in order to identify a concrete window																							 
-    chromosomal_size = float(chromosomal_lenght)
-    dictionary_windows = {}
-    a = 0
-    b = 0 
-    while i < chromosomal_size:
-        a = i - windowsize/2
-        b = i + windowsize/2
-        snps_window = []
-        snps_window2 = []
-        for key in SNP:	
-            s = float(key)
-            if s >= a and s < b:
-                if control == "par":	#If the control used is parental, only one AF is calculated and no AF filter is used
-                    AF =float(SNP[key][-1])/(float(SNP[key][-2])+float(SNP[key][-1]))
-                    if c == 0.7 and AF < c:
-                        snps_window.append(AF)
-                    elif c == 0.3 and AF > c:
-                         snps_window.append(AF)
-                elif control == "f2wt":
-                    AF = float(SNP[key][-3])/(float(SNP[key][-3])+ float(SNP[key][-4]))
-                    if c == 0.7 and AF < c:
-                        snps_window.append(AF)
-                    elif c == 0.3 and AF > c:
-                         snps_window.append(AF)
-
-        if len(snps_window) != 0: #if snps have passed the threshold
-            if control == "par":
-                average_FA = calculation_average(snps_window)
-                dictionary_windows[i] = []
-                dictionary_windows[i].append(average_FA)
-            elif control == "f2wt":
-                average_FA = calculation_average(snps_window)
-                dictionary_windows[i] = []
-                dictionary_windows[i].append(average_FA)
-        elif len(snps_window) == 0 and modality == "ref" and control == "par" :  #in the modality outcross of mutant in the reference background, it is possible that a window will not contain any SNP. We will suppose a value near 0.
-            average_FA = 0.01	#Not 0 since later on a division will be made
-            dictionary_windows[i] = []
-            dictionary_windows[i].append(average_FA)
-        i += windowspace
-
-    # DWS: here code to smoothen AF values. Data is stored in dictionary, which is unsorted, so I have to move data
-    # temporarily to list and then reconstruct dictionary.
-
-    # DWS: temporal list with the mean AF of each genomic window
-    tmp_averages_list1 = []
-    # DWS: temporal list with the mean AF of each genomic window after smoothening by calculating averages of three consecutive windows
-    tmp_averages_list2 = []
-    
-    # Extract the AFs from a dictionary and place them in odered list
-    for key,value in sorted(list(dictionary_windows.items()), key=lambda i: int(i[0])):
-        tmp_averages_list1.append(value[0])
-
-    nbrSamplingPoints = len(tmp_averages_list1)
-
-    # Use only one of the following blocks, depending on the size of the AF averages that want to be performed.
-
-    if len(tmp_averages_list1) == 3 or len(tmp_averages_list1) == 4:
-        # Average from the mean AF values of 3 windows
-        for i,n in enumerate(tmp_averages_list1):
-            if i == 0:
-                average = (tmp_averages_list1[i] + tmp_averages_list1[i+1])/2
-            elif i == nbrSamplingPoints - 1:
-                average = (tmp_averages_list1[i-1] + tmp_averages_list1[i])/2
-            else:
-                average = (tmp_averages_list1[i-1] + tmp_averages_list1[i] + tmp_averages_list1[i+1])/3
-        
-            tmp_averages_list2.append(average)
-    
-    elif len(tmp_averages_list1) == 5 or len(tmp_averages_list1) == 6:
-        # Weighted average from the mean AF values of 5 windows
-        for i,n in enumerate(tmp_averages_list1):
-            if i == 0:
-                average = (0.5*tmp_averages_list1[i] + 0.3*tmp_averages_list1[i+1] + 0.2*tmp_averages_list1[i+2])
-            elif i == nbrSamplingPoints - 1:
-                average = (0.2*tmp_averages_list1[i-2] + 0.3*tmp_averages_list1[i-1] + 0.5*tmp_averages_list1[i])
-            elif i == 1:
-                average = (0.3*tmp_averages_list1[i-1] + 0.4*tmp_averages_list1[i] + 0.2*tmp_averages_list1[i+1] + 0.1*tmp_averages_list1[i+2])
-            elif i == nbrSamplingPoints - 2:
-                average = (0.1*tmp_averages_list1[i-2] + 0.2*tmp_averages_list1[i-1] + 0.4*tmp_averages_list1[i] + 0.3*tmp_averages_list1[i+1])
-            else:
-                average = (0.15*tmp_averages_list1[i-2] + 0.2*tmp_averages_list1[i-1] + 0.3*tmp_averages_list1[i] + 0.2*tmp_averages_list1[i+1] + 0.15*tmp_averages_list1[i+2])
-
-            tmp_averages_list2.append(average)
-    
-    elif len(tmp_averages_list1) >= 7:
-        # Weighted average fromthe mean AF values of 7 windows
-        for i,n in enumerate(tmp_averages_list1):
-            
-            if i == 0:
-                average = (0.4*tmp_averages_list1[i] + 0.3*tmp_averages_list1[i+1] + 0.2*tmp_averages_list1[i+2] + 0.1*tmp_averages_list1[i+3])
-            elif i == nbrSamplingPoints - 1:
-                average = (0.1*tmp_averages_list1[i-3] + 0.2*tmp_averages_list1[i-2] + 0.3*tmp_averages_list1[i-1] + 0.4*tmp_averages_list1[i])
-            elif i == 1:
-                average = (0.2*tmp_averages_list1[i-1] + 0.3*tmp_averages_list1[i] + 0.2*tmp_averages_list1[i+1] + 0.15*tmp_averages_list1[i+2] + 0.15*tmp_averages_list1[i+3])
-            elif i == nbrSamplingPoints - 2:
-                average = (0.15*tmp_averages_list1[i-3] + 0.15*tmp_averages_list1[i-2] + 0.2*tmp_averages_list1[i-1] + 0.3*tmp_averages_list1[i] + 0.2*tmp_averages_list1[i+1])
-            elif i == 2:
-                average = (0.1*tmp_averages_list1[i-2] + 0.2*tmp_averages_list1[i-1] + 0.25*tmp_averages_list1[i] + 0.2*tmp_averages_list1[i+1] + 0.15*tmp_averages_list1[i+2] + 0.1*tmp_averages_list1[i+3])
-            elif i == nbrSamplingPoints - 3:
-                average = (0.1*tmp_averages_list1[i-3] + 0.15*tmp_averages_list1[i-2] + 0.2*tmp_averages_list1[i-1] + 0.25*tmp_averages_list1[i] + 0.2*tmp_averages_list1[i+1] + 0.1*tmp_averages_list1[i+2])
-            else:
-                average = (0.1*tmp_averages_list1[i-3] + 0.15*tmp_averages_list1[i-2] + 0.15*tmp_averages_list1[i-1] + 0.2*tmp_averages_list1[i] + 0.15*tmp_averages_list1[i+1] + 0.15*tmp_averages_list1[i+2] + 0.1*tmp_averages_list1[i+3])
-
-            tmp_averages_list2.append(average)
-
-    else:
-        tmp_averages_list2 = tmp_averages_list1;
-    
-
-
-    # Add the mean AF values back to the dictionary where I extracted them originally
-    i = 0
-    for key,value in sorted(list(dictionary_windows.items()), key=lambda i: int(i[0])):
-        #dictionary_windows[key].append(tmp_averages_list2[i])
-        dictionary_windows[key] = tmp_averages_list2[i]
-        i += 1
-
-    # If the alternative line in the previous loop is used, the resulting dictionary contains:
-    #	key: chromosome coordinate of the centre of the window
-    #	value: list with two values:
-    #		0: mean AF of the window
-    #		1: smoothened mean AF of the window (by averaging the mean AFs of three windows)
-    #
-    # Downstream, use the preferable AF mean depending on type of analysis
-
-    # The following block is only needed for development. Can be commented out without causing any problem.
-    with open(output, 'a') as mi:
-        for i in range(len(tmp_averages_list1)):
-            mi.write("&&\t" + ch + "\t" + str(tmp_averages_list1[i]) + "\t" + str(tmp_averages_list2[i]) + '\n')
-
-    return dictionary_windows
-    
-
 #This is a threshold step that will remove windows which do not pass certain values, which will be chosen depending on the mode. To make the processing faster.
 def threshold_step(windows, mini_average, maxi_average):
     refined_dic = {}
@@ -238,7 +86,7 @@ def union_points(windows):
 
 #Data function is different for a backcross or an outcross. This function stores the windows and their attributes boost and average in a file.
 #It also saves different values that will be used later for further processiong of the data, as the chromosome with the higher attribute, its value or the dictionary of positions of that chromosome
-def data_analysis(window, position, chromosome, maximum_position, best_parameter, best_chromosome, best_dictionary, size, mode, control, mut1):  
+def data_analysis(window, position, chromosome, maximum_position, best_parameter, best_chromosome, best_dictionary, size, mode, control, mut1, output):  
     result = open(output ,"a")
     dictionary = {}
     for items in position:
@@ -286,7 +134,8 @@ def data_analysis(window, position, chromosome, maximum_position, best_parameter
 
     return maximum_position, best_parameter, best_chromosome, best_dictionary
 
-def final_processing_A(result, interval_width):       #is the one used in the oc
+#The final processing functions write the candidate region to the output, and return it (chromosome, start, end)
+def final_processing_A(result, interval_width, size, output):       #is the one used in the oc
     great_positions = [] #Creation of a list of values with the maximum parameter (boost/ratio), then calculation of the middle value  and create a bigger window
     for windows in result[-1]:
         b_value = result[-1][windows]
@@ -316,9 +165,11 @@ def final_processing_A(result, interval_width):       #is the one used in the oc
         windos = str(windos)
         escribir = "*"+ "\t"+result[2] +"\t" + str(int(windos)-size/2)+ "\t" + str(int(windos)+size/2)+"\t" + str(result[3][int(windos)]) + "\n"
         r.write(escribir)
+    r.close()
+    return result[2], min_i, maxi_i
 
 
-def final_processing_B(result,interval_width):
+def final_processing_B(result,interval_width, size, output):
     great_positions = []
     for windows in result[-1]:
         average = result[-1][windows]
@@ -338,24 +189,14 @@ def final_processing_B(result,interval_width):
     r.write("?"+"\t"+str(result[2]) +"\t"+ str(min_i)+"\t"+ str(maxi_d) +"\n")
     #for widos in candidate_list:
     #	r.write("*"+"\t"+str(result[2]) +"\t" + str(int(widos)-size/2) +"\t"+ str(int(widos)+size/2)+"\t" + str(result[-1][widos][0])+ "\n")
+    r.close()
+    return result[2], min_i, maxi_d
 
 
-def read_fasta(fp):
-    name, seq = None, []
-    for line in fp:
-        line = line.rstrip()
-        if line.startswith('>'):
-            if name: yield (name, ''.join(seq))
-            name, seq = line, []
-        else:
-            seq.append(line)
-    if name: yield (name, ''.join(seq))
-
 ch = {}
-#From the data of read_fasta, I create a dictionary with the name of the contigs and its lenght
-with open(fasta_input) as fp:
-    for name_contig, seq_contig in read_fasta(fp):
-        ch[name_contig[1:len(name_contig)]] = len(seq_contig)
+#From the genome manifest, I create a dictionary with the name of the contigs and its lenght
+for name_contig, length_contig in stage_cache.fasta_lengths(fasta_input):
+    ch[name_contig] = length_contig
 
 #Calling of the different functions depends on whether we are working in an outcross or backcross
 
@@ -367,15 +208,20 @@ if mode == "out":
 if control == "f2wt":
     final_processing = function_used[0]
 
-#Call of the function chromosome by chromosome, the final result comes from the chromosome with the higher parameters
-z = 0
+#Window settings: the one of the output and the ones of the sweep
+settings = [(size, space)]
+for setting in args.sweep:
+    settings.append(tuple(int(value) for value in setting.split(':')))
 
-for chromosome in ch:
-    if int(ch[chromosome]) > 2000000:								#	<---- SDL 28-11-18, DEBUGGING
-        inpu = args.input	
-        genome = getinfo(chromosome,inpu)
+table = va_store.load(args.input)
+chromosomes = [chromosome for chromosome in ch if int(ch[chromosome]) > 2000000]		#	<---- SDL 28-11-18, DEBUGGING
 
-        windows = chromosomal_position(size, space, genome, chromosome, ch[chromosome], mode, modality, control)
+#Windows of a chromosome with each setting. The AF filter of its SNPs is applied once for all the settings
+def chromosome_windows(chromosome):
+    genome = filtered_snps(chromosome_snps(chromosome, table), modality, control)
+    results = []
+    for window_size, window_space in settings:
+        windows, development_lines = chromosomal_position(window_size, window_space, genome, chromosome, ch[chromosome], mode, modality, control)
 
         if mode == "out" and control == "par" :
             if modality == "noref":
@@ -386,20 +232,115 @@ for chromosome in ch:
                 maxi_average= 0.6    
             windows = threshold_step(windows, mini_average, maxi_average)
 
-        x_value = union_points(windows)
+        results.append((windows, union_points(windows), development_lines))
+    return results
+
+#Worker process: windows of its share of the chromosomes. The processes are forked, so they use the table of the main process
+def worker(share, queue):
+    try:
+        queue.put((share, [(n, chromosome_windows(chromosomes[n])) for n in share], None))
+    except BaseException as error:
+        queue.put((share, [], repr(error)))
+
+processes = max(1, min(args.threads, len(chromosomes)))
+chromosome_results = {}
+if processes == 1:
+    for n in range(len(chromosomes)):
+        chromosome_results[n] = chromosome_windows(chromosomes[n])
+else:
+    #The largest chromosomes are shared first, one to each process in turn
+    by_length = sorted(range(len(chromosomes)), key=lambda n: -int(ch[chromosomes[n]]))
+    shares = [by_length[k::processes] for k in range(processes)]
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    pool = [context.Process(target=worker, args=(share, queue)) for share in shares]
+    for process in pool:
+        process.start()
+    errors = []
+    received = 0
+    while received < len(pool):
+        try:
+            share, results, error = queue.get(timeout=10)
+        except Empty:
+            if any(process.is_alive() for process in pool):
+                continue
+            try:
+                share, results, error = queue.get(timeout=10)
+            except Empty:
+                errors.append('a worker process ended without results')
+                break
+        received += 1
+        if error is not None:
+            errors.append(error)
+        chromosome_results.update(results)
+    for process in pool:
+        process.join()
+    if errors:
+        sys.exit('map-mutation.py: ' + '; '.join(errors))
+
+#Call of the function chromosome by chromosome, the final result comes from the chromosome with the higher parameters.
+#Returns the candidate region, or None if no chromosome has windows with this setting
+def mapping(setting, output):
+    size = settings[setting][0]
+    z = 0
+    for n, chromosome in enumerate(chromosomes):
+        windows, x_value, development_lines = chromosome_results[n][setting]
+        if output != os.devnull:
+            with open(output, 'a') as mi:
+                mi.writelines(development_lines)
 
         if z == 0:
-            result_data = data_analysis(windows, x_value, chromosome, "n/p", "n/p", "n/p", "n/p", size, mode, control, mut1)
+            result_data = data_analysis(windows, x_value, chromosome, "n/p", "n/p", "n/p", "n/p", size, mode, control, mut1, output)
             best = result_data[1]
             maximum_position = result_data[0]
             best_chromosome = result_data[2]
             best_dictionary = result_data[3]
         else:
-            result_data = data_analysis(windows, x_value, chromosome,maximum_position,best, best_chromosome, best_dictionary, size, mode, control,mut1)
+            result_data = data_analysis(windows, x_value, chromosome,maximum_position,best, best_chromosome, best_dictionary, size, mode, control,mut1, output)
             best = result_data[1]
             maximum_position = result_data[0]
             best_chromosome = result_data[2]
             best_dictionary = result_data[3]
         z += 1
 
-final_processing(result_data, interval_width)
\ No newline at end of file
+    if z == 0 or best_chromosome == "n/p":
+        return None
+    return final_processing(result_data, interval_width, size, output)
+
+main_region = mapping(0, output)
+
+#Sweep: candidate region of each window setting (the windows are not written) and consensus interval
+if args.sweep:
+    regions = []
+    for setting in range(1, len(settings)):
+        sweep_size, sweep_space = settings[setting]
+        regions.append((sweep_size, sweep_space, mapping(setting, os.devnull)))
+
+    sweep_output = args.sweep_output or output + '.sweep'
+    with open(sweep_output, 'w') as sw:
+        sw.write('#window_size\twindow_space\tchromosome\tmin_big_window\tmax_big_window\n')
+        for sweep_size, sweep_space, region in regions:
+            if region is None:
+                sw.write(str(sweep_size) + '\t' + str(sweep_space) + '\t-\t-\t-\n')
+            else:
+                sw.write(str(sweep_size) + '\t' + str(sweep_space) + '\t' + str(region[0]) + '\t' + str(region[1]) + '\t' + str(region[2]) + '\n')
+
+        #Consensus: chromosome of most settings (the first one of them in the sweep if several have the same number), region shared by them
+        found = [region for sweep_size, sweep_space, region in regions if region is not None]
+        if found:
+            chromosomes = [region[0] for region in found]
+            consensus_chromosome = max(chromosomes, key=lambda name: (chromosomes.count(name), -chromosomes.index(name)))
+            consensus = [region for region in found if region[0] == consensus_chromosome]
+            start = max(region[1] for region in consensus)
+            end = min(region[2] for region in consensus)
+            agreement = 'overlap'
+            if start > end:
+                start = min(region[1] for region in consensus)
+                end = max(region[2] for region in consensus)
+                agreement = 'span'
+            sw.write('consensus\t' + str(len(consensus)) + '/' + str(len(regions)) + '\t' + consensus_chromosome + '\t' + str(start) + '\t' + str(end) + '\t' + agreement + '\n')
+        else:
+            sw.write('consensus\t0/' + str(len(regions)) + '\t-\t-\t-\n')
+
+if main_region is None:
+    sys.exit('map-mutation.py: no window with SNPs with window_size ' + str(size) + ' and window_space ' + str(space))
@@ -1,28 +1,17 @@
 #SDL 01/20
 #Snippet to roughly determine the size of the candidate interval accodring to the size of the whole genome
-import argparse
+import argparse, os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import stage_cache
 #We create the input and output objects
 parser = argparse.ArgumentParser()
 parser.add_argument('-a', action="store", dest = 'input')
 args = parser.parse_args()
 
-#A function to parse the genome fasta
-def read_fasta(fp):
-	name, seq = None, []
-	for line in fp:
-		line = line.rstrip()
-		if line.startswith('>'):
-			if name: yield (name, ''.join(seq))
-			name, seq = line, []
-		else:
-			seq.append(line)
-	if name: yield (name, ''.join(seq))
-
-#Creates a dictionary with name_contig: seq_contig
+#Creates a dictionary with name_contig: length_contig, from the genome manifest
 ch = {}
-with open(str(args.input), 'r') as fp: 
-	for name_contig, seq_contig in read_fasta(fp):
-		ch[name_contig[1:len(name_contig)]] = len(seq_contig)
+for name_contig, length_contig in stage_cache.fasta_lengths(str(args.input)):
+	ch[name_contig] = length_contig
 
 #Calculates average length of contigs > 4mb
 tot_len=0
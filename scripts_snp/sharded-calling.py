@@ -0,0 +1,129 @@
+#
+# This script runs the variant calling of a sample (samtools mpileup | bcftools call) split in regions of
+# the genome, so several regions can be processed at the same time. The regions are obtained from the
+# BAM index: each contig with aligned reads is divided in regions of -region_size nucleotides (or taken
+# as a whole if -region_size is 0). The VCF of each region is written to a temporary folder, and then all
+# of them are concatenated in the genome order. The variants in the output are the same that a single
+# mpileup | bcftools call over the whole BAM file would report.
+# If the output name ends with .gz, the VCF is compressed with bgzip by bcftools itself: the first region
+# keeps the header, the rest are written without it, and the compressed regions are joined as they are.
+#
+# Usage example:
+# python3 sharded-calling.py -bam alignment1.bam -fasta genome.fa -out raw_variants.vcf.gz -threads 8 -adjust_mq 50
+#
+
+import argparse, os, shutil, subprocess
+from multiprocessing.pool import ThreadPool
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-bam', action="store", dest='bam', required=True)
+parser.add_argument('-fasta', action="store", dest='fasta', required=True)
+parser.add_argument('-out', action="store", dest='output', required=True)
+parser.add_argument('-threads', action="store", dest='threads', type=int, default=1)
+parser.add_argument('-region_size', action="store", dest='region_size', type=int, default=5000000)
+parser.add_argument('-adjust_mq', action="store", dest='adjust_mq', type=int, default=0) 		# mpileup -C, 0 = disabled
+parser.add_argument('-log', action="store", dest='log', default=os.devnull) 					# stderr of mpileup and bcftools
+args = parser.parse_args()
+
+samtools = './samtools1/samtools'
+bcftools = './bcftools-1.3.1/bcftools'
+
+tmp_dir = args.output + '.shards'
+compressed = args.output.endswith('.gz')
+shard_ext = '.vcf.gz' if compressed else '.vcf'
+
+# Contigs in the order of the BAM header, with their length and number of aligned reads
+def bam_contigs(bam):
+	if not os.path.exists(bam + '.bai') and not os.path.exists(bam[:-3] + 'bai'):
+		subprocess.check_call([samtools, 'index', bam])
+	idxstats = subprocess.check_output([samtools, 'idxstats', bam]).decode('utf-8')
+	contigs = []
+	for line in idxstats.splitlines():
+		sp = line.split('\t')
+		if sp[0] == '*':
+			continue
+		contigs.append((sp[0], int(sp[1]), int(sp[2])))
+	return contigs
+
+# Regions in genome order. Contigs with no aligned reads produce no variants and are skipped
+def genome_regions(contigs, region_size):
+	regions = []
+	for contig, length, mapped in contigs:
+		if mapped == 0:
+			continue
+		if region_size <= 0 or length <= region_size:
+			regions.append(contig)
+		else:
+			for start in range(1, length + 1, region_size):
+				regions.append(contig + ':' + str(start) + '-' + str(min(start + region_size - 1, length)))
+	return regions
+
+def call_region(job):
+	n, region = job
+	shard = os.path.join(tmp_dir, str(n) + shard_ext)
+	mpileup_cmd = [samtools, 'mpileup', '-t', 'DP,ADF,ADR']
+	if args.adjust_mq > 0:
+		mpileup_cmd += ['-C', str(args.adjust_mq)]
+	mpileup_cmd += ['-r', region, '-uf', args.fasta, args.bam]
+	with open(shard, 'w') as out, open(os.path.join(tmp_dir, str(n) + '.log'), 'w') as log:
+		mpileup = subprocess.Popen(mpileup_cmd, stdout=subprocess.PIPE, stderr=log)
+		if not compressed:
+			call = subprocess.Popen([bcftools, 'call', '-mv', '-Ov'], stdin=mpileup.stdout, stdout=out, stderr=log)
+		elif n == 0:
+			call = subprocess.Popen([bcftools, 'call', '-mv', '-Oz'], stdin=mpileup.stdout, stdout=out, stderr=log)
+		else:
+			call = subprocess.Popen([bcftools, 'call', '-mv', '-Ou'], stdin=mpileup.stdout, stdout=subprocess.PIPE, stderr=log)
+			view = subprocess.Popen([bcftools, 'view', '-H', '-Oz'], stdin=call.stdout, stdout=out, stderr=log)
+			call.stdout.close()
+		mpileup.stdout.close()
+		if compressed and n > 0:
+			view_status = view.wait()
+		else:
+			view_status = 0
+		call_status = call.wait()
+		mpileup_status = mpileup.wait()
+	return region, mpileup_status == 0 and call_status == 0 and view_status == 0
+
+if os.path.exists(tmp_dir):
+	shutil.rmtree(tmp_dir)
+os.makedirs(tmp_dir)
+
+regions = genome_regions(bam_contigs(args.bam), args.region_size)
+
+pool = ThreadPool(max(1, args.threads))
+results = pool.map(call_region, list(enumerate(regions)))
+pool.close()
+
+# Keep the messages of mpileup and bcftools of every region
+with open(args.log, 'a') as log:
+	for n in range(len(regions)):
+		with open(os.path.join(tmp_dir, str(n) + '.log')) as region_log:
+			log.write(region_log.read())
+
+failed = [region for region, ok in results if not ok]
+if failed:
+	shutil.rmtree(tmp_dir)
+	raise SystemExit('sharded-calling.py: variant calling failed in region(s) ' + ', '.join(failed))
+
+# Concatenate the regions: header of the first one, then the variants of all of them in genome order
+with open(args.output, 'wb') as out:
+	for n in range(len(regions)):
+		with open(os.path.join(tmp_dir, str(n) + shard_ext), 'rb') as shard:
+			if compressed:
+				shutil.copyfileobj(shard, out)
+				continue
+			for line in shard:
+				if line.startswith(b'#'):
+					if n == 0:
+						out.write(line)
+				else:
+					out.write(line)
+
+	# No aligned reads at all: write the header that a call over the whole BAM file would write
+	if not regions:
+		header = subprocess.Popen([samtools, 'mpileup', '-t', 'DP,ADF,ADR', '-uf', args.fasta, args.bam], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+		subprocess.call([bcftools, 'call', '-mv', '-Oz' if compressed else '-Ov'], stdin=header.stdout, stdout=out, stderr=subprocess.DEVNULL)
+		header.stdout.close()
+		header.wait()
+
+shutil.rmtree(tmp_dir)
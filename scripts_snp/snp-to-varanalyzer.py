@@ -1,21 +1,24 @@
 # This script formats the SNP information for varanalyzer
-import argparse
+import argparse, os, sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import va_store
 parser = argparse.ArgumentParser()
 parser.add_argument('-a', action="store", dest='input')
 parser.add_argument('-b', action="store", dest='output')
 
 args = parser.parse_args()
 
-#input
-f1 = open(args.input, 'r')
-lines = f1.readlines()
+#input: columns of the VA table (see workflows/va_store.py), the allele frequency of all the SNPs is computed at once
+table = va_store.load(args.input)
+with np.errstate(divide='ignore', invalid='ignore'):
+	allele_frequencies = table.alt_dp.astype(float) / (table.ref_dp.astype(float) + table.alt_dp.astype(float))
 
 #output
 f2 = open(args.output, 'w')
 f2.write('#data\tcontig\tpos\tref\talt\tqual\tref_count\talt_count\taf\n')
 
-for line in lines:
+for line, allele_frequency in zip(table.lines(), allele_frequencies.tolist()):
 	sp = line.split()
-
-	allele_frequency = float(sp[6].strip()) / ( float(sp[5].strip()) + float(sp[6].strip()) )
-	f2.write('snp' + '\t' + sp[0].strip() + '\t' + sp[1].strip() + '\t' + sp[2].strip() + '\t' + sp[3].strip() + '\t' + sp[4].strip() + '\t' + sp[5].strip() + '\t' + sp[6].strip() + '\t' + "{0:.2f}".format(allele_frequency) + '\n')
+	f2.write('snp' + '\t' + sp[0] + '\t' + sp[1] + '\t' + sp[2] + '\t' + sp[3] + '\t' + sp[4] + '\t' + sp[5] + '\t' + sp[6] + '\t' + "{0:.2f}".format(allele_frequency) + '\n')
+f2.close()
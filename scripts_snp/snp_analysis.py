@@ -0,0 +1,309 @@
+#
+# Functions of the snp workflow that work on the variant tables loaded with workflows/va_store.py: the variant
+# filter of variants-filter.py, the join of the mutant and control tables of af-comparison.py and the allele
+# frequency windows of map-mutation.py. The scripts are the command line tools of these functions, and the
+# functions can be called from any other Python code:
+#
+#	sys.path.append(os.path.join(easymap_folder, 'workflows'))
+#	sys.path.append(os.path.join(easymap_folder, 'scripts_snp'))
+#	import va_store, snp_analysis
+#	table = va_store.load(va_path)
+#	selected = snp_analysis.filter_variants(table, {'dp_min': 10, 'qual_min': 20})
+#	table.write(output_path, selected)
+#
+
+import numpy as np
+
+
+###################################################################################################################################
+#	Variant filter (variants-filter.py)
+###################################################################################################################################
+
+# Options of the filter and their default values. Values can be numbers or strings (as given in the command line)
+filter_defaults = {'mut_type': 'all', 'qual_min': 0, 'dp_min': 0, 'dp_max': 8000, 'af_min': 0, 'af_max': 2, 'pos_min': 0, 'pos_max': 1000000000}
+
+# Variants whose position, quality, depth and allele frequency are within the limits
+def filter_limits(table, options):
+	options = dict(filter_defaults, **options)
+	dp = table.ref_dp.astype(np.int64) + table.alt_dp.astype(np.int64)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		af = table.alt_dp.astype(np.int64) / dp.astype(float)
+	qual = table.qual.astype(float)
+	return (
+		(int(options['pos_min']) < table.pos) & (table.pos < int(options['pos_max']))
+		& (qual > float(options['qual_min']))
+		& (int(options['dp_min']) < dp) & (dp < int(options['dp_max']))
+		& (float(options['af_min']) < af) & (af < float(options['af_max']))
+		)
+
+# Variants of the type of mutation selected: all, or EMS transitions (G>A, C>T)
+def filter_mutations(table, mut_type):
+	if mut_type.strip() == 'EMS':
+		return ((table.ref == b'G') & (table.alt == b'A')) | ((table.ref == b'C') & (table.alt == b'T'))
+	if mut_type.strip() == 'all':
+		return np.ones(table.rows, dtype=bool)
+	return np.zeros(table.rows, dtype=bool)
+
+# Variants in a list of contigs (all of them if the first one is '*')
+def filter_contigs(table, names):
+	if names[0] == '*':
+		return np.ones(table.rows, dtype=bool)
+	return np.isin(table.chrom, [table.chrom_code(name.strip()) for name in names])
+
+# Single nucleotide variants in a list of contigs (names compared in lower case)
+def filter_snvs(table, names):
+	names = set(name.lower() for name in names)
+	return ((np.char.str_len(table.ref) == 1) & (np.char.str_len(table.alt) == 1)
+		& np.isin(table.chrom, [code for code, name in enumerate(table.chroms) if name.lower() in names]))
+
+# Variants that pass the filter with the options given (the options not given take their default values)
+def filter_variants(table, options):
+	options = dict(filter_defaults, **options)
+	return filter_mutations(table, options['mut_type']) & filter_limits(table, options)
+
+
+###################################################################################################################################
+#	Comparison of the allele frequencies of the mutant and control tables (af-comparison.py)
+###################################################################################################################################
+
+# Contig of each variant (its index in the list of contigs, -1 if it is not there), position key and allele frequency
+def _join_columns(table, contig_index):
+	codes = np.array([contig_index.get(name, -1) for name in table.chroms] + [-1], dtype=np.int64)
+	contig = codes[table.chrom.astype(np.int64)] if table.rows else np.zeros(0, dtype=np.int64)
+	keys = (contig << 32) | table.pos.astype(np.int64)
+	alt_dp = table.alt_dp.astype(float)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		af = alt_dp / (alt_dp + table.ref_dp.astype(float))
+	return contig, keys, af
+
+# Sorted keys of the selected rows and, for each key, the last of those rows (the one that the line-by-line
+# version of af-comparison.py kept in its dictionaries)
+def _last_rows(selected, keys):
+	rows = np.flatnonzero(selected)[::-1]
+	sorted_keys, first = np.unique(keys[rows], return_index=True)
+	return sorted_keys, rows[first]
+
+# For each of 'keys', the row of the table (sorted_keys, rows) with the same key, or -1
+def _lookup(keys, sorted_keys, rows):
+	if len(sorted_keys) == 0:
+		return np.full(len(keys), -1, dtype=np.int64)
+	found = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+	return np.where(sorted_keys[found] == keys, rows[found], -1)
+
+# Output lines of af-comparison.py for the tables of the mutant and the control, the contigs of the genome (in
+# order), the step (1, 2 or 3) and the mode (ref or noref)
+def af_comparison(mut, wt, contigs, step, mode):
+	contig_index = dict((name, n) for n, name in enumerate(contigs))
+	mut_contig, mut_keys, mut_af = _join_columns(mut, contig_index)
+	wt_contig, wt_keys, wt_af = _join_columns(wt, contig_index)
+
+	out_wt = np.zeros(0, dtype=np.int64)
+	wt_match = np.zeros(wt.rows, dtype=np.int64)
+	min_per_contig = 0
+
+	if (mode == "noref" or mode == "ref") and (step == 1 or step == 2):
+		mut_selected = (mut_contig >= 0) & (mut_af > 0.85)
+		mut_sorted, mut_rows = _last_rows(mut_selected, mut_keys)
+		wt_match = _lookup(wt_keys, mut_sorted, mut_rows)
+		wt_selected = (wt_contig >= 0) & (wt_match >= 0)
+		if mode == "noref":
+			AF_wt_100 = (wt_af * 100).astype(np.int64)
+			AF_mut_100 = np.where(wt_match >= 0, (mut_af[wt_match] * 100).astype(np.int64), AF_wt_100)
+			wt_selected &= (wt_af < 0.5) & (AF_mut_100 - AF_wt_100 > 60)
+		out_wt = np.flatnonzero(wt_selected)
+		min_per_contig = 3
+
+	if step == 3:
+		mut_selected = (mut_contig >= 0) & (mut_af > 0.2) & (mut_af < 0.85)
+		mut_sorted, mut_rows = _last_rows(mut_selected, mut_keys)
+		wt_match = _lookup(wt_keys, mut_sorted, mut_rows)
+		wt_selected = (wt_contig >= 0) & (wt_af > 0.2) & (wt_af < 0.85) & (wt_match >= 0)
+		out_wt = np.flatnonzero(wt_selected)
+
+	# Contigs in the order of the genome, control variants in the order of the file
+	out_wt = out_wt[np.argsort(wt_contig[out_wt], kind='stable')]
+	if min_per_contig:
+		per_contig = np.bincount(wt_contig[out_wt], minlength=len(contigs))
+		out_wt = out_wt[per_contig[wt_contig[out_wt]] >= min_per_contig]
+
+	# Fields of the mutant variant and of the last control variant at each position
+	wt_sorted, wt_rows = _last_rows(np.isin(np.arange(wt.rows), out_wt), wt_keys)
+	wt_last = _lookup(wt_keys[out_wt], wt_sorted, wt_rows)
+	mut_fields = [line.rstrip('\n').split('\t') for line in mut.lines(wt_match[out_wt])]
+	wt_fields = [line.rstrip('\n').split('\t') for line in wt.lines(wt_last)]
+	pos_fields = [line.split('\t')[1] for line in wt.lines(out_wt)]
+
+	lines = []
+	for n, row in enumerate(out_wt.tolist()):
+		chr = contigs[wt_contig[row]]
+		i = pos_fields[n]
+		m = mut_fields[n]
+		w = wt_fields[n]
+		if step == 1:
+			lines.append(chr + '\t' + i + '\t' + m[2] + '\t' + m[3] + '\t' + m[4] + '\t' + w[5] + '\t' + w[6] + '\t' + m[5] + '\t' + m[6] + '\n')
+		else:
+			lines.append(chr + '\t' + i + '\t' + m[2] + '\t' + m[3] + '\t' + m[4] + '\t' + m[5] + '\t' + m[6] + '\t' + w[5] + '\t' + w[6] + '\n')
+	return lines
+
+
+###################################################################################################################################
+#	Allele frequency windows of a chromosome (map-mutation.py)
+###################################################################################################################################
+
+# Gets the variants of a chromosome from a table. The variants are sorted by position, with one variant per position
+# (the last one in the file, as the dictionary of the previous version of map-mutation.py). As before, the first line
+# of the file is taken as the header and not used. Returns the positions and the depths of the variants
+def chromosome_snps(chro, table):
+	rows = np.flatnonzero(table.chrom == table.chrom_code(chro))
+	if not table.header:
+		rows = rows[rows > 0]
+	rows = rows[::-1]
+	positions, last = np.unique(table.pos[rows], return_index=True)
+	return positions.astype(float), table.depths[rows[last]].astype(float)
+
+# AF of the SNPs of a chromosome that pass the AF filter. Returns the sorted positions of the SNPs, the number of SNPs that
+# pass the filter before each of them (prefix counts, so the SNPs of any window that pass the filter are a slice of the AF
+# list) and the AF of the SNPs that pass the filter, in the order of their positions.
+def filtered_snps(SNP, modality, control):
+	#Depending on whether we are dealing with ref or noref outcross the SNPs are filtered according to an AF.
+	if modality == "ref":
+		c = 0.7
+	elif modality == "noref" or "n": #if we are dealing with a backcross, eventhough it is in the ref background we are looking for high AF SNP, that's why modality is n
+		c = 0.3
+	positions, depths = SNP
+	with np.errstate(divide='ignore', invalid='ignore'):
+		if control == "par":	#If the control used is parental, only one AF is calculated and no AF filter is used
+			AF = depths[:, -1]/(depths[:, -2]+depths[:, -1])
+		elif control == "f2wt":
+			AF = depths[:, -3]/(depths[:, -3]+depths[:, -4])
+		else:
+			AF = np.full(len(positions), np.nan)
+	if c == 0.7:
+		passed = AF < c
+	else:
+		passed = AF > c
+	counts = np.concatenate(([0], np.cumsum(passed)))
+	return positions, counts, AF[passed].tolist()
+
+#Calculates average of a list of AF in a window.
+def calculation_average(li):
+	average_list = sum(li)/len(li)
+	return average_list
+
+#From the filtered SNPs of a chromosome, knowing the chromosome and its lenght, the function generates windows according to the parameters size and space between them.
+#The SNPs of each window are found by binary search in the sorted positions. The average AF of a window is the sum of the AF of its SNPs
+#in order of position, as in the previous version: windows with the same SNPs must have exactly the same average, because the final
+#processing looks for the windows equal to the maximum.
+#Returns the windows and the development lines of the chromosome, which are written to the output by the main process.
+def chromosomal_position(size,space, SNP, ch, chromosomal_lenght, mode, modality, control):
+	positions, counts, AF = SNP
+	windowsize = float(size)
+	windowspace = float(space)
+	i = 0 	#is the value in the middle of the windows and the one will be used in order to identify a concrete window
+	chromosomal_size = float(chromosomal_lenght)
+	centres = []
+	while i < chromosomal_size:
+		centres.append(i)
+		i += windowspace
+	centres = np.array(centres, dtype=float)
+	first = np.searchsorted(positions, centres - windowsize/2, side='left')
+	last = np.searchsorted(positions, centres + windowsize/2, side='left')
+	dictionary_windows = {}
+	for i, start, end in zip(centres.tolist(), counts[first].tolist(), counts[last].tolist()):
+		if end > start: #if snps have passed the threshold
+			dictionary_windows[i] = [calculation_average(AF[start:end])]
+		elif modality == "ref" and control == "par" :  #in the modality outcross of mutant in the reference background, it is possible that a window will not contain any SNP. We will suppose a value near 0.
+			average_FA = 0.01	#Not 0 since later on a division will be made
+			dictionary_windows[i] = [average_FA]
+
+	# DWS: here code to smoothen AF values. Data is stored in dictionary, which is unsorted, so I have to move data
+	# temporarily to list and then reconstruct dictionary.
+
+	# DWS: temporal list with the mean AF of each genomic window
+	tmp_averages_list1 = []
+	# DWS: temporal list with the mean AF of each genomic window after smoothening by calculating averages of three consecutive windows
+	tmp_averages_list2 = []
+
+	# Extract the AFs from a dictionary and place them in odered list
+	for key,value in sorted(list(dictionary_windows.items()), key=lambda i: int(i[0])):
+		tmp_averages_list1.append(value[0])
+
+	nbrSamplingPoints = len(tmp_averages_list1)
+
+	# Use only one of the following blocks, depending on the size of the AF averages that want to be performed.
+
+	if len(tmp_averages_list1) == 3 or len(tmp_averages_list1) == 4:
+		# Average from the mean AF values of 3 windows
+		for i,n in enumerate(tmp_averages_list1):
+			if i == 0:
+				average = (tmp_averages_list1[i] + tmp_averages_list1[i+1])/2
+			elif i == nbrSamplingPoints - 1:
+				average = (tmp_averages_list1[i-1] + tmp_averages_list1[i])/2
+			else:
+				average = (tmp_averages_list1[i-1] + tmp_averages_list1[i] + tmp_averages_list1[i+1])/3
+
+			tmp_averages_list2.append(average)
+
+	elif len(tmp_averages_list1) == 5 or len(tmp_averages_list1) == 6:
+		# Weighted average from the mean AF values of 5 windows
+		for i,n in enumerate(tmp_averages_list1):
+			if i == 0:
+				average = (0.5*tmp_averages_list1[i] + 0.3*tmp_averages_list1[i+1] + 0.2*tmp_averages_list1[i+2])
+			elif i == nbrSamplingPoints - 1:
+				average = (0.2*tmp_averages_list1[i-2] + 0.3*tmp_averages_list1[i-1] + 0.5*tmp_averages_list1[i])
+			elif i == 1:
+				average = (0.3*tmp_averages_list1[i-1] + 0.4*tmp_averages_list1[i] + 0.2*tmp_averages_list1[i+1] + 0.1*tmp_averages_list1[i+2])
+			elif i == nbrSamplingPoints - 2:
+				average = (0.1*tmp_averages_list1[i-2] + 0.2*tmp_averages_list1[i-1] + 0.4*tmp_averages_list1[i] + 0.3*tmp_averages_list1[i+1])
+			else:
+				average = (0.15*tmp_averages_list1[i-2] + 0.2*tmp_averages_list1[i-1] + 0.3*tmp_averages_list1[i] + 0.2*tmp_averages_list1[i+1] + 0.15*tmp_averages_list1[i+2])
+
+			tmp_averages_list2.append(average)
+
+	elif len(tmp_averages_list1) >= 7:
+		# Weighted average fromthe mean AF values of 7 windows
+		for i,n in enumerate(tmp_averages_list1):
+
+			if i == 0:
+				average = (0.4*tmp_averages_list1[i] + 0.3*tmp_averages_list1[i+1] + 0.2*tmp_averages_list1[i+2] + 0.1*tmp_averages_list1[i+3])
+			elif i == nbrSamplingPoints - 1:
+				average = (0.1*tmp_averages_list1[i-3] + 0.2*tmp_averages_list1[i-2] + 0.3*tmp_averages_list1[i-1] + 0.4*tmp_averages_list1[i])
+			elif i == 1:
+				average = (0.2*tmp_averages_list1[i-1] + 0.3*tmp_averages_list1[i] + 0.2*tmp_averages_list1[i+1] + 0.15*tmp_averages_list1[i+2] + 0.15*tmp_averages_list1[i+3])
+			elif i == nbrSamplingPoints - 2:
+				average = (0.15*tmp_averages_list1[i-3] + 0.15*tmp_averages_list1[i-2] + 0.2*tmp_averages_list1[i-1] + 0.3*tmp_averages_list1[i] + 0.2*tmp_averages_list1[i+1])
+			elif i == 2:
+				average = (0.1*tmp_averages_list1[i-2] + 0.2*tmp_averages_list1[i-1] + 0.25*tmp_averages_list1[i] + 0.2*tmp_averages_list1[i+1] + 0.15*tmp_averages_list1[i+2] + 0.1*tmp_averages_list1[i+3])
+			elif i == nbrSamplingPoints - 3:
+				average = (0.1*tmp_averages_list1[i-3] + 0.15*tmp_averages_list1[i-2] + 0.2*tmp_averages_list1[i-1] + 0.25*tmp_averages_list1[i] + 0.2*tmp_averages_list1[i+1] + 0.1*tmp_averages_list1[i+2])
+			else:
+				average = (0.1*tmp_averages_list1[i-3] + 0.15*tmp_averages_list1[i-2] + 0.15*tmp_averages_list1[i-1] + 0.2*tmp_averages_list1[i] + 0.15*tmp_averages_list1[i+1] + 0.15*tmp_averages_list1[i+2] + 0.1*tmp_averages_list1[i+3])
+
+			tmp_averages_list2.append(average)
+
+	else:
+		tmp_averages_list2 = tmp_averages_list1;
+
+
+
+	# Add the mean AF values back to the dictionary where I extracted them originally
+	i = 0
+	for key,value in sorted(list(dictionary_windows.items()), key=lambda i: int(i[0])):
+		#dictionary_windows[key].append(tmp_averages_list2[i])
+		dictionary_windows[key] = tmp_averages_list2[i]
+		i += 1
+
+	# If the alternative line in the previous loop is used, the resulting dictionary contains:
+	#	key: chromosome coordinate of the centre of the window
+	#	value: list with two values:
+	#		0: mean AF of the window
+	#		1: smoothened mean AF of the window (by averaging the mean AFs of three windows)
+	#
+	# Downstream, use the preferable AF mean depending on type of analysis
+
+	# The following block is only needed for development. Can be commented out without causing any problem.
+	development_lines = []
+	for i in range(len(tmp_averages_list1)):
+		development_lines.append("&&\t" + ch + "\t" + str(tmp_averages_list1[i]) + "\t" + str(tmp_averages_list2[i]) + '\n')
+
+	return dictionary_windows, development_lines
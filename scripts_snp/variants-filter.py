@@ -1,37 +1,47 @@
-# This script is used to filter polymorphism data in VA files according to a number of criteria determined by arguments from the workflow. 
+# This script is used to filter polymorphism data in VA files according to a number of criteria determined by arguments from the workflow.
 # The STEP argument is used to distinguish different types of filtering that are needed during the analysis
 #	STEP = 1: Normal argument-driven filtering
 #	STEP = 2: Candidate region filtering
 #	STEP = 3: Initial filtering + eliminates indels from the first VA files + eliminates variants from contigs shorter than 1 MB
-
-import argparse
+#
+# The VA file is loaded as columns (workflows/va_store.py) and every criterion is evaluated for all the variants at
+# once as a boolean mask (filter functions of snp_analysis.py). The lines of the selected variants are copied as they
+# are from the input.
+# Several outputs can be written from the same input: -also PATH option=value ... writes to PATH the variants of the
+# main output (-b) that also pass the filter with those options (the options not given take their default values), the
+# same that running this script again on the main output would write. It can be given several times:
+#	-a control_raw.va -b control_filtered.va -step 3 -fasta genome.fa -dp_min 10 -qual_min 20 -also control_filtered2.va af_max=0.5
+
+import argparse, os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import stage_cache, va_store
+import snp_analysis
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-a', action="store", dest = 'input')
 parser.add_argument('-b', action="store", dest = 'output')
 parser.add_argument('-fasta', action="store", dest = 'fasta')
 parser.add_argument('-chr', action="store", dest = 'chr', default = '*', nargs='+')
-parser.add_argument('-mut_type', action="store", dest = 'mut_type', default = 'all') # / EMS
-parser.add_argument('-qual_min', action="store", dest = 'qual_min', default = 0)
-parser.add_argument('-dp_min', action="store", dest = 'dp_min', default = 0)
-parser.add_argument('-dp_max', action="store", dest = 'dp_max', default = 8000)
-parser.add_argument('-af_min', action="store", dest = 'af_min', default = 0)
-parser.add_argument('-af_max', action="store", dest = 'af_max', default = 2)
-parser.add_argument('-pos_min', action="store", dest = 'pos_min', default = 0)
-parser.add_argument('-pos_max', action="store", dest = 'pos_max', default = 1000000000)
+parser.add_argument('-mut_type', action="store", dest = 'mut_type', default = snp_analysis.filter_defaults['mut_type']) # / EMS
+parser.add_argument('-qual_min', action="store", dest = 'qual_min', default = snp_analysis.filter_defaults['qual_min'])
+parser.add_argument('-dp_min', action="store", dest = 'dp_min', default = snp_analysis.filter_defaults['dp_min'])
+parser.add_argument('-dp_max', action="store", dest = 'dp_max', default = snp_analysis.filter_defaults['dp_max'])
+parser.add_argument('-af_min', action="store", dest = 'af_min', default = snp_analysis.filter_defaults['af_min'])
+parser.add_argument('-af_max', action="store", dest = 'af_max', default = snp_analysis.filter_defaults['af_max'])
+parser.add_argument('-pos_min', action="store", dest = 'pos_min', default = snp_analysis.filter_defaults['pos_min'])
+parser.add_argument('-pos_max', action="store", dest = 'pos_max', default = snp_analysis.filter_defaults['pos_max'])
 parser.add_argument('-step', action="store", dest = 'step')
 parser.add_argument('-cand_reg_file', action="store", dest = 'cand_reg_file')
+parser.add_argument('-also', action="append", dest = 'also', nargs='+', default = [])
 
 args = parser.parse_args()
 
-#Input 
+#Input
 input = args.input
-f1 = open(input, 'r')
-lines = f1.readlines()	
+table = va_store.load(input)
 
 #Output
 output = args.output
-f2 = open(output, 'w')
 step = args.step
 
 #_________________________________CANDIDATE REGION FILTER___________________________________________________________________________________
@@ -43,106 +53,39 @@ elif step == '2':
     for i, line in enumerate(f3lines):
         if line.startswith('?'):
             sp = line.split()
-            args.chr = sp[1].strip('>')
+            args.chr = [sp[1].strip('>')]
             args.pos_min = int(sp[2].strip())
             args.pos_max = int(sp[3].strip())
-            
-#__________________________________________________________________________________________________________________________________________
-
-def limits():
-    global selector
-
-    selector = 0
-    
-    if (
-            (int(args.pos_min) < int(sp[1].strip()) < int(args.pos_max))
-            and float(sp[4].strip()) > float(args.qual_min) 
-            and int(args.dp_min) < (int(sp[6].strip()) + int(sp[5].strip())) < int(args.dp_max)
-            and float(args.af_min) < ((float(sp[6].strip())/ ((float(sp[6].strip())) + (float(sp[5].strip()))))) < float(args.af_max)
-        
-       ):
-               selector = 1
-               
-    else:
-        selector = 0
-    
-    return [selector]
-
 
 #__________________________________________________________________________________________________________________________________________
 
-chromosome = args.chr
+#__________________________________________________________________________________________________________________________________________
 
-if step == '1' or step == '2':
-    for i, line in enumerate(lines):
-        if not line.startswith('#'):
-            sp = line.split('\t')
-            if args.mut_type.strip() == 'EMS' and ((str(sp[0].strip())  in chromosome) or (chromosome[0] == '*')): 
-                limits()
-                ref_b = sp[2]
-                alt_b = sp[3]
-                if (
-                        (selector == 1)
-                        and ((ref_b.strip() == 'G' and alt_b.strip() == 'A')
-                        or (ref_b.strip() == 'C' and alt_b.strip() == 'T'))
-                    ):
-                        f2.write(line)
-                        
-            elif args.mut_type.strip() == 'all' and ((str(sp[0].strip())  in chromosome) or (chromosome[0] == '*')):
-                limits()
-                if selector == 1: 
-                    f2.write(line)	
-    f2.close()
+selected = snp_analysis.filter_contigs(table, args.chr)
 
 if step == '3':
-    # Function to parse fasta file (based on one of the Biopython IOs)
-    def read_fasta(fp):
-        name, seq = None, []
-        for line in fp:
-            line = line.rstrip()
-            if line.startswith('>'):
-                if name: yield (name, ''.join(seq))
-                name, seq = line, []
-            else:
-                seq.append(line)
-        if name: yield (name, ''.join(seq))
-
-    # Read contig fasta file
-    contig_lengths = list()
+    # Read contig lengths from the genome manifest
     contig_source = args.fasta
-    with open(contig_source) as fp:
-        fastalist = list()
-        for name_contig, seq_contig in read_fasta(fp):
-            innerlist = list()
-            innerlist.append(name_contig.strip('>'))
-            innerlist.append(len(seq_contig))
-            fastalist.append(innerlist)
-
     large_contigs = list()
-    for contig in fastalist:
-        if int(contig[1]) > 2000000:
-            large_contigs.append(contig[0].lower()) 
-
-    # Filter
-    for i, line in enumerate(lines):
-        if not line.startswith('#'):
-            sp = line.split('\t')
-            if len(sp[2].strip()) == 1 and len(sp[3].strip()) == 1:
-                if str(sp[0]).strip().lower() in large_contigs:
-                    if args.mut_type.strip() == 'EMS' and ((str(sp[0].strip())  in chromosome) or (chromosome[0] == '*')): 
-                        limits()
-                        ref_b = sp[2]
-                        alt_b = sp[3]
-                        if (
-                                (selector == 1)
-                                and ((ref_b.strip() == 'G' and alt_b.strip() == 'A')
-                                or (ref_b.strip() == 'C' and alt_b.strip() == 'T'))
-                            ):
-                                f2.write(line)
-                                
-                    elif args.mut_type.strip() == 'all' and ((str(sp[0].strip())  in chromosome) or (chromosome[0] == '*')):
-                        limits()
-                        if selector == 1: 
-                            f2.write(line)	
-
-    f2.close()
+    for name_contig, length_contig in stage_cache.fasta_lengths(contig_source):
+        if int(length_contig) > 2000000:
+            large_contigs.append(name_contig.lower())
+
+    # Single nucleotide variants in large contigs
+    selected &= snp_analysis.filter_snvs(table, large_contigs)
+
+if step == '1' or step == '2' or step == '3':
+    selected &= snp_analysis.filter_variants(table, dict((option, getattr(args, option)) for option in snp_analysis.filter_defaults))
+    table.write(output, selected)
+
+    # Other outputs: variants of the main output that also pass the filter with other options
+    for also in args.also:
+        options = {}
+        for option in also[1:]:
+            name, value = option.split('=', 1)
+            if name not in snp_analysis.filter_defaults:
+                sys.exit('variants-filter.py: -also option ' + name + ' is not one of ' + ', '.join(snp_analysis.filter_defaults))
+            options[name] = value
+        table.write(also[0], selected & snp_analysis.filter_variants(table, options))
+else:
+    open(output, 'w').close()
@@ -1,217 +1,102 @@
 # This script performs different operations with polymorphism data contained in VA files
-import argparse
+#
+# The variants of the two files are joined by their position (contig and position):
+#	I	Intersection: variants of the primary file (-primary) that are also in the other file
+#	A	Variants of file -a that are not in file -b
+#	B	Variants of file -b that are not in file -a
+#	U	Union: variants of the primary file, and then the variants of the other file that are not in it
+#	N	None: the primary file as it is (with its header)
+# Modes can be combined, e.g. -mode IB: the output has the variants selected by any of them, those of the primary
+# file first and then those of the other file, each file in its own order. The output is only written to -c.
+# When both files are sorted by position (contigs in the same order), they are joined by merging the two sorted
+# lists of positions. Otherwise the positions of the other file are looked up in a hash table.
+
+import argparse, os, sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import va_store
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-a', action="store", dest = 'input1')
 parser.add_argument('-b', action="store", dest = 'input2')
 parser.add_argument('-c', action="store", dest = 'output')
-parser.add_argument('-mode', action="store", dest = 'mode', default='N', choices=['I','A','B', 'U', 'N']) #['I','A','B', 'U', 'N']) (Intersection, vcf1 - vcf2, vcf2 - vcf1, union, None)
-parser.add_argument('-primary', action="store", dest = 'primary', default=1, choices=['1','2']) #1: info from input -a ; 2: info from input -b 
+parser.add_argument('-mode', action="store", dest = 'mode', default='N') # One or several of I, A, B, U, N (Intersection, vcf1 - vcf2, vcf2 - vcf1, union, None)
+parser.add_argument('-primary', action="store", dest = 'primary', default=1, choices=['1','2']) #1: info from input -a ; 2: info from input -b
 args = parser.parse_args()
 
 mode = args.mode
 primary = int(args.primary)
+if not mode or any(m not in 'IABUN' for m in mode):
+	sys.exit('variants-operations.py: -mode must be one or several of I, A, B, U, N')
 
 #Datasets A (VCF1) and B (VCF2)
-#Input 1  
-input1 = args.input1
-f1 = open(input1, 'r')
-lines1 = f1.readlines()	
-
-#Input 2 
-input2 = args.input2
-f2 = open(input2, 'r')
-lines2 = f2.readlines()	
-
-#Output
-output = args.output
-f3 = open(output, 'w')
-
-c = '-'
-
-if mode == 'N':
+table1 = va_store.load(args.input1)
+table2 = va_store.load(args.input2)
+
+# Positions of the variants of both files as 64-bit keys: contig (numbered in the order they appear in the
+# two files) and position
+contigs = list(table1.chroms)
+for name in table2.chroms:
+	if name not in contigs:
+		contigs.append(name)
+
+def position_keys(table):
+	codes = np.array([contigs.index(name) for name in table.chroms], dtype=np.int64)
+	chrom = codes[table.chrom] if table.rows else np.zeros(0, dtype=np.int64)
+	return (chrom << 32) | table.pos.astype(np.int64)
+
+keys1 = position_keys(table1)
+keys2 = position_keys(table2)
+
+def is_sorted(keys):
+	return bool(np.all(keys[1:] >= keys[:-1]))
+
+# Variants of 'keys' whose position is also in 'other'
+def in_other(keys, other):
+	if len(other) == 0:
+		return np.zeros(len(keys), dtype=bool)
+	if is_sorted(keys) and is_sorted(other):
+		# Merge join: position of each key in the sorted list of the other file
+		found = np.searchsorted(other, keys)
+		return other[np.minimum(found, len(other) - 1)] == keys
+	# Hash join
+	other_set = set(other.tolist())
+	return np.fromiter((key in other_set for key in keys.tolist()), dtype=bool, count=len(keys))
+
+in2 = in_other(keys1, keys2)
+in1 = in_other(keys2, keys1)
+
+# Variants selected from each file
+select1 = np.zeros(table1.rows, dtype=bool)
+select2 = np.zeros(table2.rows, dtype=bool)
+if 'I' in mode:
 	if primary == 1:
-		for i, line in enumerate(lines1): 
-			f3.write(line)
-
-	elif primary == 2: 
-		for i, line in enumerate(lines2):
-			f3.write(line)
-
-if mode == 'I':
+		select1 |= in2
+	else:
+		select2 |= in1
+if 'A' in mode:
+	select1 |= ~in2
+if 'B' in mode:
+	select2 |= ~in1
+if 'U' in mode:
 	if primary == 1:
-		vcf1 = list() #List of vcf1 positions
-		vcf2 = list() #List of vcf2 positions
-
-		for i, line in enumerate(lines1): #We add the positions of f1 to a list 
-			if not line.startswith('#'): 
-				sp = line.split('\t')
-				vcf1.append(sp[0].strip() + '-' + sp[1].strip())
-
-		for i, line in enumerate(lines2): #We add the positions of f2 to a list
-			if not line.startswith('#'):
-				sp = line.split('\t')
-				vcf2.append(sp[0].strip() + '-' + sp[1].strip())
-	
-		intersection =list(set(vcf1).intersection(vcf2))
-
-		for i, line in enumerate(lines1):
-			if not line.startswith('#'):
-				sp = line.split('\t')
-				if (sp[0].strip()+'-'+sp[1].strip()) in intersection:
-					f3.write(line)
-
-	elif primary == 2:
-		vcf1 = list() #List of vcf1 positions
-		vcf2 = list() #List of vcf2 positions
-
-		for i, line in enumerate(lines2): #We add the positions of f1 to a list 
-			if not line.startswith('#'): 
-				sp = line.split('\t')
-				vcf1.append(sp[0].strip() + '-' + sp[1].strip())
-
-		for i, line in enumerate(lines1): #We add the positions of f2 to a list
-			if not line.startswith('#'):
-				sp = line.split('\t')
-				vcf2.append(sp[0].strip() + '-' + sp[1].strip())
-	
-		intersection =list(set(vcf1).intersection(vcf2))
-
-		for i, line in enumerate(lines2):
-			if not line.startswith('#'):
-				sp = line.split('\t')
-				if (sp[0].strip()+'-'+sp[1].strip()) in intersection:
-					f3.write(line)
-
-elif mode == 'U':
+		select1[:] = True
+		select2 |= ~in1
+	else:
+		select2[:] = True
+		select1 |= ~in2
+if 'N' in mode:
 	if primary == 1:
-		vcf1 = list() #List of vcf1 positions
-		vcf2 = list() #List of vcf2 positions
-
-		for i, line in enumerate(lines1): #We add the positions of f1 to a list 
-			if not line.startswith('#'): 
-				sp = line.split('\t')
-				vcf1.append(sp[0].strip() + '-' + sp[1].strip())
-	
-		for i, line in enumerate(lines2): #We add the positions of f2 to a list
-			if not line.startswith('#'):
-				sp = line.split('\t')
-				vcf2.append(sp[0].strip() + '-' + sp[1].strip())
-			
-		union = list(set(vcf1) | set(vcf2))
-
-		for i, line in enumerate(lines1):
-			if not line.startswith('#'):
-				sp = line.split('\t')
-				if (sp[0].strip()+'-'+sp[1].strip()) in union:
-					f3.write(line)
+		select1[:] = True
+	else:
+		select2[:] = True
 
-		input3 = 'op_output.vcf'
-		f3 = open(input3, 'r')
-		lines3 = f3.readlines()
-		vcf3 = list()
-
-		for i, line in enumerate(lines3):
-			if not line.startswith('#'):
-				sp = line.split('\t')
-				vcf3.append(sp[0].strip() + '-' + sp[1].strip())	
-
-		R = list(set(union).difference(vcf3)) 
-
-		input3 = 'op_output.vcf'
-		f3 = open(input3, 'a')	
-
-		for i, line in enumerate(lines2):
-			if not line.startswith('#'):
-				sp = line.split('\t')
-				if (sp[0].strip()+'-'+sp[1].strip()) in R:
-					f3.write(line)
-
-	elif primary == 2:			
-		vcf1 = list() #List of vcf1 positions
-		vcf2 = list() #List of vcf2 positions
-
-		for i, line in enumerate(lines2): #We add the positions of f1 to a list 
-			if not line.startswith('#'): 
-				sp = line.split('\t')
-				vcf1.append(sp[0].strip() + '-' + sp[1].strip())
-	
-		for i, line in enumerate(lines1): #We add the positions of f2 to a list
-			if not line.startswith('#'):
-				sp = line.split('\t')
-				vcf2.append(sp[0].strip() + '-' + sp[1].strip())
-			
-		union = list(set(vcf1) | set(vcf2))
-
-		for i, line in enumerate(lines2):
-			if not line.startswith('#'):
-				sp = line.split('\t')
-				if (sp[0].strip()+'-'+sp[1].strip()) in union:
-					f3.write(line)
-
-		input3 = 'op_output.vcf'
-		f3 = open(input3, 'r')
-		lines3 = f3.readlines()
-		vcf3 = list()
-
-		for i, line in enumerate(lines3):
-			if not line.startswith('#'):
-				sp = line.split('\t')
-				vcf3.append(sp[0].strip() + '-' + sp[1].strip())	
-
-		R = list(set(union).difference(vcf3))
-
-		input3 = 'op_output.vcf'
-		f3 = open(input3, 'a')	
-
-		for i, line in enumerate(lines1):
-			if not line.startswith('#'):
-				sp = line.split('\t')
-				if (sp[0].strip()+'-'+sp[1].strip()) in R:
-					f3.write(line)
-
-elif mode == 'A':
-	vcf1 = list() 
-	vcf2 = list() 
-	#We add the positions of f1 to a list 
-	for i, line in enumerate(lines1):
-		if not line.startswith('#'): 
-			sp = line.split('\t')
-			vcf1.append(sp[0].strip() + '-' + sp[1].strip())
-			
-	#We add the positions of f2 to a list
-	for i, line in enumerate(lines2):
-		if not line.startswith('#'):
-			sp = line.split('\t')
-			vcf2.append(sp[0].strip() + '-' + sp[1].strip())
-		
-	A = list(set(vcf1).difference(vcf2))
-
-	for i, line in enumerate(lines1):
-		if not line.startswith('#'):
-			sp = line.split('\t')
-			if (sp[0].strip()+'-'+sp[1].strip()) in A:
-				f3.write(line)
-			
-elif mode == 'B':			
-	vcf1 = list() 
-	vcf2 = list() 
-	#We add the positions of f1 to a list 
-	for i, line in enumerate(lines1):
-		if not line.startswith('#'): 
-			sp = line.split('\t')
-			vcf1.append(sp[0].strip() + '-' + sp[1].strip())
-			
-	#We add the positions of f2 to a list
-	for i, line in enumerate(lines2):
-		if not line.startswith('#'):
-			sp = line.split('\t')
-			vcf2.append(sp[0].strip() + '-' + sp[1].strip())
-		
-	B = list(set(vcf2).difference(vcf1))
-
-	for i, line in enumerate(lines2):
-		if not line.startswith('#'):
-			sp = line.split('\t')
-			if (sp[0].strip()+'-'+sp[1].strip()) in B:
-				f3.write(line)
\ No newline at end of file
+#Output
+with open(args.output, 'w') as f3:
+	primary_table, primary_select, other_table, other_select = table1, select1, table2, select2
+	if primary == 2:
+		primary_table, primary_select, other_table, other_select = table2, select2, table1, select1
+	if 'N' in mode:
+		f3.writelines(primary_table.header)
+	f3.writelines(primary_table.lines(primary_select))
+	f3.writelines(other_table.lines(other_select))
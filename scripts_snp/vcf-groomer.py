@@ -1,36 +1,70 @@
 # This script formats information from VCF files to simpler VA files
+#
+# The VCF file is read line by line, so the memory used does not depend on its size. It can be plain text,
+# compressed with gzip or bgzip (.vcf.gz) or BCF (read through 'bcftools view').
+# The read depths are taken from the fields of the sample column named in the FORMAT column: ADF and ADR
+# (allelic depths on the forward and reverse strands), or AD if the strand depths are not present.
+# Records with several alternative alleles are written with the alternative allele supported by most reads.
 
-import argparse
+import argparse, gzip, subprocess
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-a', action="store", dest = 'input')
 parser.add_argument('-b', action="store", dest = 'output')
 args = parser.parse_args()
 
-#Input file 
-input = args.input
-f1 = open(input, 'r')
-lines = f1.readlines()	
+bcftools = './bcftools-1.3.1/bcftools'
+
+view = None
+
+# Open a VCF or BCF file as text, whatever its format
+def open_vcf(path):
+	global view
+	with open(path, 'rb') as fp:
+		magic = fp.read(3)
+	compressed = magic[:2] == b'\x1f\x8b'
+	if compressed:
+		with gzip.open(path, 'rb') as fp:
+			magic = fp.read(3)
+	if magic == b'BCF':
+		view = subprocess.Popen([bcftools, 'view', path], stdout=subprocess.PIPE, universal_newlines=True)
+		return view.stdout
+	if compressed:
+		return gzip.open(path, 'rt')
+	return open(path, 'r')
+
+# Depths of each allele (reference first) in a comma-separated field. Missing values count as 0
+def allele_depths(field, n_alleles):
+	depths = [int(value) if value.isdigit() else 0 for value in field.split(',')]
+	return (depths + [0] * n_alleles)[:n_alleles]
+
+#Input file
+f1 = open_vcf(args.input)
 
 #Output
 output = args.output
 f2 = open(output, 'w')
 f2.write('#CHR	POS	REF	ALT	QUAL	REF_DP	ALT_DP\n')
 
-for i, line in enumerate(lines):
-	if not line.startswith('#'): 
-		sp = line.split('\t')
-		sp2 = sp[9].split(':')
-		DP = sp2[2]
-		ADF = sp2[3]
-		ADR = sp2[4]
-		ADF_ref= (ADF.split(','))[0]
-		ADF_alt= (ADF.split(','))[1]
-		ADR_ref= (ADR.split(','))[0]
-		ADR_alt= (ADR.split(','))[1]
-		alt = int(ADF_alt) + int(ADR_alt)
-		ref = int(ADF_ref) + int(ADR_ref)
-		DP = int(alt) + int(ref)
-		f2.write(sp[0] + '\t' + str(sp[1]) + '\t' +sp[3] + '\t' +sp[4] + '\t' + str(sp[5]) + '\t' + str(ref) + '\t' + str(alt) + '\n')
-		
-f2.close()
\ No newline at end of file
+for line in f1:
+	if line.startswith('#'):
+		continue
+	sp = line.rstrip('\n').split('\t')
+	if sp[4] == '.':
+		continue
+	alleles = [sp[3]] + sp[4].split(',')
+	sample = dict(zip(sp[8].split(':'), sp[9].split(':')))
+	if 'ADF' in sample and 'ADR' in sample:
+		depths = [forward + reverse for forward, reverse in zip(allele_depths(sample['ADF'], len(alleles)), allele_depths(sample['ADR'], len(alleles)))]
+	elif 'AD' in sample:
+		depths = allele_depths(sample['AD'], len(alleles))
+	else:
+		continue
+	alt_index = max(range(1, len(alleles)), key=lambda i: depths[i])
+	f2.write(sp[0] + '\t' + sp[1] + '\t' + sp[3] + '\t' + alleles[alt_index] + '\t' + sp[5] + '\t' + str(depths[0]) + '\t' + str(depths[alt_index]) + '\n')
+
+f1.close()
+f2.close()
+
+if view is not None and view.wait() != 0:
+	raise SystemExit('vcf-groomer.py: bcftools view could not read ' + args.input)
@@ -5,7 +5,9 @@ the total length of the squence(s)
 
 '''
 
-import argparse
+import argparse, os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+import stage_cache
 
 # Parse command arguments
 parser = argparse.ArgumentParser()
@@ -13,24 +15,10 @@ parser.add_argument('-gnm', action='store', dest='genome', required=True)
 args = parser.parse_args()
 genome = args.genome
 
-# Function to parse fasta file
-def read_fasta(fp):
-	name, seq = None, []
-	for line in fp:
-		line = line.rstrip()
-		if line.startswith('>'):
-			if name: yield (name, ''.join(seq))
-			name, seq = line, []
-		else:
-			seq.append(line)
-	if name: yield (name, ''.join(seq))
-
 genome_length = 0
 
-# Read fasta file
-with open(genome) as fp:
-	for name, seq in read_fasta(fp):
-		contig_length = len(seq)
-		genome_length += contig_length
+# Read the contig lengths from the genome manifest
+for name, contig_length in stage_cache.fasta_lengths(genome):
+	genome_length += contig_length
 
 print (genome_length)
\ No newline at end of file
@@ -33,6 +33,9 @@ lib_type=$4
 ins_seq=$project_name/$f1/clean-ins.fa
 snp_control=${12}
 
+# Functions to run the stages of the simulation (stages already simulated are skipped when the project is resumed)
+source workflows/stages.sh
+
 # Write PID to status file
 my_status_file=$project_name/$f2/status
 echo 'pid simulator '$$ >> $my_status_file
@@ -100,23 +103,25 @@ parental_genome_to_sequence=${11}
 # Simulate data for $analisys_type=ins
 if [ $analysis_type == 'ins' ]; then
 	# Run sim-mut.py
-	{
+	stage_skip sim-mut "$ref_seqs_merged_file $ins_seq" "$sim_mut_output_folder_mutantstrain" "$nbr_muts $mut_mode" || {
 		python3 simulator/sim-mut.py -nbr $nbr_muts -mod $mut_mode -con $ref_seqs_merged_file -ins $ins_seq -out $sim_mut_output_folder_mutantstrain 2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")": Simulation of mutagenesis failed. Quit." >> $my_log_file
 		exit_code=1; echo $exit_code; exit
 	}
+	stage_done
 	echo $(date "+%F > %T")": Simulation of mutagenesis completed." >> $my_log_file
 	
 	# Run sim-seq.py. The input is a folder becasuse the program works with all the fasta files that finds in a folder. This is necessary to simulate the sequencing of bulked DNA.
-	{
+	stage_skip sim-seq "$sim_mut_output_folder_mutantstrain/mutated_genome" "$sim_seq_output_folder_sample" "$lib_type $sim_seq_statement" || {
 		python3 simulator/sim-seq.py -input_folder $sim_mut_output_folder_mutantstrain/mutated_genome -out $sim_seq_output_folder_sample -mod $lib_type -rd $read_depth -rlm $read_length_mean -rls $read_length_sd -flm $fragment_length_mean -fls $fragment_length_sd -ber $basecalling_error_rate -gbs $gc_bias_strength 2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")": Simulation of high-throughput sequencing failed. Quit." >> $my_log_file
 		exit_code=1; echo $exit_code; exit
 	}
+	stage_done
 	echo $(date "+%F > %T")": Simulation of high-throughput sequencing completed." >> $my_log_file
 fi
 
@@ -125,13 +130,14 @@ fi
 if [ $analysis_type == 'snp' ]; then
 
 	# Calculate genome length to know how many natural SNPs to introduce
-	{
+	stage_skip calculate-genome-length "$ref_seqs_merged_file" "" "" || {
 		genome_length=`python3 simulator/calculate-genome-length.py -gnm $ref_seqs_merged_file 2>> $my_log_file`
 
 	} || {
 		echo $(date "+%F > %T")": simulator/calculate-genome-length.py failed. Quit." >> $my_log_file
 		exit_code=1; echo $exit_code; exit
 	}
+	stage_done
 	echo $(date "+%F > %T")": simulator/calculate-genome-length.py finished." >> $my_log_file
 
 	# Calculate how many natural SNPs to introduce in the ref-lab and the noref-lab strains.
@@ -144,23 +150,25 @@ if [ $analysis_type == 'snp' ]; then
 	# Using as input the reference sequence provided by user, simulate ref-lab and noref-lab sequences 
 	
 	# Run sim-mut.py to create ref-lab strain. Mutate 0.001% of bases.
-	{
+	stage_skip sim-mut-ref-lab "$ref_seqs_merged_file" "$sim_mut_output_folder_ref_lab" "$nbr_natural_mutations_ref" || {
 		python3 simulator/sim-mut.py -nbr $nbr_natural_mutations_ref -mod d -con $ref_seqs_merged_file -out $sim_mut_output_folder_ref_lab 2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")": Simulation of mutagenesis to ref-lab strain failed. Quit." >> $my_log_file
 		exit_code=1; echo $exit_code; exit
 	}
+	stage_done
 	echo $(date "+%F > %T")": Simulation of mutagenesis to create ref-lab strain completed." >> $my_log_file
 
 	# Run sim-mut.py to create noref-lab strain. Mutate 0.4% of bases.
-	{
+	stage_skip sim-mut-noref-lab "$ref_seqs_merged_file" "$sim_mut_output_folder_noref_lab" "$nbr_natural_mutations_noref" || {
 		python3 simulator/sim-mut.py -nbr $nbr_natural_mutations_noref -mod d -con $ref_seqs_merged_file -out $sim_mut_output_folder_noref_lab 2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")": Simulation of mutagenesis to noref-lab strain failed. Quit." >> $my_log_file
 		exit_code=1; echo $exit_code; exit
 	}
+	stage_done
 	echo $(date "+%F > %T")": Simulation of mutagenesis to create noref-lab strain completed." >> $my_log_file
 	
 	# Create the mutant sequence starting from one of the lab strains
@@ -173,13 +181,14 @@ if [ $analysis_type == 'snp' ]; then
 	# Run sim-mut.py to create mutant strain
 	mut_pos_1=$(echo $mut_pos | cut -d'-' -f 1) #I'm adding this just in case we are dealing with a second site mutagenesis. Fist mutagenesis happens here, while the second is below.
 	 
-	{
+	stage_skip sim-mut-mutant "$template" "$sim_mut_output_folder_mutantstrain" "$nbr_muts $mut_mode $mut_pos_1" || {
 		python3 simulator/sim-mut.py -nbr $nbr_muts -mod $mut_mode -con $template -out $sim_mut_output_folder_mutantstrain -causal_mut $mut_pos_1 2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")": Simulation of mutagenesis to create the mutant strain failed. Quit." >> $my_log_file
 		exit_code=1; echo $exit_code; exit
 	}
+	stage_done
 	echo $(date "+%F > %T")": Simulation of mutagenesis to create the mutant strain completed." >> $my_log_file
 
 	
@@ -194,13 +203,14 @@ if [ $analysis_type == 'snp' ]; then
 
 		mut_pos=$(echo $mut_pos | cut -d'-' -f 2)
 
-		{
+		stage_skip sim-mut-second-site "$parmut_sample" "$sim_mut_output_folder_mutantstrain2" "$nbr_muts $mut_mode $mut_pos" || {
 			python3 simulator/sim-mut.py -nbr $nbr_muts -mod $mut_mode -con $parmut_sample -out $sim_mut_output_folder_mutantstrain2 -causal_mut $mut_pos 2>> $my_log_file
 
 		} || {
 			echo $(date "+%F > %T")": Simulation of second site mutagenesis to create the mutant strain failed. Quit." >> $my_log_file
 			exit_code=1; echo $exit_code; exit
 		}
+		stage_done
 		echo $(date "+%F > %T")": Simulation of second site mutagenesis to create the mutant strain completed." >> $my_log_file
 
 		parmut_sample=$sim_mut_output_folder_mutantstrain2/mutated_genome/mutated_genome.fa
@@ -229,35 +239,38 @@ if [ $analysis_type == 'snp' ]; then
 	if [ $snp_control == 'par' ]; then
 		
 		# Run sim-recsel.py to create recombinant chromosomes selected to carry the mutation
-		{
+		stage_skip sim-recsel-recessive "$parmut_sample $parpol_sample" "$sim_recsel_output_folder_recessive" "$rec_freq_distr $mut_pos $sel_mode $nbr_rec_chrs" || {
 			python3 simulator/sim-recsel.py -outdir $sim_recsel_output_folder_recessive -rec_freq_distr $rec_freq_distr -parmut $parmut_sample -parpol $parpol_sample -mutpos $mut_pos -smod $sel_mode -nrec $nbr_rec_chrs 2>> $my_log_file 
 
 		} || {
 			echo $(date "+%F > %T")": Simulation of recombination and phenotype selection failed. Quit." >> $my_log_file
 			exit_code=1; echo $exit_code; exit
 		}
+		stage_done
 		echo $(date "+%F > %T")": Simulation of recombination and phenotype selection completed." >> $my_log_file
 		
 	else #f2wt
 		
 		# Run sim-recsel.py to create the F2 recessive population
-		{
+		stage_skip sim-recsel-recessive "$parmut_sample $parpol_sample" "$sim_recsel_output_folder_recessive" "$rec_freq_distr $mut_pos $sel_mode $nbr_rec_chrs" || {
 			python3 simulator/sim-recsel.py -outdir $sim_recsel_output_folder_recessive -rec_freq_distr $rec_freq_distr -parmut $parmut_sample -parpol $parpol_sample -mutpos $mut_pos -smod $sel_mode -nrec $nbr_rec_chrs 2>> $my_log_file
 		
 		} || {
 			echo $(date "+%F > %T")": Simulation of recombination and phenotype selection to create the F2 recessive population failed. Quit." >> $my_log_file
 			exit_code=1; echo $exit_code; exit
 		}
+		stage_done
 		echo $(date "+%F > %T")": Simulation of recombination and phenotype selection to create the F2 recessive population completed." >> $my_log_file
 		
 		# Run sim-recsel.py to create the F2 dominant population
-		{
+		stage_skip sim-recsel-dominant "$parmut_sample $parpol_sample" "$sim_recsel_output_folder_dominant" "$rec_freq_distr $mut_pos $nbr_rec_chrs" || {
 			python3 simulator/sim-recsel.py -outdir $sim_recsel_output_folder_dominant -rec_freq_distr $rec_freq_distr -parmut $parmut_sample -parpol $parpol_sample -mutpos $mut_pos -smod wt -nrec $nbr_rec_chrs 2>> $my_log_file
 		
 		} || {
 			echo $(date "+%F > %T")": Simulation of recombination and phenotype selection to create the F2 dominant population failed. Quit." >> $my_log_file
 			exit_code=1; echo $exit_code; exit
 		}
+		stage_done
 		echo $(date "+%F > %T")": Simulation of recombination and phenotype selection to create the F2 dominant population completed." >> $my_log_file
 	fi
 	
@@ -280,23 +293,25 @@ if [ $analysis_type == 'snp' ]; then
 	
 	
 	# Run sim-seq.py on control genome. The input is a folder because the program works with all the fasta files that finds in a folder. This is necessary to simulate the sequencing of bulked DNA.
-	{
+	stage_skip sim-seq-control "$input_folder_control" "$sim_seq_output_folder_control" "$lib_type $sim_seq_statement" || {
 		python3 simulator/sim-seq.py -input_folder $input_folder_control -out $sim_seq_output_folder_control -mod $lib_type -rd $read_depth -rlm $read_length_mean -rls $read_length_sd -flm $fragment_length_mean -fls $fragment_length_sd -ber $basecalling_error_rate -gbs $gc_bias_strength 2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")": Simulation of high-throughput sequencing reads on control genome failed. Quit." >> $my_log_file
 		exit_code=1; echo $exit_code; exit
-	} 
+	}
+	stage_done
 	echo $(date "+%F > %T")": Simulation of high-throughput sequencing reads on control genome completed." >> $my_log_file
 
 	# Run sim-seq.py on F2 recombinant population. The input is a folder becasuse the program works with all the fasta files that finds in a folder. This is necessary to simulate the sequencing of bulked DNA.
-	{
+	stage_skip sim-seq-sample "$sim_recsel_output_folder_recessive" "$sim_seq_output_folder_sample" "$lib_type $sim_seq_statement" || {
 		python3 simulator/sim-seq.py -input_folder $sim_recsel_output_folder_recessive -out $sim_seq_output_folder_sample -mod $lib_type -rd $read_depth -rlm $read_length_mean -rls $read_length_sd -flm $fragment_length_mean -fls $fragment_length_sd -ber $basecalling_error_rate -gbs $gc_bias_strength 2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")": Simulation of high-throughput sequencing on F2 recombinant population failed. Quit." >> $my_log_file
 		exit_code=1; echo $exit_code; exit
 	}
+	stage_done
 	echo $(date "+%F > %T")": Simulation of high-throughput sequencing reads on F2 recombinant population completed." >> $my_log_file
 
 fi
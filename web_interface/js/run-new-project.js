@@ -26,9 +26,8 @@ function allowNewProject() {
 				document.getElementById("sizeWarning").innerHTML = "WARNING: You are over 75% of the maximum space limit set by the machine administrator (" + responseFields[2] + " Gb).";
 			}
 			if (responseFields[1] >= 100) {
-				document.getElementById("runNewProject").style.display = "none";
 				document.getElementById("simultWarning").style.display = "block";
-				document.getElementById("simultWarning").innerHTML = "WARNING: You have reached the maximum number of simultaneously running projects set by the machine administrator (" + responseFields[3] + " projects). Wait until currently running jobs finish.";
+				document.getElementById("simultWarning").innerHTML = "NOTE: The maximum number of simultaneously running projects set by the machine administrator (" + responseFields[3] + " projects) has been reached. New projects will wait in the job queue and start automatically when currently running jobs finish.";
 			}
 			//console.log(response);
 		}
@@ -0,0 +1,153 @@
+#
+# This script provides the aligner indexes (hisat2-build / bowtie2-build) that the workflows need.
+# Indexes are kept in a store shared by all projects (folder 'index_cache' in the easymap directory).
+# Each entry is identified by a hash computed from the content of the input fasta file, the aligner
+# name and the aligner version, so projects that use the same reference genome reuse the same index.
+#
+# If the index is not in the store, it is built once. A lock file per entry makes projects that need
+# the same index at the same time wait for the one that is building it, instead of building it twice.
+# The files of the entry are then hard linked (or copied if linking is not possible) to the
+# index prefix requested by the workflow, so the workflow cleanup steps do not affect the store.
+#
+# When the store is bigger than the limit set in config/config (index-cache-size-limit), the entries
+# that have not been used for a longer time are removed. Entries in use by other projects are kept.
+#
+# Usage example:
+# python3 index-cache.py -aligner hisat2 -builder hisat2/hisat2-build -threads 4 -in genome.fa -out_prefix genome_index
+#	-std1 hisat2-build_std1.txt -std2 hisat2-build_std2.txt
+#
+
+import argparse, os, shutil, hashlib, fcntl, subprocess, time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-aligner', action="store", dest='aligner', choices=set(('hisat2','bowtie2')), required=True)
+parser.add_argument('-builder', action="store", dest='builder', required=True)
+parser.add_argument('-in', action="store", dest='input_fasta', required=True)
+parser.add_argument('-out_prefix', action="store", dest='out_prefix', required=True)
+parser.add_argument('-threads', action="store", dest='threads', type=int, default=1)
+parser.add_argument('-std1', action="store", dest='std1', default=os.devnull)
+parser.add_argument('-std2', action="store", dest='std2', default=os.devnull)
+args = parser.parse_args()
+
+# Option used by each index builder to set the number of threads
+threads_option = {'hisat2': '-p', 'bowtie2': '--threads'}
+
+location = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+cache_dir = os.path.join(location, 'index_cache')
+
+# Read the size limit of the store (in gigabytes) from file config/config. 0 means unlimited
+size_limit = 0
+try:
+	with open(os.path.join(location, 'config', 'config')) as con_file:
+		for lines in con_file:
+			if lines.startswith('index-cache-size-limit:'):
+				size_limit = float(lines.rstrip().split(':')[1])
+except (IOError, ValueError):
+	size_limit = 0
+
+# Version of the aligner: from file VERSION in the aligner folder or, if not present, from '--version'
+def aligner_version(builder):
+	version_file = os.path.join(os.path.dirname(os.path.abspath(builder)), 'VERSION')
+	if os.path.isfile(version_file):
+		with open(version_file) as fp:
+			return fp.read().strip()
+	proc = subprocess.Popen([builder, '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+	out = proc.communicate()[0].decode('utf-8')
+	return out.split('\n')[0].strip()
+
+# Hash of the fasta content plus aligner name and version
+def entry_key(fasta, aligner, version):
+	h = hashlib.sha256()
+	h.update((aligner + '\t' + version + '\n').encode('utf-8'))
+	with open(fasta, 'rb') as fp:
+		for block in iter(lambda: fp.read(1 << 20), b''):
+			h.update(block)
+	return aligner + '-' + h.hexdigest()[:32]
+
+def entry_size(entry_dir):
+	total = 0
+	for name in os.listdir(entry_dir):
+		total += os.path.getsize(os.path.join(entry_dir, name))
+	return total
+
+# Remove least recently used entries until the store fits in the size limit
+def evict(keep):
+	if size_limit <= 0:
+		return
+	entries = []
+	total = 0
+	for name in os.listdir(cache_dir):
+		entry_dir = os.path.join(cache_dir, name)
+		if not os.path.isdir(entry_dir) or not os.path.isfile(os.path.join(entry_dir, 'complete')):
+			continue
+		size = entry_size(entry_dir)
+		total += size
+		entries.append((os.path.getmtime(os.path.join(entry_dir, 'complete')), name, size))
+	entries.sort()
+	for last_used, name, size in entries:
+		if total <= size_limit * 1073741824:
+			break
+		if name == keep:
+			continue
+		# Entries locked by other projects are being built or linked right now
+		with open(os.path.join(cache_dir, name + '.lock'), 'a') as lock:
+			try:
+				fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+			except IOError:
+				continue
+			shutil.rmtree(os.path.join(cache_dir, name))
+			total -= size
+			fcntl.flock(lock, fcntl.LOCK_UN)
+
+# Link (or copy) the index files of an entry to the prefix requested by the workflow
+def export_entry(entry_dir, out_prefix):
+	for name in os.listdir(entry_dir):
+		if not name.startswith('index.'):
+			continue
+		target = out_prefix + name[len('index'):]
+		if os.path.exists(target):
+			os.remove(target)
+		try:
+			os.link(os.path.join(entry_dir, name), target)
+		except OSError:
+			shutil.copy(os.path.join(entry_dir, name), target)
+
+if not os.path.exists(cache_dir):
+	try:
+		os.makedirs(cache_dir)
+	except OSError:
+		pass
+
+key = entry_key(args.input_fasta, args.aligner, aligner_version(args.builder))
+entry_dir = os.path.join(cache_dir, key)
+
+with open(entry_dir + '.lock', 'a') as lock:
+	fcntl.flock(lock, fcntl.LOCK_EX)
+
+	if not os.path.isfile(os.path.join(entry_dir, 'complete')):
+		# Build in a temporary folder so an interrupted build never looks like a valid entry
+		tmp_dir = entry_dir + '.tmp' + str(os.getpid())
+		if os.path.exists(entry_dir):
+			shutil.rmtree(entry_dir)
+		os.makedirs(tmp_dir)
+		with open(args.std1, 'w') as std1, open(args.std2, 'w') as std2:
+			exit_status = subprocess.call([args.builder, threads_option[args.aligner], str(args.threads), args.input_fasta, os.path.join(tmp_dir, 'index')], stdout=std1, stderr=std2)
+		if exit_status != 0:
+			shutil.rmtree(tmp_dir)
+			raise SystemExit('index-cache.py: ' + args.builder + ' returned an error')
+		with open(os.path.join(tmp_dir, 'info'), 'w') as info:
+			info.write('fasta:' + os.path.abspath(args.input_fasta) + '\n')
+			info.write('built:' + time.strftime('%Y-%m-%d %H:%M:%S') + '\n')
+		os.rename(tmp_dir, entry_dir)
+		open(os.path.join(entry_dir, 'complete'), 'w').close()
+	else:
+		with open(args.std1, 'w') as std1:
+			std1.write('Index found in index_cache/' + key + '\n')
+
+	export_entry(entry_dir, args.out_prefix)
+
+	# Last use time of the entry, used for eviction
+	os.utime(os.path.join(entry_dir, 'complete'), None)
+	fcntl.flock(lock, fcntl.LOCK_UN)
+
+evict(key)
@@ -0,0 +1,167 @@
+#
+# This script keeps the manifest of the stages run by a project (2_logs/manifest.json). For each stage
+# the manifest records its parameters and the paths and content hashes of its inputs and outputs. It is
+# used through the functions stage_skip, stage_done and stage_release of workflows/stages.sh.
+#
+# Actions:
+#	check	Exit status 0 if the stage can be skipped: it finished before with the same parameters and
+#			its inputs and outputs have not changed since. Exit status 1 otherwise.
+#			Stages that do not declare any output are never skipped.
+#	record	Store the parameters, inputs and outputs of a stage that has just finished.
+#	release	The workflow is about to delete some intermediate files that are not needed anymore, after the
+#			stage that used them (-stage) has finished. Their last hash is kept, so the stages that created
+#			them can still be skipped, but only while every stage recorded as reading them, and every stage
+#			recorded before those, is still current (its inputs and outputs have not changed). If one of them
+#			has to run again, the released files count as missing and the stage that created them is run
+#			again. A stage that reads a released file and is found stale by check also drops the release.
+#
+# Inputs and outputs can be files, folders (all the files inside are hashed) or glob patterns.
+# Files up to 256 MB are hashed completely. Bigger files (reads, alignments) are identified by
+# their size and the hash of three 1 MB blocks (start, middle and end), which is enough to tell
+# apart the files produced by the workflows and avoids reading tens of gigabytes at every stage.
+# Hashes are cached in the manifest together with the size and modification time of the file.
+#
+
+import argparse, os, json, hashlib, glob, fcntl
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-manifest', action="store", dest='manifest', required=True)
+parser.add_argument('-action', action="store", dest='action', choices=set(('check','record','release')), required=True)
+parser.add_argument('-stage', action="store", dest='stage', default='')
+parser.add_argument('-inputs', action="store", dest='inputs', default='')
+parser.add_argument('-outputs', action="store", dest='outputs', default='')
+parser.add_argument('-params', action="store", dest='params', default='')
+args = parser.parse_args()
+
+full_hash_limit = 268435456
+block_size = 1048576
+
+def load_manifest():
+	if os.path.isfile(args.manifest):
+		with open(args.manifest) as fp:
+			try:
+				return json.load(fp)
+			except ValueError:
+				pass
+	return {'stages': {}, 'files': {}, 'released': {}}
+
+def save_manifest(manifest):
+	with open(args.manifest + '.tmp', 'w') as fp:
+		json.dump(manifest, fp, indent=1, sort_keys=True)
+	os.rename(args.manifest + '.tmp', args.manifest)
+
+def file_hash(path, files):
+	st = os.stat(path)
+	cached = files.get(path)
+	if cached and cached['size'] == st.st_size and cached['mtime'] == st.st_mtime_ns:
+		return cached['hash']
+	h = hashlib.sha256()
+	with open(path, 'rb') as fp:
+		if st.st_size <= full_hash_limit:
+			for block in iter(lambda: fp.read(block_size), b''):
+				h.update(block)
+		else:
+			h.update(str(st.st_size).encode('utf-8'))
+			for offset in (0, st.st_size // 2, st.st_size - block_size):
+				fp.seek(offset)
+				h.update(fp.read(block_size))
+	files[path] = {'size': st.st_size, 'mtime': st.st_mtime_ns, 'hash': h.hexdigest()}
+	return h.hexdigest()
+
+# Hash of a file, of all the files in a folder or of all the files matching a pattern
+def path_hash(path, manifest):
+	if os.path.isfile(path):
+		return file_hash(path, manifest['files'])
+	if os.path.isdir(path):
+		members = []
+		for root, dirs, names in os.walk(path):
+			dirs.sort()
+			for name in sorted(names):
+				members.append(os.path.join(root, name))
+	else:
+		members = sorted(glob.glob(path))
+	if not members:
+		# Deleted on purpose by the workflow after it was used
+		if path in manifest['released'] and release_valid(path, manifest):
+			return released_hash(path, manifest)
+		return 'missing'
+	h = hashlib.sha256()
+	for member in members:
+		h.update((os.path.relpath(member, os.path.dirname(path)) + '\t' + file_hash(member, manifest['files']) + '\n').encode('utf-8'))
+	return h.hexdigest()
+
+def hashes(paths, manifest):
+	return dict((path, path_hash(path, manifest)) for path in paths.split())
+
+# Released paths are stored as {'hash': ..., 'stage': stage that released them} (only the hash in older manifests)
+def released_hash(path, manifest):
+	entry = manifest['released'][path]
+	return entry['hash'] if isinstance(entry, dict) else entry
+
+# A recorded stage is current if its inputs and outputs have the recorded hashes. Released paths are taken with
+# their released hash here, the validity of the releases is decided by release_valid
+def stage_current(name, manifest):
+	record = manifest['stages'].get(name)
+	if record is None:
+		return False
+	for recorded in (record['inputs'], record['outputs']):
+		for path, value in recorded.items():
+			if path in manifest['released'] and not glob.glob(path):
+				current = released_hash(path, manifest)
+			else:
+				current = path_hash(path, manifest)
+			if current != value:
+				return False
+	return True
+
+# A released path stands for its last content while no stage that could need it is run again: the stage that released
+# it, all the stages recorded as reading it and all the stages recorded before them (a stale stage makes the workflow
+# run every stage after it) must be current
+def release_valid(path, manifest):
+	entry = manifest['released'][path]
+	readers = [name for name, record in manifest['stages'].items() if path in record['inputs']]
+	if isinstance(entry, dict):
+		if entry['stage'] not in manifest['stages']:
+			return False
+		readers.append(entry['stage'])
+	last = max([stage_order(name, manifest) for name in readers] + [0])
+	return all(stage_current(name, manifest) for name in manifest['stages'] if stage_order(name, manifest) <= last)
+
+# Order in which the stages were recorded (records of older manifests count as the first ones)
+def stage_order(name, manifest):
+	return manifest['stages'][name].get('order', 0)
+
+lock = open(args.manifest + '.lock', 'a')
+fcntl.flock(lock, fcntl.LOCK_EX)
+manifest = load_manifest()
+
+if args.action == 'check':
+	record = manifest['stages'].get(args.stage)
+	current = (record is not None and record['outputs'] and record['params'] == args.params
+		and record['inputs'] == hashes(args.inputs, manifest)
+		and record['outputs'] == hashes(args.outputs, manifest)
+		and 'missing' not in record['outputs'].values())
+	if not current:
+		# The stage will run and read its inputs: the released ones are not available anymore
+		for path in args.inputs.split():
+			if path in manifest['released'] and not glob.glob(path):
+				del manifest['released'][path]
+	save_manifest(manifest)
+	fcntl.flock(lock, fcntl.LOCK_UN)
+	raise SystemExit(0 if current else 1)
+
+if args.action == 'record':
+	manifest['stages'][args.stage] = {
+		'order': max([stage_order(name, manifest) for name in manifest['stages']] + [0]) + 1,
+		'params': args.params,
+		'inputs': hashes(args.inputs, manifest),
+		'outputs': hashes(args.outputs, manifest)}
+
+if args.action == 'release':
+	for path in args.outputs.split():
+		if path in manifest['released'] and not glob.glob(path):
+			continue		# Already released by an earlier run of the workflow
+		manifest['released'][path] = {'hash': path_hash(path, manifest), 'stage': args.stage}
+
+save_manifest(manifest)
+fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,123 @@
+#
+# This script measures the resources used by the stages of a project and stores them in 2_logs/metrics.jsonl
+# (one JSON object per stage). It is used through the functions stage_skip and stage_done of
+# workflows/stages.sh.
+#
+# Actions:
+#	sample	Started in the background when a stage starts. It adds up the size of the inputs of the stage
+#			and then, until it is stopped, samples every 0.2 seconds the memory (RSS) of all the processes
+#			started by the workflow shell (-pid), keeping the peak in the file -sample. The Python stage
+#			runner (-exclude) and its processes are not included: the scripts it runs report their
+#			resources themselves.
+#	record	Run when the stage finishes. It writes the line of the stage to the metrics file with its wall
+#			time, CPU time (user + system time of the finished child processes of the workflow shell,
+#			measured by the shell itself), peak RSS and bytes of its inputs and outputs. The CPU time of
+#			the scripts run by the Python stage runner is added from the file -runner, and their peak RSS
+#			is used if it is larger than the one sampled.
+#
+
+import argparse, os, sys, json, glob, time, signal
+
+parser = argparse.ArgumentParser()
+parser.add_argument('action', choices=set(('sample','record')))
+parser.add_argument('-pid', action="store", dest='pid', type=int)
+parser.add_argument('-exclude', action="store", dest='exclude', type=int)
+parser.add_argument('-sample', action="store", dest='sample', required=True)
+parser.add_argument('-inputs', action="store", dest='inputs', default='')
+parser.add_argument('-metrics', action="store", dest='metrics')
+parser.add_argument('-stage', action="store", dest='stage')
+parser.add_argument('-script', action="store", dest='script', default='')
+parser.add_argument('-start', action="store", dest='start', type=float)
+parser.add_argument('-end', action="store", dest='end', type=float)
+parser.add_argument('-cpu_ticks', action="store", dest='cpu_ticks', type=int, default=0)
+parser.add_argument('-runner', action="store", dest='runner', default='')
+parser.add_argument('-threads', action="store", dest='threads', default='')
+parser.add_argument('-outputs', action="store", dest='outputs', default='')
+args = parser.parse_args()
+
+page_size = os.sysconf('SC_PAGE_SIZE')
+
+# Bytes of a list of files, folders or glob patterns
+def paths_size(paths):
+	size = 0
+	for path in paths.split():
+		for member in glob.glob(path):
+			if os.path.isdir(member):
+				for root, dirs, names in os.walk(member):
+					for name in names:
+						size += os.path.getsize(os.path.join(root, name))
+			else:
+				size += os.path.getsize(member)
+	return size
+
+# Sum of the RSS of all the descendants of a process (except this one and the subtree of -exclude)
+def tree_rss(pid):
+	children = {}
+	for entry in os.listdir('/proc'):
+		if not entry.isdigit():
+			continue
+		try:
+			with open('/proc/' + entry + '/stat') as fp:
+				ppid = int(fp.read().rsplit(')', 1)[1].split()[1])
+		except (IOError, OSError, IndexError, ValueError):
+			continue
+		children.setdefault(ppid, []).append(int(entry))
+	rss = 0
+	pending = list(children.get(pid, []))
+	while pending:
+		child = pending.pop()
+		if child == args.exclude:
+			continue
+		pending.extend(children.get(child, []))
+		if child == os.getpid():
+			continue
+		try:
+			with open('/proc/' + str(child) + '/statm') as fp:
+				rss += int(fp.read().split()[1]) * page_size
+		except (IOError, OSError, IndexError, ValueError):
+			continue
+	return rss
+
+def write_sample(sample):
+	with open(args.sample + '.tmp', 'w') as fp:
+		json.dump(sample, fp)
+	os.rename(args.sample + '.tmp', args.sample)
+
+if args.action == 'sample':
+	signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+	sample = {'input_bytes': paths_size(args.inputs), 'peak_rss': 0}
+	write_sample(sample)
+	while os.path.exists('/proc/' + str(args.pid)):
+		rss = tree_rss(args.pid)
+		if rss > sample['peak_rss']:
+			sample['peak_rss'] = rss
+			write_sample(sample)
+		time.sleep(0.2)
+
+if args.action == 'record':
+	sample = {'input_bytes': None, 'peak_rss': None}
+	if os.path.isfile(args.sample):
+		with open(args.sample) as fp:
+			sample = json.load(fp)
+		os.remove(args.sample)
+	cpu_time = float(args.cpu_ticks) / os.sysconf('SC_CLK_TCK')
+	if os.path.isfile(args.runner):
+		with open(args.runner) as fp:
+			for line in fp:
+				cpu, rss = line.split()
+				cpu_time += float(cpu)
+				sample['peak_rss'] = max(sample['peak_rss'] or 0, int(rss))
+		os.remove(args.runner)
+	metrics = {
+		'execution': os.environ.get('stage_execution', ''),
+		'script': args.script,
+		'stage': args.stage,
+		'start': round(args.start, 3),
+		'wall_time': round(args.end - args.start, 3),
+		'cpu_time': round(cpu_time, 3),
+		'peak_rss': sample['peak_rss'],
+		'input_bytes': sample['input_bytes'],
+		'output_bytes': paths_size(args.outputs),
+		'threads': int(args.threads) if args.threads.isdigit() else None}
+	with open(args.metrics, 'a') as fp:
+		fp.write(json.dumps(metrics, sort_keys=True) + '\n')
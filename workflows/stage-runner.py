@@ -0,0 +1,148 @@
+#
+# This script is a long-lived Python process that runs the Python stages of a workflow, so the workflow
+# does not start a new interpreter for every script and the files that most stages read (the genome, the
+# GFF and the variant tables) are kept in memory between stages. It is started and used through the
+# functions stage_runner_start and run_python of workflows/stages.sh.
+#
+# Requests are files in the runner folder (-dir): <id>.request holds the working directory, the path of
+# the script and its arguments, separated by NUL characters. For each request the runner:
+#	- Loads in the cache of workflows/stage_cache.py the files in the arguments with the extensions .fa,
+#	  .fasta, .gff and .va. The cache lives in the runner process, so the next stages find them there.
+#	  Only the contig lengths of the fasta files are loaded, except for the scripts that read the sequences
+#	  (sequence_scripts). Each request is loaded in its own thread, so a request does not wait for the files
+#	  of another one, and the files that have been deleted or replaced are dropped from the cache first.
+#	- Forks a process that runs the script as 'python3 script arguments' would (runpy, with the folder of
+#	  the script at the start of sys.path and __name__ == '__main__'). Its standard output and error are
+#	  written to <id>.out and <id>.err. The scripts keep working as standalone command line tools.
+#	- When the script finishes, writes to <id>.status its exit status, CPU time (seconds) and peak RSS (bytes).
+# Several requests can be run at the same time (stages of the snp workflow run concurrently).
+# A file that cannot be loaded in the cache is skipped: the script reads it itself and reports the problem.
+#
+# The work of the hot stages is done by importable functions, and their scripts are the command line wrappers:
+# variant filtering, af-comparison join and map-mutation windows in scripts_snp/snp_analysis.py, and the
+# annotation of the variants in varanalyzer/varanalyzer.py (function varanalyzer). The readers that the scripts
+# share are importable too: stage_cache.py, va_store.py and scripts_ins/sam_reader.py. The runner still runs the
+# scripts, each one with runpy in a forked process, because some of them keep their state at module level, call
+# sys.exit or change the working directory: every stage starts from a clean copy of the runner, with the files
+# already loaded, so a script cannot leave state behind for the next one.
+# The runner stops when it receives SIGTERM or when the workflow shell that started it (-ppid) ends.
+#
+
+import argparse, os, sys, time, signal, traceback, runpy, gc, threading, warnings
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-dir', action="store", dest='dir', required=True)
+parser.add_argument('-ppid', action="store", dest='ppid', type=int, required=True)
+args = parser.parse_args()
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import stage_cache
+
+# Libraries used by several stages are imported once
+try:
+	from PIL import Image, ImageDraw, ImageFont, ImageOps
+except ImportError:
+	pass
+
+# Scripts that call stage_cache.fasta_contigs: the sequences of their fasta arguments are loaded too
+sequence_scripts = ('varanalyzer.py', 'primer-generation.py', 'extend-ins-info.py', 'extend-snp-variants-info.py')
+
+# The requests are forked from the main thread while other requests are being loaded
+warnings.filterwarnings('ignore', message='.*multi-threaded.*')
+
+def write_status(request, status):
+	with open(request + '.status.tmp', 'w') as fp:
+		fp.write(status + '\n')
+	os.rename(request + '.status.tmp', request + '.status')
+
+def run_script(request, cwd, script, script_args):
+	os.chdir(cwd)
+	for fd, name, flags in ((0, os.devnull, os.O_RDONLY), (1, request + '.out', os.O_WRONLY | os.O_CREAT | os.O_TRUNC), (2, request + '.err', os.O_WRONLY | os.O_CREAT | os.O_TRUNC)):
+		new_fd = os.open(name, flags, 0o644)
+		os.dup2(new_fd, fd)
+		os.close(new_fd)
+	sys.argv = [script] + script_args
+	sys.path[0] = os.path.dirname(os.path.abspath(script))
+	code = 0
+	try:
+		runpy.run_path(script, run_name='__main__')
+	except SystemExit as e:
+		if e.code is None:
+			code = 0
+		elif isinstance(e.code, int):
+			code = e.code
+		else:
+			sys.stderr.write(str(e.code) + '\n')
+			code = 1
+	except BaseException:
+		traceback.print_exc()
+		code = 1
+	try:
+		sys.stdout.flush()
+		sys.stderr.flush()
+	except Exception:
+		code = code or 1
+	os._exit(code)
+
+# Runs in its own process: starts the script and waits for it, to report its exit status and resources
+def run_request(request, cwd, script, script_args):
+	stage_cache._locks = {}		# A lock held by a loading thread of the runner would never be released here
+	signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+	signal.signal(signal.SIGTERM, signal.SIG_DFL)
+	pid = os.fork()
+	if pid == 0:
+		run_script(request, cwd, script, script_args)
+	pid, status, usage = os.wait4(pid, 0)
+	code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else 128 + os.WTERMSIG(status)
+	write_status(request, '%d %.3f %d' % (code, usage.ru_utime + usage.ru_stime, usage.ru_maxrss * 1024))
+	os._exit(0)
+
+def preload_request(cwd, script, script_args):
+	sequences = os.path.basename(script) in sequence_scripts
+	for arg in script_args:
+		path = os.path.join(cwd, arg)
+		if os.path.isfile(path):
+			try:
+				stage_cache.preload(path, sequences)
+			except Exception:
+				pass
+
+# Reads a request and starts loading its files. Returns the request and its loading thread
+def read_request(name):
+	request = os.path.join(args.dir, name[:-len('.request')])
+	os.rename(request + '.request', request + '.running')
+	with open(request + '.running') as fp:
+		fields = fp.read().split('\0')
+	os.remove(request + '.running')
+	if fields and fields[-1] == '':
+		fields.pop()
+	cwd, script, script_args = fields[0], fields[1], fields[2:]
+	thread = threading.Thread(target=preload_request, args=(cwd, script, script_args))
+	thread.daemon = True
+	thread.start()
+	return (request, cwd, script, script_args, thread)
+
+def start_request(request, cwd, script, script_args):
+	sys.stdout.flush()
+	sys.stderr.flush()
+	if hasattr(gc, 'freeze'):
+		gc.freeze()		# The cached objects are shared with the forked processes, keep the collector from writing to them
+	if os.fork() == 0:
+		run_request(request, cwd, script, script_args)
+
+# Finished request processes are collected by the system
+signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+loading = []
+while os.getppid() == args.ppid:
+	names = sorted(name for name in os.listdir(args.dir) if name.endswith('.request'))
+	if names:
+		stage_cache.evict()
+	for name in names:
+		loading.append(read_request(name))
+	for entry in [entry for entry in loading if not entry[-1].is_alive()]:
+		loading.remove(entry)
+		start_request(*entry[:-1])
+	if not names:
+		time.sleep(0.02)
@@ -0,0 +1,175 @@
+#
+# In-memory cache of the files that many stages of a workflow read again and again: the genome, the GFF
+# and the variant (.va) tables. The Python scripts of the workflows read these files through this module:
+#
+#	sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+#	import stage_cache
+#	for name_contig, seq_contig in stage_cache.fasta_contigs(fasta_path): ...
+#	lines = stage_cache.text_lines(va_path)
+#
+# When a script runs on its own, the cache only saves the repeated reads inside the script (varanalyzer
+# and primer-generation read the genome once per variant). When it is run by the stage runner
+# (workflows/stage-runner.py), the runner loads the files in the cache before starting the script, so the
+# files stay in memory between the stages of the workflow.
+# Each file is cached with its size and modification time: a file that has changed is read again. The
+# runner drops the files that have been deleted or replaced and keeps the cache under cache_limit (evict).
+#
+# Genome manifest:
+# process_input/fasta-concat.py writes two files next to genome.fa with write_genome_manifest:
+#	genome.fa.fai	samtools faidx index: contig, length, offset, bases per line, bytes per line
+#	genome.fa.stats	contig, length, G+C bases, N bases and GC content (of the bases that are not N)
+# The stages that only need the names and lengths of the contigs use fasta_lengths, which reads the index
+# instead of the sequences. If the index is missing or older than the fasta file, the lengths are counted
+# from the fasta file without keeping the sequences in memory.
+#
+
+import os, time, threading
+
+_cache = {}
+
+# Bytes of cached files (size of the files on disk) that evict keeps in the cache
+cache_limit = 4 << 30
+
+# Data loaded from a file by load(path), kept until the file changes. Also used by va_store.py. A file is loaded
+# once even if several threads of the stage runner ask for it at the same time. Small data (small=True, like the
+# contig lengths of a genome) does not count for cache_limit
+def cached(path, kind, load, small=False):
+	path = os.path.abspath(path)
+	st = os.stat(path)
+	key = (kind, path)
+	entry = _cache.get(key)
+	if entry is None or entry['stamp'] != (st.st_size, st.st_mtime_ns):
+		with _cache_lock(key):
+			entry = _cache.get(key)
+			if entry is None or entry['stamp'] != (st.st_size, st.st_mtime_ns):
+				entry = {'stamp': (st.st_size, st.st_mtime_ns), 'data': load(path), 'size': 0 if small else st.st_size}
+				_cache[key] = entry
+	entry['used'] = time.time()
+	return entry['data']
+
+_locks = {}
+
+def _cache_lock(key):
+	return _locks.setdefault(key, threading.Lock())
+
+# Drop the entries of the files that have been deleted or replaced, then the least recently used entries until
+# the cached files take up to cache_limit bytes. Used by the stage runner
+def evict():
+	entries = []
+	for key, entry in list(_cache.items()):
+		try:
+			st = os.stat(key[1])
+		except OSError:
+			st = None
+		if st is None or entry['stamp'] != (st.st_size, st.st_mtime_ns):
+			_cache.pop(key, None)
+		else:
+			entries.append((entry.get('used', 0), key, entry['size']))
+	total = sum(size for used, key, size in entries)
+	for used, key, size in sorted(entries):
+		if total <= cache_limit:
+			break
+		_cache.pop(key, None)
+		total -= size
+
+# Function to parse fasta file (based on one of the Biopython IOs)
+def read_fasta(fp):
+	name, seq = None, []
+	for line in fp:
+		line = line.rstrip()
+		if line.startswith('>'):
+			if name: yield (name, ''.join(seq))
+			name, seq = line, []
+		else:
+			seq.append(line)
+	if name: yield (name, ''.join(seq))
+
+def _load_fasta(path):
+	with open(path) as fp:
+		return tuple(read_fasta(fp))
+
+def _load_lines(path):
+	with open(path) as fp:
+		return tuple(fp.readlines())
+
+# (name, sequence) of the contigs of a fasta file, in the same form that read_fasta(fp) yields them
+# (the name keeps the '>')
+def fasta_contigs(path):
+	return list(cached(path, 'fasta', _load_fasta))
+
+# Lines of a text file, as file.readlines() returns them
+def text_lines(path):
+	return list(cached(path, 'lines', _load_lines))
+
+# Contigs of a fasta file, one dictionary per contig with its name (without the '>' and the description),
+# length, index fields and base counts. The file is read line by line
+def _scan_fasta(path):
+	contigs = []
+	contig = None
+	offset = 0
+	with open(path, 'rb') as fp:
+		for line in fp:
+			offset += len(line)
+			if line.startswith(b'>'):
+				name = (line[1:].split() or [b''])[0].decode('utf-8')
+				contig = {'name': name, 'length': 0, 'offset': offset, 'linebases': 0, 'linebytes': 0, 'gc': 0, 'n': 0}
+				contigs.append(contig)
+				continue
+			if contig is None:
+				continue
+			bases = line.rstrip(b'\r\n')
+			if contig['linebases'] == 0:
+				contig['linebases'] = len(bases)
+				contig['linebytes'] = len(line)
+			contig['length'] += len(bases)
+			contig['gc'] += bases.count(b'G') + bases.count(b'C') + bases.count(b'g') + bases.count(b'c')
+			contig['n'] += bases.count(b'N') + bases.count(b'n')
+	return contigs
+
+def _load_lengths(path):
+	index = path + '.fai'
+	if os.path.isfile(index) and os.path.getmtime(index) >= os.path.getmtime(path):
+		lengths = []
+		with open(index) as fp:
+			for line in fp:
+				fields = line.split('\t')
+				lengths.append((fields[0], int(fields[1])))
+		return tuple(lengths)
+	return tuple((contig['name'], contig['length']) for contig in _scan_fasta(path))
+
+# (name, length) of the contigs of a fasta file, from its genome manifest. The name is the first word of
+# the header, without the '>'
+def fasta_lengths(path):
+	return list(cached(path, 'lengths', _load_lengths, small=True))
+
+# Write the genome manifest (index and base statistics) of a fasta file
+def write_genome_manifest(path):
+	contigs = _scan_fasta(path)
+	with open(path + '.fai.tmp', 'w') as index:
+		for contig in contigs:
+			index.write('%s\t%d\t%d\t%d\t%d\n' % (contig['name'], contig['length'], contig['offset'], contig['linebases'], contig['linebytes']))
+	with open(path + '.stats.tmp', 'w') as stats:
+		stats.write('#contig\tlength\tgc\tn\tgc_content\n')
+		for contig in contigs:
+			acgt = contig['length'] - contig['n']
+			stats.write('%s\t%d\t%d\t%d\t%.4f\n' % (contig['name'], contig['length'], contig['gc'], contig['n'], float(contig['gc']) / acgt if acgt else 0))
+	os.rename(path + '.fai.tmp', path + '.fai')
+	os.rename(path + '.stats.tmp', path + '.stats')
+
+# Load a file in the cache according to its extension. Used by the stage runner. Only the contig lengths of a
+# fasta file are loaded, unless the sequences are asked for (scripts that call fasta_contigs). The .va tables are
+# loaded with va_store (mapped in memory), their lines are read by the scripts that need them
+def preload(path, sequences=False):
+	name = path.lower()
+	if name.endswith(('.fa', '.fasta', '.fna')):
+		fasta_lengths(path)
+		if sequences:
+			fasta_contigs(path)
+	elif name.endswith(('.gff', '.gff3')):
+		text_lines(path)
+	elif name.endswith('.va'):
+		try:
+			import va_store
+		except ImportError:
+			return
+		va_store.load(path)
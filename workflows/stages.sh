@@ -0,0 +1,276 @@
+#!/bin/bash
+#
+# Functions shared by the workflows to run their stages.
+# This file is sourced by the workflow scripts, it is not meant to be executed.
+#
+# Stage scheduler:
+# Independent stages (for example, the processing of the mutant and the control samples in the snp
+# workflow) can be run at the same time. Each stage is a shell function. Stages are declared with their
+# dependencies and then run all together:
+#
+#	stage_add <stage name> "<names of the stages it depends on>" <function> [arguments]
+#	stages_run
+#
+# A stage starts as soon as all its dependencies have finished. The stages that run at the same time
+# share the thread budget of the project ($threads): each one sees its own share in the variable
+# $threads. A stage runs in a subshell and fails when it exits with a non-zero status, so the error handlers
+# of the stage functions end with 'exit $exit_code' after the usual 'echo $exit_code'. Stages whose handlers
+# still end with a plain 'exit' are also seen as failed when the last line of their output is 1.
+# If a stage fails, the stages that depend on it are not started, and stages_run returns 1 once the
+# stages already running have finished.
+#
+# pipeline_ok:
+# The status of a pipeline is the status of its last command. To check that all of them succeeded,
+# call pipeline_ok right after the pipeline: aligner ... | samtools sort ... ; pipeline_ok ${PIPESTATUS[@]}
+#
+# Resumable stages:
+# Each stage records its parameters and the content hashes of its inputs and outputs in the manifest of
+# the project, 2_logs/manifest.json (see workflows/stage-manifest.py). When a project is resumed
+# (./easymap.sh resume <project folder>, then started by the job queue with stage_resume=1), the stages whose inputs and
+# outputs have not changed since they finished are skipped, and the workflow continues from the first
+# stale stage: from there on, every stage is run again. The first stale stage is written to 2_logs/resume_stale,
+# so the stages run by stages_run (in subshells, which cannot change the variables of the workflow) also
+# stop the skipping for the rest of the workflow. A stage is written as:
+#
+#	stage_skip <stage name> "<inputs>" "<outputs>" "<parameters>" || {
+#		commands
+#	} || {
+#		error handling
+#	}
+#	stage_done
+#
+# Inputs and outputs are lists of files, folders or glob patterns. Parameters are the arguments of the
+# stage that change its output (not the number of threads). Stages without outputs (graphics, report...)
+# are never skipped, and they do not count as stale stages when a project is resumed.
+# Error handlers that let the workflow go on (instead of exiting) call stage_fail, so stage_done does not
+# record the stage and it is run again when the project is resumed. stage_done returns 1 for a failed stage.
+# stage_release <files> deletes intermediate files that are not needed anymore. It is called after the
+# stage_done of the last stage that reads them, and only if that stage succeeded:
+#
+#	stage_done && stage_release $f1/alignment.bam
+#
+# Their hashes are kept in the manifest, so the stage that created them can still be skipped while the
+# stages that read them are current (see workflows/stage-manifest.py).
+#
+# Stage metrics:
+# Every stage that is run appends its wall time, CPU time, peak RSS and the bytes of its inputs and outputs
+# to 2_logs/metrics.jsonl (see workflows/stage-metrics.py). The report shows them in its performance section.
+#
+# Python stage runner:
+# stage_runner_start starts a Python process that runs the Python scripts of the workflow and keeps the
+# genome, GFF and variant files in memory between stages (see workflows/stage-runner.py). The scripts are
+# then run with run_python instead of python3:
+#
+#	run_python $location/scripts_snp/variants-filter.py -a ... 2>> $my_log_file
+#
+# run_python behaves like python3 (standard output and error, exit status). It runs the script with python3
+# if the runner has not been started or has stopped. Scripts that read their standard input must be run
+# with python3. The runner is stopped when the workflow exits.
+#
+
+declare -a stage_names=()
+declare -A stage_deps=()
+declare -A stage_cmd=()
+declare -A stage_state=()
+
+function stage_add {
+	local name=$1
+	local deps=$2
+	shift 2
+	stage_names+=($name)
+	stage_deps[$name]=$deps
+	stage_cmd[$name]="$*"
+	stage_state[$name]=waiting
+}
+
+function stages_run {
+	local total_threads=$threads
+	local failed=0
+	local running=0
+	local name dep ready ready_names share
+	declare -A stage_pid=()
+
+	while true; do
+		# Find the stages whose dependencies have all finished
+		ready_names=()
+		for name in "${stage_names[@]}"; do
+			[ ${stage_state[$name]} == waiting ] || continue
+			ready=1
+			for dep in ${stage_deps[$name]}; do
+				if [ "${stage_state[$dep]}" == failed ] || [ "${stage_state[$dep]}" == cancelled ]; then
+					stage_state[$name]=cancelled
+					ready=0
+					break
+				fi
+				[ "${stage_state[$dep]}" == done ] || ready=0
+			done
+			[ $ready == 1 ] && [ $failed == 0 ] && ready_names+=($name)
+		done
+
+		# Start them, splitting the thread budget between all the stages that will be running
+		if [ ${#ready_names[@]} -gt 0 ]; then
+			share=$(( total_threads / (running + ${#ready_names[@]}) ))
+			[ $share -lt 1 ] && share=1
+			for name in "${ready_names[@]}"; do
+				( threads=$share; ${stage_cmd[$name]} ) > $f2/stage_$name.out &
+				stage_pid[$name]=$!
+				stage_state[$name]=running
+				running=$((running + 1))
+			done
+		fi
+
+		[ $running == 0 ] && break
+
+		# Wait for any of the running stages to finish and check how it ended
+		wait -n
+		for name in "${!stage_pid[@]}"; do
+			kill -0 ${stage_pid[$name]} 2> /dev/null && continue
+			wait ${stage_pid[$name]}
+			if [ $? != 0 ] || [ "$(tail -n 1 $f2/stage_$name.out)" == 1 ]; then
+				stage_state[$name]=failed
+				failed=1
+			else
+				stage_state[$name]=done
+			fi
+			rm -f $f2/stage_$name.out
+			unset stage_pid[$name]
+			running=$((running - 1))
+		done
+	done
+
+	# Leave the scheduler ready for the next group of stages
+	stage_names=()
+	stage_deps=()
+	stage_cmd=()
+	stage_state=()
+
+	return $failed
+}
+
+function pipeline_ok {
+	local status
+	for status in "$@"; do
+		[ $status == 0 ] || return 1
+	done
+	return 0
+}
+
+stage_manifest_py=$(dirname ${BASH_SOURCE[0]})/stage-manifest.py
+stage_metrics_py=$(dirname ${BASH_SOURCE[0]})/stage-metrics.py
+stage_runner_py=$(dirname ${BASH_SOURCE[0]})/stage-runner.py
+stage_current=
+stage_last=
+stage_failed=0
+
+function stage_skip {
+	stage_current=$1
+	stage_last=$1
+	stage_failed=0
+	stage_inputs=$2
+	stage_outputs=$3
+	stage_params=$4
+	if [ "$stage_resume" == 1 ] && [ -n "$3" ]; then
+		if ! [ -f $project_name/2_logs/resume_stale ] && python3 $stage_manifest_py -manifest $project_name/2_logs/manifest.json -action check -stage "$1" -inputs "$2" -outputs "$3" -params "$4" 2>> $my_log_file; then
+			echo $(date "+%F > %T")": Stage $1 skipped, its inputs and outputs have not changed." >> $my_log_file
+			stage_current=
+			return 0
+		fi
+		if ! [ -f $project_name/2_logs/resume_stale ]; then
+			echo $(date "+%F > %T")": Resuming the project from stage $1." >> $my_log_file
+			echo $1 > $project_name/2_logs/resume_stale
+		fi
+		stage_resume=0
+	fi
+	stage_metrics_start
+	return 1
+}
+
+function stage_fail {
+	stage_failed=1
+}
+
+function stage_done {
+	if [ -n "$stage_current" ]; then
+		stage_metrics_end
+		if [ $stage_failed == 0 ] && [ -n "$stage_outputs" ]; then
+			python3 $stage_manifest_py -manifest $project_name/2_logs/manifest.json -action record -stage "$stage_current" -inputs "$stage_inputs" -outputs "$stage_outputs" -params "$stage_params" 2>> $my_log_file
+		fi
+	fi
+	stage_current=
+	return $stage_failed
+}
+
+# The stage that read the files last is recorded with them (stage_last, the stage of the previous stage_done)
+function stage_release {
+	python3 $stage_manifest_py -manifest $project_name/2_logs/manifest.json -action release -stage "$stage_last" -outputs "$*" 2>> $my_log_file
+	rm -rf "$@"
+}
+
+# CPU time of the finished child processes of the shell running the stage, in clock ticks (cutime + cstime).
+# It is stored in $stage_cpu, because in a command substitution $BASHPID would be a subshell
+function stage_children_cpu {
+	local stat
+	read -a stat < /proc/$BASHPID/stat
+	stage_cpu=$(( ${stat[15]} + ${stat[16]} ))
+}
+
+function stage_metrics_start {
+	rm -f $project_name/2_logs/metrics_$stage_current.runner
+	stage_start_time=$(date +%s.%N)
+	stage_children_cpu
+	stage_start_cpu=$stage_cpu
+	local shell_pid=$BASHPID		# $BASHPID in the background command would be the pid of the new process
+	python3 $stage_metrics_py sample -pid $shell_pid -exclude "${stage_runner_pid:-0}" -inputs "$stage_inputs" -sample $project_name/2_logs/metrics_$stage_current.tmp > /dev/null 2>> $my_log_file &
+	stage_sampler=$!
+}
+
+function stage_metrics_end {
+	local end_time=$(date +%s.%N)
+	stage_children_cpu
+	kill $stage_sampler 2> /dev/null
+	wait $stage_sampler 2> /dev/null
+	python3 $stage_metrics_py record -metrics $project_name/2_logs/metrics.jsonl -sample $project_name/2_logs/metrics_$stage_current.tmp -runner $project_name/2_logs/metrics_$stage_current.runner -stage "$stage_current" -script $(basename $0) -start $stage_start_time -end $end_time -cpu_ticks $(( stage_cpu - stage_start_cpu )) -threads "$threads" -outputs "$stage_outputs" 2>> $my_log_file
+}
+
+function stage_runner_start {
+	stage_runner_dir=$project_name/2_logs/runner
+	rm -rf $stage_runner_dir
+	mkdir -p $stage_runner_dir
+	python3 $stage_runner_py -dir $stage_runner_dir -ppid $$ > /dev/null 2>> $my_log_file &
+	stage_runner_pid=$!
+	trap stage_runner_stop EXIT
+}
+
+function stage_runner_stop {
+	[ -n "$stage_runner_pid" ] || return 0
+	kill $stage_runner_pid 2> /dev/null
+	wait $stage_runner_pid 2> /dev/null
+	rm -rf $stage_runner_dir
+	stage_runner_pid=
+}
+
+function run_python {
+	if [ -z "$stage_runner_pid" ] || ! kill -0 $stage_runner_pid 2> /dev/null; then
+		python3 "$@"
+		return
+	fi
+	local request=$stage_runner_dir/$BASHPID.$RANDOM$RANDOM
+	local code cpu rss
+	printf '%s\0' "$PWD" "$@" > $request.tmp
+	mv $request.tmp $request.request
+	while [ ! -f $request.status ]; do
+		# The runner has stopped: run the script here
+		if ! kill -0 $stage_runner_pid 2> /dev/null; then
+			rm -f $request.*
+			python3 "$@"
+			return
+		fi
+		sleep 0.02
+	done
+	read code cpu rss < $request.status
+	cat $request.out
+	cat $request.err >&2
+	[ -n "$stage_current" ] && echo "$cpu $rss" >> $project_name/2_logs/metrics_$stage_current.runner
+	rm -f $request.*
+	return $code
+}
@@ -0,0 +1,198 @@
+#
+# Columnar store of the variant tables (.va files) of the snp workflow. The stages load a .va file as
+# NumPy arrays instead of splitting and converting its lines again and again:
+#
+#	sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows'))
+#	import va_store
+#	table = va_store.load(va_path)
+#	af = table.alt_dp / (table.alt_dp + table.ref_dp)
+#	table.write(output_path, af > 0.8)
+#
+# The first time a .va file is loaded, its columns are written to <file>.va.col next to it. The next loads
+# map that file in memory (np.memmap), so reading a table does not depend on its number of lines. The
+# store records the size and modification time of the .va file: when the text changes, the store is
+# built again. The .va text is never replaced, so it is still there for the users and the other scripts.
+#
+# Columns of a table (one element per variant, the lines starting with '#' are kept apart in 'header'):
+#	chrom		uint16 (uint32 with more than 65535 contigs) code of the contig, its name is chroms[code]
+#	pos			int32 position
+#	ref, alt	bytes (fixed width) reference and alternative alleles
+#	qual		float32 quality (nan if it is '.')
+#	depths		uint16 (uint32 if any depth is over 65535), one column per depth field of the file: REF_DP and
+#				ALT_DP, and in the tables of af-comparison also the depths of the second sample
+#	ref_dp, alt_dp	first two columns of depths
+#	offsets		int64 start of the line of each variant in the .va file (and end of the file at the end)
+# The text of the variants is only read when it is needed: table.lines(rows) and table.write(path, rows)
+# copy the original lines of the selected variants.
+#
+
+import os, sys, json, mmap
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import stage_cache
+
+magic = b'EMVACOL1'
+
+class VaTable(object):
+	def __init__(self, path, header, chroms, columns):
+		self.path = path
+		self.header = header
+		self.chroms = chroms
+		self.chrom = columns['chrom']
+		self.pos = columns['pos']
+		self.ref = columns['ref']
+		self.alt = columns['alt']
+		self.qual = columns['qual']
+		self.depths = columns['depths']
+		self.offsets = columns['offsets']
+		self.ref_dp = self.depths[:, 0]
+		self.alt_dp = self.depths[:, 1]
+		self.rows = len(self.pos)
+
+	# Code of a contig, or -1 if the table has no variants in it
+	def chrom_code(self, name):
+		try:
+			return self.chroms.index(name)
+		except ValueError:
+			return -1
+
+	# Indices of the variants selected by a boolean mask, a list of indices or None (all of them)
+	def _indices(self, rows):
+		if rows is None:
+			return np.arange(self.rows)
+		rows = np.asarray(rows)
+		if rows.dtype == bool:
+			return np.flatnonzero(rows)
+		return rows
+
+	# Original lines of the selected variants
+	def lines(self, rows=None):
+		indices = self._indices(rows)
+		if len(indices) == 0:
+			return []
+		with open(self.path, 'rb') as fp:
+			text = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+			try:
+				return [text[start:end].decode('utf-8') for start, end in zip(self.offsets[indices].tolist(), self.offsets[indices + 1].tolist())]
+			finally:
+				text.close()
+
+	# Write the selected variants to a new .va file, with the header lines of this one if header is True
+	def write(self, path, rows=None, header=False):
+		with open(path, 'w') as out:
+			if header:
+				out.writelines(self.header)
+			out.writelines(self.lines(rows))
+
+def _store_path(path):
+	return path + '.col'
+
+def _source_id(path):
+	st = os.stat(path)
+	return [st.st_size, st.st_mtime_ns]
+
+def _min_uint(maximum):
+	return np.uint16 if maximum <= 65535 else np.uint32
+
+# Parse the text of a .va file. Each variant line keeps its start in the file, so its text can be read later
+def _parse(path):
+	header = []
+	chroms = []
+	chrom_codes = {}
+	chrom, pos, ref, alt, qual, depths, offsets = [], [], [], [], [], [], []
+	offset = 0
+	with open(path, 'rb') as fp:
+		for line in fp:
+			start = offset
+			offset += len(line)
+			if line.startswith(b'#'):
+				header.append(line.decode('utf-8'))
+				continue
+			sp = line.split()
+			if not sp:
+				continue
+			if len(sp) < 7:
+				raise ValueError(path + ': line with less than 7 columns')
+			name = sp[0].decode('utf-8')
+			if name not in chrom_codes:
+				chrom_codes[name] = len(chroms)
+				chroms.append(name)
+			chrom.append(chrom_codes[name])
+			pos.append(int(sp[1]))
+			ref.append(sp[2])
+			alt.append(sp[3])
+			qual.append(float('nan') if sp[4] == b'.' else float(sp[4]))
+			depths.append([int(value) for value in sp[5:]])
+			offsets.append(start)
+	offsets.append(offset)
+	n_depths = len(depths[0]) if depths else 2
+	if any(len(row) != n_depths for row in depths):
+		raise ValueError(path + ': lines with different number of columns')
+	depths = np.array(depths, dtype=np.int64).reshape(len(depths), n_depths)
+	columns = {
+		'chrom': np.array(chrom, dtype=_min_uint(len(chroms))),
+		'pos': np.array(pos, dtype=np.int32),
+		'ref': np.array(ref, dtype=bytes),
+		'alt': np.array(alt, dtype=bytes),
+		'qual': np.array(qual, dtype=np.float32),
+		'depths': depths.astype(_min_uint(depths.max() if depths.size else 0)),
+		'offsets': np.array(offsets, dtype=np.int64)}
+	return header, chroms, columns
+
+# Store file: magic, length of the JSON description, JSON description and the columns (aligned to 16 bytes)
+def _write_store(path, source, header, chroms, columns):
+	description = {'source': source, 'header': header, 'chroms': chroms, 'columns': {}}
+	offset = 0
+	for name in sorted(columns):
+		array = columns[name]
+		description['columns'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+		offset += (array.nbytes + 15) // 16 * 16
+	text = json.dumps(description).encode('utf-8')
+	data_start = (len(magic) + 8 + len(text) + 15) // 16 * 16
+	tmp = _store_path(path) + '.tmp'
+	with open(tmp, 'wb') as out:
+		out.write(magic + len(text).to_bytes(8, 'little') + text)
+		for name in sorted(columns):
+			out.seek(data_start + description['columns'][name]['offset'])
+			out.write(columns[name].tobytes())
+		out.truncate(data_start + offset)
+	os.rename(tmp, _store_path(path))
+
+def _read_store(path, source):
+	with open(_store_path(path), 'rb') as fp:
+		if fp.read(len(magic)) != magic:
+			return None
+		length = int.from_bytes(fp.read(8), 'little')
+		description = json.loads(fp.read(length).decode('utf-8'))
+	if description['source'] != source:
+		return None
+	data_start = (len(magic) + 8 + length + 15) // 16 * 16
+	columns = {}
+	for name, column in description['columns'].items():
+		shape = tuple(column['shape'])
+		if 0 in shape:
+			columns[name] = np.zeros(shape, dtype=np.dtype(column['dtype']))
+		else:
+			columns[name] = np.memmap(_store_path(path), dtype=np.dtype(column['dtype']), mode='r', offset=data_start + column['offset'], shape=shape)
+	return description['header'], description['chroms'], columns
+
+def _load_table(path):
+	source = _source_id(path)
+	stored = None
+	if os.path.isfile(_store_path(path)):
+		try:
+			stored = _read_store(path, source)
+		except (IOError, OSError, ValueError, KeyError):
+			stored = None
+	if stored is None:
+		stored = _parse(path)
+		try:
+			_write_store(path, source, *stored)
+		except (IOError, OSError):
+			pass		# Read-only folder: the table is used from memory
+	return VaTable(path, *stored)
+
+# Columns of a .va file
+def load(path):
+	return stage_cache.cached(path, 'va_table', _load_table)
@@ -23,6 +23,7 @@
 # $read_r			>	$9
 # $gff_file			>	${10}
 # $ann_file			>	${11}
+# $threads			>	${12}
 
 
 #Some initial parameters
@@ -31,6 +32,8 @@ exit_code=0					# Set 'exit_code' (flag variable) to 0
 my_mut=lin 					# my_mut takes the values 'lin' in this workflow and 'snp' in the snp workflow, for the execution of the graphic output module
 my_log_file=$1 				# Set location of log file
 project_name=$2
+threads=${12}				# Number of threads for the steps compatible with multithreading, default = 1
+[ -z "$threads" ] && threads=1
 
 #Define the folders in the easymap directory 
 f0=user_data
@@ -48,6 +51,7 @@ my_is=clean-ins.fa		 									#insertion sequence
 my_gs=gnm_ref_merged/genome.fa 									#genome sequence
 my_ix=genome_index 							
 my_ix2=insertion_index 						
+my_ix3=mini_genome_index
 my_gff=${10}													#Genome feature file
 my_ann=${11}													#Genome anotation file
 my_rrl=250 														#Regulatory region length
@@ -59,6 +63,14 @@ echo 'pid workflow '$$ >> $my_status_file
 
 #Save path to bowtie2-build and bowtie2 in variable BT2
 export location="$PWD" 
+source $location/workflows/stages.sh
+
+#Memory used by each samtools sort thread, from config/config
+sort_memory=`grep '^sort-memory-per-thread:' $location/config/config | cut -d':' -f2 | tr -d '[:space:]'`
+[ -z "$sort_memory" ] && sort_memory=768M
+
+# The Python scripts of the workflow are run by the stage runner, which keeps the genome and the variant files in memory
+stage_runner_start
 
 
 
@@ -70,9 +82,9 @@ export location="$PWD"
 #																																												 #
 ##################################################################################################################################################################################
 
-#Execute bowtie2-build on insertion and genome sequence 
-{
-	$location/bowtie2/bowtie2-build $f1/$my_is $f1/$my_ix2 1> $f2/bowtie2-build_ins_std1.txt 2> $f2/bowtie2-build_ins_std2.txt
+#Execute bowtie2-build on insertion and genome sequence (indexes are reused from the shared index cache if available)
+stage_skip bowtie2-build-insertion "$f1/$my_is" "$f1/$my_ix2.*.bt2" "" || {
+	run_python $location/workflows/index-cache.py -aligner bowtie2 -builder $location/bowtie2/bowtie2-build -threads $threads -in $f1/$my_is -out_prefix $f1/$my_ix2 -std1 $f2/bowtie2-build_ins_std1.txt -std2 $f2/bowtie2-build_ins_std2.txt 2>> $my_log_file
 	
 } || {
 	echo $(date "+%F > %T")': bowtie2-build on insertion sequence returned an error. See log files.' >> $my_log_file
@@ -80,10 +92,11 @@ export location="$PWD"
 	echo $exit_code
 	exit
 }
+stage_done
 echo $(date "+%F > %T")': bowtie2-build insertion index finished.' >> $my_log_file
 
-{
-	$location/bowtie2/bowtie2-build $f1/$my_gs $f1/$my_ix 1> $f2/bowtie2-build2_gnm_std1.txt 2> $f2/bowtie2-build2_gnm_std2.txt
+stage_skip bowtie2-build-genome "$f1/$my_gs" "$f1/$my_ix.*.bt2" "" || {
+	run_python $location/workflows/index-cache.py -aligner bowtie2 -builder $location/bowtie2/bowtie2-build -threads $threads -in $f1/$my_gs -out_prefix $f1/$my_ix -std1 $f2/bowtie2-build2_gnm_std1.txt -std2 $f2/bowtie2-build2_gnm_std2.txt 2>> $my_log_file
 	
 } || {
 	echo $(date "+%F > %T")': bowtie2-build on genome sequence returned an error. See log files.' >> $my_log_file
@@ -91,116 +104,67 @@ echo $(date "+%F > %T")': bowtie2-build insertion index finished.' >> $my_log_fi
 	echo $exit_code
 	exit
 }
+stage_done
 echo $(date "+%F > %T")': bowtie2-build genome index finished.' >> $my_log_file
 
 
-#Execute bowtie2 paired to align raw reads to insertion sequence
-if [ $my_mode == 'pe' ]
-then  
-	{
-		$location/bowtie2/bowtie2 -x $f1/$my_ix2 -1 $my_rf -2 $my_rr -S $f1/alignment1.sam 2> $f2/bowtie2_ins_std2.txt
-	
-	} || {
-		echo $(date "+%F > %T")': bowtie2 on the insertion sequence returned an error. See log files.' >> $my_log_file
-		exit_code=1
-		echo $exit_code
-		exit
-	}
-
-	echo $(date "+%F > %T")': bowtie2 paired finished.' >> $my_log_file
-fi
+#The read filters run as streaming stages between two alignments: the alignments of the reads to the insertion sequence are
+#piped into the filter (filter1.py or filter2.py), which writes the selected reads to the aligner of the genome. No SAM, BAM or
+#fastq file is written before the final alignments. The filters are run with python3 because they read their standard input.
+#The two aligners of a stage run at the same time, so they share the threads of the project: the alignment to the insertion reads all
+#the reads and gets the larger share, the alignment of the selected reads to the genome and its sort get the rest (at least one)
+ins_threads=$(( (threads + 1) / 2 ))
+gnm_threads=$(( threads / 2 ))
+[ $gnm_threads -lt 1 ] && gnm_threads=1
 
 #_______________________________________________________________________Paired-end reads processing___________________________________________________________________________________
 
 if [ $my_mode == 'pe' ]
 then  
-	#Execute filter1
-	{
-		python3 $location/scripts_ins/filter1.py -a $f1/alignment1.sam -b $f1/output_F1.fq 2>> $my_log_file
-		rm -f $f1/alignment1.sam
+	#Execute bowtie2 paired to align raw reads to insertion sequence, filter1 to select the unaligned reads with aligned mates
+	#and bowtie2 to align them to the genome sequence, sorting the alignments into an indexed BAM file
+	stage_skip genome-alignment "$my_rf $my_rr $f1/$my_ix2.*.bt2 $f1/$my_ix.*.bt2" "$f1/alignment2.bam $f1/alignment2.bam.bai" "" || {
+		$location/bowtie2/bowtie2 -p $ins_threads -x $f1/$my_ix2 -1 $my_rf -2 $my_rr 2> $f2/bowtie2_ins_std2.txt | python3 $location/scripts_ins/filter1.py -a - -b - 2>> $my_log_file | $location/bowtie2/bowtie2 -p $gnm_threads -x $f1/$my_ix -U - 2> $f2/bowtie2_gnm_std2.txt | $location/samtools1/samtools sort -@ $gnm_threads -m $sort_memory -T $f1/alignment2.sort -o $f1/alignment2.bam - 2> $f2/sam-to-bam_gnm_std2.txt
+		pipeline_ok ${PIPESTATUS[@]} && $location/samtools1/samtools index $f1/alignment2.bam 2>> $f2/sam-to-bam_gnm_std2.txt
 	
 	} || {
-		echo $(date "+%F > %T")': error: filter1.py' >> $my_log_file
+		echo  $(date "+%F > %T")': bowtie2 on the insertion sequence, filter1.py or bowtie2 on the genome sequence returned an error. See log files.' >> $my_log_file
 		exit_code=1
 		echo $exit_code
 		exit
 	}
-	echo $(date "+%F > %T")': First filter finished.' >> $my_log_file
-
-
-	#Execute bowtie2 to align filtered reads to genome sequence
-	{
-		$location/bowtie2/bowtie2 -x $f1/$my_ix -U $f1/output_F1.fq -S $f1/alignment2.sam 2> $f2/bowtie2_gnm_std2.txt
-	
-	} || {
-		echo  $(date "+%F > %T")': bowtie2 on the genome sequence returned an error. See log files.' >> $my_log_file
-		exit_code=1
-		echo $exit_code
-		exit
-	}
-	echo $(date "+%F > %T")': bowtie2 finished.' >> $my_log_file
-fi
+	stage_done
+	echo $(date "+%F > %T")': bowtie2 paired, first filter and bowtie2 finished.' >> $my_log_file
 
-
-if [ $my_mode == 'pe' ]
-then  
-	#Execute bowtie2 to make a local aligment of the reads with the insertion
-	{
-		$location/bowtie2/bowtie2 --local -x $f1/$my_ix2 -1 $my_rf -2 $my_rr -S $f1/alignment3.sam 2> $f2/bowtie2_local_ins_std2.txt
-	
-	} || {
-		echo $(date "+%F > %T")': bowtie2 local alignment to the insertion sequence returned an error. See log files.' >> $my_log_file
-		exit_code=1
-		echo $exit_code
-		exit
-	}
-	echo $(date "+%F > %T")': bowtie2 finished.' >> $my_log_file
+	#Reads of the local alignment to the insertion sequence
+	my_local_reads="-1 $my_rf -2 $my_rr"
+	my_local_inputs="$my_rf $my_rr"
 fi
 
-
 #_______________________________________________________________________Single-end reads processing___________________________________________________________________________________
 
 if [ $my_mode == 'se' ]
 then  	
-	#Execute bowtie2 to make a local aligment of the reads with the insertion
-	{
-		$location/bowtie2/bowtie2 --local -x $f1/$my_ix2 -U $my_rd -S $f1/alignment3.sam 2> $f2/bowtie2_local_ins_std2.txt
-	
-	} || {
-		echo $(date "+%F > %T")': bowtie2 local alignment to the insertion sequence returned an error. See log files.' >> $my_log_file
-		exit_code=1
-		echo $exit_code
-		exit
-	}
-	echo $(date "+%F > %T")': bowtie2 finished.' >> $my_log_file
+	#Reads of the local alignment to the insertion sequence
+	my_local_reads="-U $my_rd"
+	my_local_inputs="$my_rd"
 fi
 
 
-#Execute filter2
-{
-	python3 $location/scripts_ins/filter2.py -a $f1/alignment3.sam -b $f1/output_F2.fq 2>> $my_log_file
-	rm -f $f1/alignment3.sam
+#Execute bowtie2 to make a local aligment of the reads with the insertion, filter2 to select the locally aligned reads and
+#bowtie2 to align them to the genome sequence, sorting the alignments into an indexed BAM file
+stage_skip local-genome-alignment "$my_local_inputs $f1/$my_ix2.*.bt2 $f1/$my_ix.*.bt2" "$f1/alignment4.bam $f1/alignment4.bam.bai" "$my_mode" || {
+	$location/bowtie2/bowtie2 -p $ins_threads --local -x $f1/$my_ix2 $my_local_reads 2> $f2/bowtie2_local_ins_std2.txt | python3 $location/scripts_ins/filter2.py -a - -b - 2>> $my_log_file | $location/bowtie2/bowtie2 -p $gnm_threads --local -x $f1/$my_ix -U - 2> $f2/bowtie2_local_gnm_std2.txt | $location/samtools1/samtools sort -@ $gnm_threads -m $sort_memory -T $f1/alignment4.sort -o $f1/alignment4.bam - 2> $f2/sam-to-bam_local_gnm_std2.txt
+	pipeline_ok ${PIPESTATUS[@]} && $location/samtools1/samtools index $f1/alignment4.bam 2>> $f2/sam-to-bam_local_gnm_std2.txt
 
 } || {
-	echo $(date "+%F > %T")': error: filter2.py' >> $my_log_file
+	echo $(date "+%F > %T")': bowtie2 local alignment to the insertion sequence, filter2.py or bowtie2 local alignment to the genome sequence returned an error. See log files.' >> $my_log_file
 	exit_code=1
 	echo $exit_code
 	exit
 }
-echo $(date "+%F > %T")': Second filter finished.' >> $my_log_file
-
-
-#Execute bowtie2 to align filtered reads to genome sequence
-{
-	$location/bowtie2/bowtie2 --local -x $f1/$my_ix -U $f1/output_F2.fq -S $f1/alignment4.sam 2> $f2/bowtie2_local_gnm_std2.txt
-
-} || {
-	echo $(date "+%F > %T")': bowtie2 local alignment to the genome sequence returned an error. See log files.' >> $my_log_file
-	exit_code=1
-	echo $exit_code
-	exit
-}
-echo $(date "+%F > %T")': bowtie2 finished.' >> $my_log_file
+stage_done
+echo $(date "+%F > %T")': bowtie2 local, second filter and bowtie2 finished.' >> $my_log_file
 
 
 #_______________________________________________________________________Mapping analysis___________________________________________________________________________________
@@ -208,34 +172,37 @@ echo $(date "+%F > %T")': bowtie2 finished.' >> $my_log_file
 #Count read depth and find candidate region
 if [ $my_mode == 'pe' ]
 then  
-	{
-		python3 $location/scripts_ins/paired-analysis.py -a $f1/alignment2.sam -b $f1/output_analysis.txt -c $f1/$my_gs 2>> $my_log_file
-		rm -f $f1/alignment2.sam 
-
-	} || {
-		echo $(date "+%F > %T")': error: paired-analysis.py' >> $my_log_file
-		exit_code=1
-		echo $exit_code
-		exit
-	}
-	echo $(date "+%F > %T")': Paired reads analysis finished.' >> $my_log_file
-
-	{
-		python3 $location/scripts_ins/local-analysis.py -a $f1/alignment4.sam -b $f1/output_analysis.txt -c $f1/$my_gs -m $my_mode 2>> $my_log_file
-
-	} || {
-		echo $(date "+%F > %T")': error: local-analysis.py' >> $my_log_file
-		exit_code=1
-		echo $exit_code
-		exit
+	# Both analyses write output_analysis.txt (local-analysis.py appends to it), so they are a single stage
+	stage_skip read-analysis "$f1/alignment2.bam $f1/alignment4.bam $f1/$my_gs" "$f1/output_analysis.txt" "$my_mode" || {
+		{
+			run_python $location/scripts_ins/paired-analysis.py -a $f1/alignment2.bam -b $f1/output_analysis.txt -c $f1/$my_gs 2>> $my_log_file
+
+		} || {
+			echo $(date "+%F > %T")': error: paired-analysis.py' >> $my_log_file
+			exit_code=1
+			echo $exit_code
+			exit
+		}
+		echo $(date "+%F > %T")': Paired reads analysis finished.' >> $my_log_file
+
+		{
+			run_python $location/scripts_ins/local-analysis.py -a $f1/alignment4.bam -b $f1/output_analysis.txt -c $f1/$my_gs -m $my_mode 2>> $my_log_file
+
+		} || {
+			echo $(date "+%F > %T")': error: local-analysis.py' >> $my_log_file
+			exit_code=1
+			echo $exit_code
+			exit
+		}
 	}
+	stage_done && stage_release $f1/alignment2.bam $f1/alignment2.bam.bai
 
 fi	
 
 if [ $my_mode == 'se' ]
 then  
-	{
-		python3 $location/scripts_ins/local-analysis.py -a $f1/alignment4.sam -b $f1/output_analysis.txt -c $f1/$my_gs -m $my_mode 2>> $my_log_file
+	stage_skip read-analysis "$f1/alignment4.bam $f1/$my_gs" "$f1/output_analysis.txt" "$my_mode" || {
+		run_python $location/scripts_ins/local-analysis.py -a $f1/alignment4.bam -b $f1/output_analysis.txt -c $f1/$my_gs -m $my_mode 2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': error: local-analysis.py' >> $my_log_file
@@ -243,12 +210,13 @@ then
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': Local reads analysis finished.' >> $my_log_file
 fi
 
 #Sort insertions
-{
-	python3 $location/scripts_ins/sort.py -a $f1/output_analysis.txt -b $f1/$my_gs -c $f1/output_ordered.csv -d $f3/sorted_insertions.txt -m $my_mode 2>> $my_log_file
+stage_skip sort-insertions "$f1/output_analysis.txt $f1/$my_gs" "$f1/output_ordered.csv $f3/sorted_insertions.txt" "$my_mode" || {
+	run_python $location/scripts_ins/sort.py -a $f1/output_analysis.txt -b $f1/$my_gs -c $f1/output_ordered.csv -d $f3/sorted_insertions.txt -m $my_mode 2>> $my_log_file
 	
 } || {
 	echo $(date "+%F > %T")': error: sort.py' >> $my_log_file
@@ -256,12 +224,13 @@ fi
 	echo $exit_code
 	exit
 }
+stage_done
 echo $(date "+%F > %T")': Insertions sorted.' >> $my_log_file
 
 
 #ma-input.py
-{
-	python3 $location/scripts_ins/ins-to-varanalyzer.py -a $f3/sorted_insertions.txt -b $f1/ins-to-varanalyzer.txt 2>> $my_log_file
+stage_skip ins-to-varanalyzer "$f3/sorted_insertions.txt" "$f1/ins-to-varanalyzer.txt" "" || {
+	run_python $location/scripts_ins/ins-to-varanalyzer.py -a $f3/sorted_insertions.txt -b $f1/ins-to-varanalyzer.txt 2>> $my_log_file
 	
 } || {
 	echo $(date "+%F > %T")': error: ins-to-varanalyzer.py' >> $my_log_file
@@ -269,12 +238,13 @@ echo $(date "+%F > %T")': Insertions sorted.' >> $my_log_file
 	echo $exit_code
 	exit
 }
+stage_done
 echo $(date "+%F > %T")': ins-to-varanalyzer.py finished.' >> $my_log_file
 
 
 #varanalyzer
-{
-	python3 $location/varanalyzer/varanalyzer.py -itp lim -con $f1/$my_gs -gff $f0/$my_gff -var $f1/ins-to-varanalyzer.txt -rrl $my_rrl -pname $project_name -ann $f0/$my_ann -out $f1/varanalyzer_output.txt 2>> $my_log_file
+stage_skip varanalyzer "$f1/$my_gs $f0/$my_gff $f0/$my_ann $f1/ins-to-varanalyzer.txt" "$f1/varanalyzer_output.txt" "" || {
+	run_python $location/varanalyzer/varanalyzer.py -itp lim -con $f1/$my_gs -gff $f0/$my_gff -var $f1/ins-to-varanalyzer.txt -rrl $my_rrl -pname $project_name -ann $f0/$my_ann -out $f1/varanalyzer_output.txt 2>> $my_log_file
 	
 } || {
 	echo $(date "+%F > %T")': error: varanalyzer.py' >> $my_log_file
@@ -282,6 +252,7 @@ echo $(date "+%F > %T")': ins-to-varanalyzer.py finished.' >> $my_log_file
 	echo $exit_code
 	exit
 }
+stage_done
 echo $(date "+%F > %T")': varanalyzer.py finished.' >> $my_log_file
 
 
@@ -292,18 +263,19 @@ if [ $(wc -l < $f1/varanalyzer_output.txt) -gt 1 ]
 then 
 	#Run SAM-FQ
 
-	mkdir $f1/primers
+	mkdir -p $f1/primers
 
-	{
-		python3 $location/scripts_ins/ins-primers.py -sam_in $f1/alignment4.sam -var_in $f1/varanalyzer_output.txt -sam_out $f1/primers/ 2>> $my_log_file
-		rm -f $f1/alignment4.sam
+	stage_skip ins-primers "$f1/alignment4.bam $f1/varanalyzer_output.txt" "$f1/primers/*.fq" "" || {
+		run_python $location/scripts_ins/ins-primers.py -sam_in $f1/alignment4.bam -var_in $f1/varanalyzer_output.txt -sam_out $f1/primers/ 2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': error:ins-primers.py' >> $my_log_file
+		stage_fail
 		#exit_code=1
 		#echo $exit_code
 		#exit
 	}
+	stage_done && stage_release $f1/alignment4.bam $f1/alignment4.bam.bai
 
 	#Run alignment
 	primers_dir=$f1/primers
@@ -312,7 +284,7 @@ then
 		if [ -n "$i" ]
 		then
 			{
-				$location/bowtie2/bowtie2 --very-sensitive --mp 3,2 -x $f1/$my_ix2 -U $i -S ${i%.*}.sam 2>> $f2/bowtie2_primers_std2.txt
+				$location/bowtie2/bowtie2 -p $threads --very-sensitive --mp 3,2 -x $f1/$my_ix2 -U $i -S ${i%.*}.sam 2>> $f2/bowtie2_primers_std2.txt
 
 			} || {
 				echo $(date "+%F > %T")': error: Bowtie2 - primers' >> $my_log_file
@@ -328,14 +300,15 @@ then
 	#Consensus sequence generation
 	#Generation of a variable with the path were the SAM files of each insertion will be held
 	#Loop through all files in the directory and DO the SAM to BAM conversion and the genereation of consensus sequence from each insertion consensus file. 
-	{
+	rm -f $f1/all_insertions_cns.fq				#Consensus sequences are appended to this file, it can exist if the project was resumed
+	stage_skip primer-consensus "$f1/primers" "" "" || {
 		for i in $primers_dir/*.sam 
 		do
 			if test -f "$i" 
 		    then
 				#Check sams
 				{
-					sam_status=`python3 $location/scripts_ins/sam-file-check.py -a $i 2>> $my_log_file`
+					sam_status=`run_python $location/scripts_ins/sam-file-check.py -a $i 2>> $my_log_file`
 					
 					if [ $sam_status == 0 ]; then : 
 				
@@ -356,9 +329,9 @@ then
 			    #SAM to BAM
 			    substring=${i%.*}
 			    #Check whether the number of lines that are not starting with @ to be > 0, if it is, do the rest: we might have a program to do this
-				$location/samtools1/samtools sort $i  > $substring.bam 2> $f2/samtools-sort.log
+				$location/samtools1/samtools sort -@ $threads $i  > $substring.bam 2> $f2/samtools-sort.log
 				
-				$location/samtools1/samtools mpileup -uf $f1/$my_is $substring.bam 2> $f2/samtools-consensus.log | $location/bcftools-1.3.1/bcftools call -c  2> $f2/samtools-consensus.log | $location/bcftools-1.3.1/misc/vcfutils.pl vcf2fq > $f1/cns.fq 2> $f2/samtools-consensus.log
+				$location/samtools1/samtools mpileup -uf $f1/$my_is $substring.bam 2> $f2/samtools-consensus.log | $location/bcftools-1.3.1/bcftools call --threads $threads -c  2> $f2/samtools-consensus.log | $location/bcftools-1.3.1/misc/vcfutils.pl vcf2fq > $f1/cns.fq 2> $f2/samtools-consensus.log
 				
 				#sed -i "s/pbinprok2/$substring/g" ./cns.fq
 				tail -n +2 $f1/cns.fq > $f1/cns.fq.temp && mv $f1/cns.fq.temp $f1/cns.fq
@@ -370,10 +343,12 @@ then
 		done
 	}||{
 		echo $(date "+%F > %T")': Error. The consensus sequence of an insertion flank could not be created.' >> $my_log_file
+		stage_fail
 		#exit_code=1
 		#echo $exit_code
 		#exit
 	}
+	stage_done
 
 fi
 
@@ -383,16 +358,18 @@ rm -f $location/temp
 rm -f ./user_data/*.fai
 
 #Primer generation script
-{
-	python3 $location/primers/primer-generation.py -file $f1/varanalyzer_output.txt -fasta $f1/$my_gs -fq $f1/all_insertions_cns.fq  -out $f3/insertions_output.txt -mode $(wc -l < $f1/varanalyzer_output.txt) 2>> $my_log_file
+stage_skip primer-generation "$f1/varanalyzer_output.txt $f1/all_insertions_cns.fq $f1/$my_gs" "" "" || {
+	run_python $location/primers/primer-generation.py -file $f1/varanalyzer_output.txt -fasta $f1/$my_gs -fq $f1/all_insertions_cns.fq  -out $f3/insertions_output.txt -mode $(wc -l < $f1/varanalyzer_output.txt) 2>> $my_log_file
 }|| {
 	echo $(date "+%F > %T")': Error. primer-generation.py failed, proceeding to bypass module.' >> $my_log_file
-        python3 $location/primers/primer-bypass.py  -input  $f1/varanalyzer_output.txt  -out $f3/insertions_output.txt
+	stage_fail
+        run_python $location/primers/primer-bypass.py  -input  $f1/varanalyzer_output.txt  -out $f3/insertions_output.txt
 	
 	#exit_code=1
 	#echo $exit_code
 	#exit
 }
+stage_done
 echo $(date "+%F > %T")': Primer-generation.py module finished.' >> $my_log_file
 
 
@@ -400,15 +377,17 @@ if [ $(wc -l < $f1/varanalyzer_output.txt) -gt 1 ]
 then 
 
 	# Extend Ins info (adds flanking sequences)
-	{
-		python3 $location/scripts_ins/extend-ins-info.py --project-name $project_name 2>> $my_log_file
+	stage_skip extend-ins-info "$f1/varanalyzer_output.txt" "" "" || {
+		run_python $location/scripts_ins/extend-ins-info.py --project-name $project_name 2>> $my_log_file
 	}|| {
 		echo $(date "+%F > %T")': Error. extend-ins-info.py failed. ' >> $my_log_file
-	        python3 $location/primers/primer-bypass.py  -input  $f1/varanalyzer_output.txt  -out $f3/insertions_output.txt
+		stage_fail
+	        run_python $location/primers/primer-bypass.py  -input  $f1/varanalyzer_output.txt  -out $f3/insertions_output.txt
 		#exit_code=1
 		#echo $exit_code
 		#exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': extend-ins-info.py module finished.' >> $my_log_file
 
 fi
@@ -422,8 +401,8 @@ fi
 # for tests: python3 ./graphic_output/graphic-output.py -my_mut lin -m pe -a ./user_projects/project/3_workflow_output/sorted_insertions.txt -b ./user_projects/project/1_intermediate_files/gnm_ref_merged/genome.fa -rrl 100  -iva ./user_projects/project/1_intermediate_files/varanalyzer_output.txt -gff ./user_data/complete.gff -pname user_projects/project  -ins_pos ./user_projects/project/1_intermediate_files/ins-to-varanalyzer.txt
 
 #Graphic output
-{
-	python3 $location/graphic_output/graphic-output.py -my_mut $my_mut -a $f3/sorted_insertions.txt -b $f1/$my_gs -m $my_mode	-gff $f0/$my_gff  -iva $f1/varanalyzer_output.txt -rrl $my_rrl -pname $project_name -ins_pos $f1/ins-to-varanalyzer.txt 2>> $my_log_file
+stage_skip graphic-output "$f3/sorted_insertions.txt $f1/varanalyzer_output.txt $f1/$my_gs" "" "" || {
+	run_python $location/graphic_output/graphic-output.py -my_mut $my_mut -a $f3/sorted_insertions.txt -b $f1/$my_gs -m $my_mode	-gff $f0/$my_gff  -iva $f1/varanalyzer_output.txt -rrl $my_rrl -pname $project_name -ins_pos $f1/ins-to-varanalyzer.txt 2>> $my_log_file
 	
 } || {
 	echo $(date "+%F > %T")': error:graphic-output.py' >> $my_log_file
@@ -431,12 +410,13 @@ fi
 	echo $exit_code
 	exit
 }
+stage_done
 echo $(date "+%F > %T")': Graphic output created.' >> $my_log_file
 
 #Depth Alignment Graph
 # (1) We create a reduced version of the genome and index it with bowtie-build
 
-{
+stage_skip mini-genome-index "$f1/$my_gs" "$f1/genome_mini.fa $f1/$my_ix3.*.bt2" "" || {
 	head -10000 $f1/$my_gs > $f1/genome_mini.fa 
 	$location/bowtie2/bowtie2-build $f1/genome_mini.fa $f1/$my_ix3 1> $f2/bowtie2-build_mini-gnm_std1.txt 2> $f2/bowtie2-build_mini-genome_std2.txt
 	
@@ -446,57 +426,30 @@ echo $(date "+%F > %T")': Graphic output created.' >> $my_log_file
 	echo $exit_code
 	exit
 }
+stage_done
 echo $(date "+%F > %T")': bowtie2-build insertion index finished.' >> $my_log_file
 
-# (2) We align all the reads to the mini-genome
-if [ $my_mode == 'pe' ]
-then  
-	{
-		$location/bowtie2/bowtie2 -x $f1/$my_ix3 -1 $my_rf -2 $my_rr -S $f1/alignment5.sam 2> $f2/bowtie2_mini-gnm_std2.txt
-	
-	} || {
-		echo $(date "+%F > %T")': bowtie2 returned an error. See log files.' >> $my_log_file
-		exit_code=1
-		echo $exit_code
-		exit
-	}
-
-	echo $(date "+%F > %T")': bowtie2 paired finished.' >> $my_log_file
-fi
-
-if [ $my_mode == 'se' ] 
-then
-	{
-		$location/bowtie2/bowtie2 --very-sensitive --mp 3,2 -x $f1/$my_ix3 -U $my_rd -S $f1/alignment5.sam 2> $f2/bowtie2_mini-gnm_std2.txt
-	
-	} || {
-		echo $(date "+%F > %T")': bowtie2 returned an error. See log files.' >> $my_log_file
-		exit_code=1
-		echo $exit_code
-		exit
-	}
+# (2) We align all the reads to the mini-genome, sorting the alignments into an indexed BAM file
+if [ $my_mode == 'pe' ]; then bowtie2_reads="-1 $my_rf -2 $my_rr"; fi
+if [ $my_mode == 'se' ]; then bowtie2_reads="--very-sensitive --mp 3,2 -U $my_rd"; fi
 
-	echo $(date "+%F > %T")': bowtie2 unpaired finished.' >> $my_log_file
-fi
-
-# (3) SAM to BAM 
-{
-	$location/samtools1/samtools sort $f1/alignment5.sam  > $f1/alignment5.bam 2> $f2/samtools-sort.log
-	rm -f $f1/alignment5.sam
+stage_skip mini-genome-alignment "$my_rd $my_rf $my_rr $f1/$my_ix3.*.bt2" "$f1/alignment5.bam $f1/alignment5.bam.bai" "$bowtie2_reads" || {
+	$location/bowtie2/bowtie2 -p $threads -x $f1/$my_ix3 $bowtie2_reads 2> $f2/bowtie2_mini-gnm_std2.txt | $location/samtools1/samtools sort -@ $threads -m $sort_memory -T $f1/alignment5.sort -o $f1/alignment5.bam - 2> $f2/samtools-sort.log
+	pipeline_ok ${PIPESTATUS[@]} && $location/samtools1/samtools index $f1/alignment5.bam 2>> $f2/samtools-sort.log
 
 } || {
-	echo $(date "+%F > %T")': samtools sort returned an error. See log files.' >> $my_log_file
+	echo $(date "+%F > %T")': bowtie2 returned an error. See log files.' >> $my_log_file
 	exit_code=1
 	echo $exit_code
 	exit
 }
+stage_done
+echo $(date "+%F > %T")': bowtie2 alignment to the mini-genome finished.' >> $my_log_file
 
 
-# (4) depth_measures_generation.py
-{
-	python3 $location/scripts_snp/depth_measures_generation.py -genome $f1/genome_mini.fa -bam $f1/alignment5.bam -out $f1/coverage_alignment1.txt 2>> $my_log_file
-	rm -f $f1/alignment5.bam
-	rm -f $f1/alignment5.bai
+# (3) depth_measures_generation.py
+stage_skip depth-coverage_alignment1 "$f1/alignment5.bam $f1/genome_mini.fa" "$f1/coverage_alignment1.txt" "" || {
+	run_python $location/scripts_snp/depth_measures_generation.py -genome $f1/genome_mini.fa -threads $threads -bam $f1/alignment5.bam -out $f1/coverage_alignment1.txt 2>> $my_log_file
 
 } || {
 	echo $(date "+%F > %T")': Error during obtaining of alignment depth .' >> $my_log_file
@@ -504,18 +457,21 @@ fi
 	echo $exit_code
 	exit
 }
+stage_done && stage_release $f1/alignment5.bam $f1/alignment5.bam.bai
 
-# (5) graphic-alignment.py
-{
-	av_rd=`python3 $location/graphic_output/graphic-alignment.py -coverages $f1/coverage_alignment1.txt   -out $f3/frequence_depth_alignment_distribution_sample.png 2>> $my_log_file `
+# (4) graphic-alignment.py
+stage_skip graphic-alignment-coverage_alignment1 "$f1/coverage_alignment1.txt" "" "" || {
+	av_rd=`run_python $location/graphic_output/graphic-alignment.py -coverages $f1/coverage_alignment1.txt   -out $f3/frequence_depth_alignment_distribution_sample.png 2>> $my_log_file `
 
 } || {
 	echo $(date "+%F > %T")': Error during Graphic_alignment execution in sample alignment.' >> $my_log_file
+	stage_fail
 	av_rd=10
 	#exit_code=1
 	#echo $exit_code
 	#exit
 }
+stage_done
 
 
 #Report generation
@@ -527,8 +483,8 @@ fi
 	echo $(date "+%F > %T")': Error during zip compression of report images. Please check that the zip program is installed in your system. Continuing anyway.' >> $my_log_file
 }
 
-{
-	python3 $location/graphic_output/report.py -variants $f3/insertions_output.txt -log $my_log_file -output_html $f3/report.html -project $project_name  -mut_type lin -files_dir $f3 2>> $my_log_file
+stage_skip report "$f3/insertions_output.txt" "" "" || {
+	run_python $location/graphic_output/report.py -variants $f3/insertions_output.txt -log $my_log_file -output_html $f3/report.html -project $project_name  -mut_type lin -files_dir $f3 2>> $my_log_file
 
 } || {
 	echo $(date "+%F > %T")': error:report.py' >> $my_log_file
@@ -536,6 +492,7 @@ fi
 	echo $exit_code
 	exit
 }
+stage_done
 echo $(date "+%F > %T")': Report file created.' >> $my_log_file
 
 #Cleanup
@@ -32,6 +32,7 @@
 # snp_analysis_type [par/f2wt]			>	${18}
 # lib_type_control						>	${19}
 # stringency							>	${20}
+# threads								>	${21}
 
 
 # Some initial parameters
@@ -39,6 +40,7 @@ start_time=`date +%s`
 exit_code=0 				# Set 'exit_code' (flag variable) to 0
 my_log_file=$1 				# Set location of log file
 export location="$PWD" 			#Save path to hisat2-build and hisat2 in variable BT2
+source $location/workflows/stages.sh
 
 # Create input variables
 my_log_file=$1
@@ -65,16 +67,21 @@ snp_analysis_type=${18}
 stringency=${20}
 
 #Set number of maximum CPU for steps compatible with multithreading, default = 1 
-threads=1
+threads=${21}
+[ -z "$threads" ] && threads=1
+
+#Memory used by each samtools sort thread, from config/config
+sort_memory=`grep '^sort-memory-per-thread:' $location/config/config | cut -d':' -f2 | tr -d '[:space:]'`
+[ -z "$sort_memory" ] && sort_memory=768M
 
 # Set internal variables according to the SNP validation stringency chosen by the user
 if [ $stringency == high_stringency ]; then
 	#problemSample_bowtie_mp="--mp 6,2"
-	problemSample_mpileup_C="-C50"
+	problemSample_mpileup_C="50"
 	problemSample_snpQualityTheshold="120"
 else
 	#problemSample_bowtie_mp="--mp 3,2"
-	problemSample_mpileup_C=""
+	problemSample_mpileup_C="0"
 	problemSample_snpQualityTheshold="30"
 fi
 
@@ -88,13 +95,17 @@ f3=$project_name/3_workflow_output
 my_status_file=$f2/status
 echo 'pid workflow '$$ >> $my_status_file
 
+# The Python scripts of the workflow are run by the stage runner, which keeps the genome and the variant files in memory
+stage_runner_start
+
 #Check genome size to set interval_width
-{
-	interval_width=`python3 $location/scripts_snp/set-interval.py -a $f1/$my_gs`
+stage_skip set-interval "$f1/$my_gs" "" "" || {
+	interval_width=`run_python $location/scripts_snp/set-interval.py -a $f1/$my_gs`
 } || {
 	interval_width=4000001
 	echo $(date "+%F > %T")': set-interval.py failed.' >> $my_log_file
 }
+stage_done
 echo $(date "+%F > %T")': set-interval.py finished, interval set at: '$interval_width   >> $my_log_file
 
 
@@ -106,9 +117,9 @@ echo $(date "+%F > %T")': set-interval.py finished, interval set at: '$interval_
 #																																												 #
 ##################################################################################################################################################################################
 
-#Run hisat2-build on genome sequence 
-{
-	$location/hisat2/hisat2-build $f1/$my_gs $f1/$my_ix 1> $f2/hisat2-build_std1.txt 2> $f2/hisat2-build_std2.txt
+#Run hisat2-build on genome sequence (the index is reused from the shared index cache if available)
+stage_skip hisat2-build "$f1/$my_gs" "$f1/$my_ix.*.ht2" "" || {
+	run_python $location/workflows/index-cache.py -aligner hisat2 -builder $location/hisat2/hisat2-build -threads $threads -in $f1/$my_gs -out_prefix $f1/$my_ix -std1 $f2/hisat2-build_std1.txt -std2 $f2/hisat2-build_std2.txt 2>> $my_log_file
 
 } || {
 	echo $(date "+%F > %T")': hisat2-build on genome sequence returned an error. See log files.' >> $my_log_file
@@ -116,85 +127,78 @@ echo $(date "+%F > %T")': set-interval.py finished, interval set at: '$interval_
 	echo $exit_code
 	exit
 }
+stage_done
 echo $(date "+%F > %T")': hisat2-build finished.' >> $my_log_file
 
-function get_problem_va {  
-	if [ $my_sample_mode == se ] 
-	then
-		#Run hisat2 unpaired to align raw F2 reads to genome 
-		{
-			$location/hisat2/hisat2 -p $threads -x $f1/$my_ix -U $my_rd -S $f1/alignment1.sam 2> $f2/hisat2_problem-sample_std2.txt
-
-		} || {
-			echo $(date "+%F > %T")': hisat2 returned an error during the aligment of F2 reads. See log files.' >> $my_log_file
-			exit_code=1
-			echo $exit_code
-			exit
-		}
-		echo $(date "+%F > %T")': hisat2 finished the alignment of F2 reads to genome.' >> $my_log_file
-	fi
+#Index genome sequence for variant calling. This is done before the samples are processed because both can be processed at the same time
+stage_skip faidx "$f1/$my_gs" "$f1/$my_gs.fai" "" || {
+	$location/samtools1/samtools faidx $f1/$my_gs 2> $f2/faidx_std2.txt
 
-	if [ $my_sample_mode == pe ] 
-	then
-		#Run hisat2 paired to align raw F2 reads to genome 
-		{
-			$location/hisat2/hisat2  -p $threads  -x $f1/$my_ix -1 $my_rf -2 $my_rr -S $f1/alignment1.sam 2> $f2/hisat2_problem-sample_std2.txt
+} || {
+	echo $(date "+%F > %T")': samtools faidx on genome sequence returned an error. See log files.' >> $my_log_file
+	exit_code=1
+	echo $exit_code
+	exit
+}
+stage_done
+echo $(date "+%F > %T")': Genome sequence indexing finished.' >> $my_log_file
 
-		} || {
-			echo $(date "+%F > %T")': hisat2 returned an error during the aligment of F2 reads. See log files.' >> $my_log_file
-			exit_code=1
-			echo $exit_code
-			exit
-		}
-		echo $(date "+%F > %T")': hisat2 finished the alignment of F2 reads to genome.' >> $my_log_file
-	fi
+function get_problem_va {  
+	if [ $my_sample_mode == se ]; then hisat2_reads="-U $my_rd"; fi
+	if [ $my_sample_mode == pe ]; then hisat2_reads="-1 $my_rf -2 $my_rr"; fi
 
-	#SAM to BAM
-	{
-		$location/samtools1/samtools sort  -@ $threads  $f1/alignment1.sam > $f1/alignment1.bam 2> $f2/sam-to-bam_problem-sample_std2.txt
-		rm -rf ./user_projects/$project_name/1_intermediate_files/alignment1.sam
+	#Run hisat2 to align raw F2 reads to genome. The alignments are sorted into an indexed BAM file as they are produced, no SAM file is written
+	stage_skip problem-alignment "$my_rd $my_rf $my_rr $f1/$my_ix.*.ht2" "$f1/alignment1.bam $f1/alignment1.bam.bai" "$hisat2_reads" || {
+		$location/hisat2/hisat2 -p $threads -x $f1/$my_ix $hisat2_reads 2> $f2/hisat2_problem-sample_std2.txt | $location/samtools1/samtools sort -@ $threads -m $sort_memory -T $f1/alignment1.sort -o $f1/alignment1.bam - 2> $f2/sam-to-bam_problem-sample_std2.txt
+		pipeline_ok ${PIPESTATUS[@]} && $location/samtools1/samtools index $f1/alignment1.bam 2>> $f2/sam-to-bam_problem-sample_std2.txt
 
 	} || {
-		echo 'Error transforming SAM to BAM.' >> $my_log_file
+		echo $(date "+%F > %T")': hisat2 returned an error during the aligment of F2 reads. See log files.' >> $my_log_file
 		exit_code=1
 		echo $exit_code
-		exit
+		exit $exit_code
 	}
-	echo $(date "+%F > %T")': SAM to BAM finished.' >> $my_log_file
+	stage_done
+	echo $(date "+%F > %T")': hisat2 finished the alignment of F2 reads to genome, sorted BAM file created.' >> $my_log_file
 
-	#Variant calling
-	{
+	#Variant calling: samtools mpileup | bcftools call, run in regions of the genome at the same time and merged in genome order
+	stage_skip problem-variant-calling "$f1/alignment1.bam $f1/$my_gs" "$f1/raw_variants.vcf.gz" "$problemSample_mpileup_C" || {
 
-		$location/samtools1/samtools mpileup  -t DP,ADF,ADR $problemSample_mpileup_C -uf $f1/$my_gs $f1/alignment1.bam 2> $f2/mpileup_problem-sample_std.txt | $location/bcftools-1.3.1/bcftools call -mv -Ov > $f1/raw_variants.vcf 2> $f2/call_problem-sample_std.txt
+		run_python $location/scripts_snp/sharded-calling.py -bam $f1/alignment1.bam -fasta $f1/$my_gs -out $f1/raw_variants.vcf.gz -threads $threads -adjust_mq $problemSample_mpileup_C -log $f2/mpileup_problem-sample_std.txt 2>> $my_log_file
 		# -B: Disables probabilistic realignment for the computation of base alignment quality (BAQ). Applying this argument reduces the number of false negatives during the variant calling
 		# -t DP,ADF,ADR: output VCF file contains the specified optional columns: read depth (DP), allelic depths on the forward strand (ADF), allelic depths on the reverse strand (ADR)
 		# -uf: uncompressed vcf output / fasta imput genome file
 		# -mv: include only polymorphic sites in output
-		# -Ov: uncompressed VCF output file 
-		# -C50: reduce the effect of reads with excessive mismatches. This aims to fix overestimated mapping quality
+		# -Oz: VCF output compressed with bgzip (the output name ends with .gz), read as it is by vcf-groomer.py
+		# -C50 (-adjust_mq 50): reduce the effect of reads with excessive mismatches. This aims to fix overestimated mapping quality
 
 	} || {
 		echo $(date "+%F > %T")': Error during variant-calling of F2 data.' >> $my_log_file
 		exit_code=1
 		echo $exit_code
-		exit
+		exit $exit_code
 	}
+	stage_done
 	echo $(date "+%F > %T")': F2 data variant calling finished.' >> $my_log_file
 
 	#Groom vcf
-	{
-		python3 $location/scripts_snp/vcf-groomer.py -a $f1/raw_variants.vcf -b $f1/F2_raw.va  2>> $my_log_file
+	stage_skip problem-vcf-groomer "$f1/raw_variants.vcf.gz" "$f1/F2_raw.va" "" || {
+		run_python $location/scripts_snp/vcf-groomer.py -a $f1/raw_variants.vcf.gz -b $f1/F2_raw.va  2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': Error during execution of vcf-groomer.py with F2 data.' >> $my_log_file
 		exit_code=1
 		echo $exit_code
-		exit
+		exit $exit_code
 	}
+	stage_done
 	echo $(date "+%F > %T")': VCF grooming of F2 data finished.' >> $my_log_file
 
+	#Intermediate files cleanup, once the VCF file has been groomed
+	stage_release $f1/raw_variants.vcf.gz
+
 	#RD graphics
-	depth_alignment $f1/alignment1.bam $f3/frequence_depth_alignment_distribution_sample.png
+	depth_alignment $f1/alignment1.bam $f3/frequence_depth_alignment_distribution_sample.png $f1/coverage_alignment1.txt
 
 	#Run vcf filter
 	if [ $my_cross == bc ]; then mut_type=EMS ; fi
@@ -207,21 +211,17 @@ function get_problem_va {
 	if [ $dp_max -le 40 ]; then dp_max=100 ; fi
 
 
-	{
-		python3 $location/scripts_snp/variants-filter.py -a $f1/F2_raw.va -b $f1/F2_filtered.va -step 3 -fasta $f1/$my_gs -dp_min $dp_min -dp_max $dp_max -qual_min $problemSample_snpQualityTheshold -mut_type $mut_type  2>> $my_log_file
+	stage_skip problem-variants-filter "$f1/F2_raw.va $f1/$my_gs" "$f1/F2_filtered.va" "$dp_min $dp_max $problemSample_snpQualityTheshold $mut_type" || {
+		run_python $location/scripts_snp/variants-filter.py -a $f1/F2_raw.va -b $f1/F2_filtered.va -step 3 -fasta $f1/$my_gs -dp_min $dp_min -dp_max $dp_max -qual_min $problemSample_snpQualityTheshold -mut_type $mut_type  2>> $my_log_file
 
 	} || {
 		echo 'Error during execution of variants-filter.py with F2 data.' >> $my_log_file
 		exit_code=1
 		echo $exit_code
-		exit
+		exit $exit_code
 	}
+	stage_done
 	echo $(date "+%F > %T")': First VCF filtering step of F2 data finished.' >> $my_log_file
-
-	#Intermediate files cleanup
-	rm -f $f1/*.sam
-	rm -f $f1/*.vcf
-
 }
 
 
@@ -234,77 +234,55 @@ function get_problem_va {
 ##################################################################################################################################################################################
 
 function get_control_va { 
-	if [ $my_control_mode == se ] 
-	then
-		#Run hisat2 unpaired to align raw F2 reads to genome 
-		{
-			$location/hisat2/hisat2  -p $threads  -x $f1/$my_ix -U $my_p_rd -S $f1/alignment1P.sam 2> $f2/hisat2_control-sample_std2.txt
-
-		} || {
-			echo $(date "+%F > %T")': hisat2 returned an error during the aligment of control reads. See log files.' >> $my_log_file
-			exit_code=1
-			echo $exit_code
-			exit
-		}
-		echo $(date "+%F > %T")': hisat2 finished the alignment of control reads to genome.' >> $my_log_file
-	fi
-
-	if [ $my_control_mode == pe ] 
-	then
-		#Run hisat2 paired to align raw F2 reads to genome 
-		{
-			$location/hisat2/hisat2  -p $threads  -x $f1/$my_ix -1 $my_p_rf -2 $my_p_rr -S $f1/alignment1P.sam 2> $f2/hisat2_control-sample_std2.txt
-
-		} || {
-			echo $(date "+%F > %T")': hisat2 returned an error during the aligment of control reads. See log files.' >> $my_log_file
-			exit_code=1
-			echo $exit_code
-			exit
-		}
-		echo $(date "+%F > %T")': hisat2 finished the alignment of control reads to genome.' >> $my_log_file
-	fi
-
-	#SAM to BAM
-	{
-		$location/samtools1/samtools sort  -@ $threads $f1/alignment1P.sam > $f1/alignment1P.bam 2> $f2/sam-to-bam_control-sample_std2.txt
+	if [ $my_control_mode == se ]; then hisat2_reads="-U $my_p_rd"; fi
+	if [ $my_control_mode == pe ]; then hisat2_reads="-1 $my_p_rf -2 $my_p_rr"; fi
 
-		rm -rf ./user_projects/$project_name/1_intermediate_files/alignment1P.sam
+	#Run hisat2 to align raw control reads to genome. The alignments are sorted into an indexed BAM file as they are produced, no SAM file is written
+	stage_skip control-alignment "$my_p_rd $my_p_rf $my_p_rr $f1/$my_ix.*.ht2" "$f1/alignment1P.bam $f1/alignment1P.bam.bai" "$hisat2_reads" || {
+		$location/hisat2/hisat2 -p $threads -x $f1/$my_ix $hisat2_reads 2> $f2/hisat2_control-sample_std2.txt | $location/samtools1/samtools sort -@ $threads -m $sort_memory -T $f1/alignment1P.sort -o $f1/alignment1P.bam - 2> $f2/sam-to-bam_control-sample_std2.txt
+		pipeline_ok ${PIPESTATUS[@]} && $location/samtools1/samtools index $f1/alignment1P.bam 2>> $f2/sam-to-bam_control-sample_std2.txt
 
 	} || {
-		echo $(date "+%F > %T")': Error transforming SAM to BAM' >> $my_log_file
+		echo $(date "+%F > %T")': hisat2 returned an error during the aligment of control reads. See log files.' >> $my_log_file
 		exit_code=1
 		echo $exit_code
-		exit
+		exit $exit_code
 	}
-	echo $(date "+%F > %T")': SAM to BAM finished' >> $my_log_file
+	stage_done
+	echo $(date "+%F > %T")': hisat2 finished the alignment of control reads to genome, sorted BAM file created.' >> $my_log_file
 
-	#Variant calling
-	{
+	#Variant calling: samtools mpileup | bcftools call, run in regions of the genome at the same time and merged in genome order
+	stage_skip control-variant-calling "$f1/alignment1P.bam $f1/$my_gs" "$f1/raw_p_variants.vcf.gz" "" || {
 
-		$location/samtools1/samtools mpileup  -t DP,ADF,ADR  -uf $f1/$my_gs $f1/alignment1P.bam 2> $f2/mpileup_control-sample_std.txt | $location/bcftools-1.3.1/bcftools call -mv -Ov > $f1/raw_p_variants.vcf 2> $f2/call_control-sample_std.txt
+		run_python $location/scripts_snp/sharded-calling.py -bam $f1/alignment1P.bam -fasta $f1/$my_gs -out $f1/raw_p_variants.vcf.gz -threads $threads -log $f2/mpileup_control-sample_std.txt 2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': Error during variant-calling of control data' >> $my_log_file
 		exit_code=1
 		echo $exit_code
-		exit
+		exit $exit_code
 	}
+	stage_done
 	echo $(date "+%F > %T")': Control data variant calling finished' >> $my_log_file
 
 	#Groom vcf
-	{
-		python3 $location/scripts_snp/vcf-groomer.py -a $f1/raw_p_variants.vcf -b $f1/control_raw.va  2>> $my_log_file
+	stage_skip control-vcf-groomer "$f1/raw_p_variants.vcf.gz" "$f1/control_raw.va" "" || {
+		run_python $location/scripts_snp/vcf-groomer.py -a $f1/raw_p_variants.vcf.gz -b $f1/control_raw.va  2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': Error during execution of vcf-groomer.py with control data.' >> $my_log_file
 		exit_code=1
 		echo $exit_code
-		exit
+		exit $exit_code
 	}
+	stage_done
 	echo $(date "+%F > %T")': VCF grooming of control data finished.' >> $my_log_file
 
+	#Intermediate files cleanup, once the VCF file has been groomed
+	stage_release $f1/raw_p_variants.vcf.gz
+
 	#RD graphics
-	depth_alignment $f1/alignment1P.bam $f3/frequence_depth_alignment_distribution_control.png
+	depth_alignment $f1/alignment1P.bam $f3/frequence_depth_alignment_distribution_control.png $f1/coverage_alignment1P.txt
 
 	#Run vcf filter
 
@@ -314,20 +292,29 @@ function get_control_va {
 	dp_max=$(($av_rd * 3))
 	if [ $dp_max -le 40 ]; then dp_max=100 ; fi
 
-	{
-		python3 $location/scripts_snp/variants-filter.py -a $f1/control_raw.va -b $f1/control_filtered.va -step 3 -fasta $f1/$my_gs -dp_min 10 -dp_max $dp_max -qual_min 20  2>> $my_log_file
+	# The cases that use only part of the control variants get them (control_filtered2.va) in the same pass:
+	# f2wt control, SNPs with FA < 0.5; wt parental control in outcross (case 4), SNPs with FA > 0.75
+	control_af_filter=""
+	if [ $my_cross == bc ] && [ $snp_analysis_type == f2wt ]; then control_af_filter="af_max=0.5"; fi
+	if [ $my_mutbackgroud == ref ] && [ $my_pseq == nomut ] && [ $my_cross == oc ] && [ $snp_analysis_type == par ]; then control_af_filter="af_min=0.75"; fi
+	control_filter_outputs="$f1/control_filtered.va"
+	control_filter_also=""
+	if [ -n "$control_af_filter" ]; then
+		control_filter_outputs="$f1/control_filtered.va $f1/control_filtered2.va"
+		control_filter_also="-also $f1/control_filtered2.va $control_af_filter"
+	fi
+
+	stage_skip control-variants-filter "$f1/control_raw.va $f1/$my_gs" "$control_filter_outputs" "$dp_max $control_af_filter" || {
+		run_python $location/scripts_snp/variants-filter.py -a $f1/control_raw.va -b $f1/control_filtered.va -step 3 -fasta $f1/$my_gs -dp_min 10 -dp_max $dp_max -qual_min 20 $control_filter_also  2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': Error during execution of variants-filter.py with control data.' >> $my_log_file
 		exit_code=1
 		echo $exit_code
-		exit
+		exit $exit_code
 	}
+	stage_done
 	echo $(date "+%F > %T")': First VCF filtering step of control data finished.' >> $my_log_file
-
-	#Intermediate files cleanup
-	rm -f $f1/*.sam
-	rm -f $f1/*.vcf
 }
 
 
@@ -339,28 +326,55 @@ function get_control_va {
 #																																												 #
 ##################################################################################################################################################################################
 
+# Arguments: BAM file, output image, coverage file
 function depth_alignment {
-	{
-		python3 $location/scripts_snp/depth_measures_generation.py -genome $f1/$my_gs -bam $1 -out $f1/coverage_alignment1.txt  2>> $my_log_file
-		rm -rf ./user_projects/$project_name/1_intermediate_files/alignment1.bam
+	stage_skip depth-$(basename $3 .txt) "$1 $f1/$my_gs" "$3" "" || {
+		run_python $location/scripts_snp/depth_measures_generation.py -genome $f1/$my_gs -threads $threads -bam $1 -out $3  2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': Error during obtaining of alignment depth .' >> $my_log_file
+		stage_fail
 		#exit_code=1
 		#echo $exit_code
 		#exit
 	}
+	stage_done
 
-	{
-		av_rd=`python3 $location/graphic_output/graphic-alignment.py -coverages $f1/coverage_alignment1.txt   -out $2  2>> $my_log_file `
+	stage_skip graphic-alignment-$(basename $3 .txt) "$3" "" "" || {
+		av_rd=`run_python $location/graphic_output/graphic-alignment.py -coverages $3   -out $2  2>> $my_log_file `
 
 	} || {
 		echo $(date "+%F > %T")': Error during Graphic_alignment execution in sample alignment.' >> $my_log_file
+		stage_fail
 		av_rd=20			#SDL - simple bypass
 		#exit_code=1
 		#echo $exit_code
 		#exit
 	}
+	stage_done
+}
+
+
+##################################################################################################################################################################################
+#																																												 #
+#																																												 #
+#																	SAMPLES PROCESSING FUNCTION																					 #
+#																																												 #
+#																																												 #
+##################################################################################################################################################################################
+
+# The problem and the control samples do not depend on each other until their VA files are compared, so
+# both are processed at the same time, each one with half of the threads of the project
+function get_problem_and_control_va {
+	stage_add problem "" get_problem_va
+	stage_add control "" get_control_va
+	stages_run || {
+		echo $(date "+%F > %T")': Processing of the problem and control samples failed.' >> $my_log_file
+		exit_code=1
+		echo $exit_code
+		exit
+	}
+	echo $(date "+%F > %T")': Processing of the problem and control samples finished.' >> $my_log_file
 }
 
 
@@ -375,8 +389,8 @@ function depth_alignment {
 function cr_analysis {
 
 	# Run vcf filter, selecting snps in the candidate region defined by map-mutation.py, with an alelic frequence > 0.8 and corresponding to EMS mutations
-	{
-		python3 $location/scripts_snp/variants-filter.py -a $f1/F2_control_comparison.va -b $f1/final_variants.va -step 2 -cand_reg_file $f1/map_info.txt -af_min 0.8 -mut_type EMS  2>> $my_log_file
+	stage_skip variants-filter-candidate-region "$f1/F2_control_comparison.va $f1/map_info.txt" "$f1/final_variants.va" "" || {
+		run_python $location/scripts_snp/variants-filter.py -a $f1/F2_control_comparison.va -b $f1/final_variants.va -step 2 -cand_reg_file $f1/map_info.txt -af_min 0.8 -mut_type EMS  2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': Error during the second execution of variants-filter.py .' >> $my_log_file
@@ -384,12 +398,13 @@ function cr_analysis {
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': Second VCF filtering step finished.' >> $my_log_file
 
 	# Create input for varanalyzer and run varanalyzer.py (one file for the candidate region and one for the whole genome)
-	{
-		python3 $location/scripts_snp/snp-to-varanalyzer.py -a $f1/final_variants.va -b $f1/snp-to-varanalyzer.txt  2>> $my_log_file
-		python3 $location/scripts_snp/snp-to-varanalyzer.py -a $f1/F2_control_comparison.va -b $f1/snp-to-varanalyzer-total.txt  2>> $my_log_file
+	stage_skip snp-to-varanalyzer "$f1/final_variants.va $f1/F2_control_comparison.va" "$f1/snp-to-varanalyzer.txt $f1/snp-to-varanalyzer-total.txt" "" || {
+		run_python $location/scripts_snp/snp-to-varanalyzer.py -a $f1/final_variants.va -b $f1/snp-to-varanalyzer.txt  2>> $my_log_file
+		run_python $location/scripts_snp/snp-to-varanalyzer.py -a $f1/F2_control_comparison.va -b $f1/snp-to-varanalyzer-total.txt  2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': Error during execution of snp-to-varanalyzer.py .' >> $my_log_file
@@ -397,11 +412,12 @@ function cr_analysis {
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': Input for varanalyzer finished.' >> $my_log_file
 	# Varanalyzer
-	{
-		python3 $location/varanalyzer/varanalyzer.py -itp snp -con $f1/$my_gs -gff $f0/$my_gff -var $f1/snp-to-varanalyzer.txt -rrl $my_rrl -pname $project_name -ann $f0/$my_ann -out $f1/varanalyzer_output.txt 2>> $my_log_file
-		python3 $location/varanalyzer/varanalyzer.py -itp snp -con $f1/$my_gs -gff $f0/$my_gff -var $f1/snp-to-varanalyzer-total.txt -rrl $my_rrl -pname $project_name -ann $f0/$my_ann -out $f1/varanalyzer_output_total.txt  2>> $my_log_file
+	stage_skip varanalyzer "$f1/$my_gs $f0/$my_gff $f0/$my_ann $f1/snp-to-varanalyzer.txt $f1/snp-to-varanalyzer-total.txt" "$f1/varanalyzer_output.txt $f1/varanalyzer_output_total.txt" "" || {
+		run_python $location/varanalyzer/varanalyzer.py -itp snp -con $f1/$my_gs -gff $f0/$my_gff -var $f1/snp-to-varanalyzer.txt -rrl $my_rrl -pname $project_name -ann $f0/$my_ann -out $f1/varanalyzer_output.txt 2>> $my_log_file
+		run_python $location/varanalyzer/varanalyzer.py -itp snp -con $f1/$my_gs -gff $f0/$my_gff -var $f1/snp-to-varanalyzer-total.txt -rrl $my_rrl -pname $project_name -ann $f0/$my_ann -out $f1/varanalyzer_output_total.txt  2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': Error during execution of varanalyzer.py .' >> $my_log_file
@@ -409,21 +425,26 @@ function cr_analysis {
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': Varanalyzer finished.' >> $my_log_file
 
 	# Run primer generation script
-	{
-		python3 $location/primers/primer-generation.py -file $f1/varanalyzer_output.txt -fasta $f1/$my_gs -out $f1/primer_generation_output.txt  -mode 2   2>> $my_log_file
-		python3 $location/primers/primer-generation.py -file $f1/varanalyzer_output_total.txt -fasta $f1/$my_gs -out $f1/primer_generation_output_total.txt  -mode 2   2>> $my_log_file
+	stage_skip primer-generation "$f1/$my_gs $f1/varanalyzer_output.txt $f1/varanalyzer_output_total.txt" "$f1/primer_generation_output.txt $f1/primer_generation_output_total.txt" "" || {
+		run_python $location/primers/primer-generation.py -file $f1/varanalyzer_output.txt -fasta $f1/$my_gs -out $f1/primer_generation_output.txt  -mode 2   2>> $my_log_file
+		run_python $location/primers/primer-generation.py -file $f1/varanalyzer_output_total.txt -fasta $f1/$my_gs -out $f1/primer_generation_output_total.txt  -mode 2   2>> $my_log_file
 
 	}|| {
 		echo $(date "+%F > %T")': primer-generation.py failed.'>> $my_log_file
 	}
+	stage_done
 	echo $(date "+%F > %T")': primer-generation.py finished.' >> $my_log_file
 	
 	# Run extend-snp-variants-info                                              --project-name $project_name
-	result_extend_snp_info=`python3 $location/scripts_snp/extend-snp-variants-info.py  --variants $f1/primer_generation_output.txt --snp-info $f1/snp-to-varanalyzer.txt --project-name $project_name --map-info $f1/map_info.txt --output-file $f3/candidate_variants.txt --region CR 2>> $my_log_file`
-	result_extend_snp_info=`python3 $location/scripts_snp/extend-snp-variants-info.py  --variants $f1/primer_generation_output_total.txt --snp-info $f1/snp-to-varanalyzer-total.txt --project-name $project_name --map-info $f1/map_info.txt --output-file $f3/candidate_variants_total.txt --region total 2>> $my_log_file`
+	stage_skip extend-snp-variants-info "$f1/primer_generation_output.txt $f1/primer_generation_output_total.txt $f1/map_info.txt" "" "" || {
+		result_extend_snp_info=`run_python $location/scripts_snp/extend-snp-variants-info.py  --variants $f1/primer_generation_output.txt --snp-info $f1/snp-to-varanalyzer.txt --project-name $project_name --map-info $f1/map_info.txt --output-file $f3/candidate_variants.txt --region CR 2>> $my_log_file`
+		result_extend_snp_info=`run_python $location/scripts_snp/extend-snp-variants-info.py  --variants $f1/primer_generation_output_total.txt --snp-info $f1/snp-to-varanalyzer-total.txt --project-name $project_name --map-info $f1/map_info.txt --output-file $f3/candidate_variants_total.txt --region total 2>> $my_log_file`
+	}
+	stage_done
 	
 	if [ $result_extend_snp_info == 'success' ]; then
 		echo $(date "+%F > %T")": extend-snp-variants-info.py finished." >> $my_log_file
@@ -435,8 +456,8 @@ function cr_analysis {
 	fi
 	
 	# Filter SNPs to draw
-	{
-		python3 $location/scripts_snp/variants-filter.py -a $f1/$1 -b $f1/F2_control_comparison_drawn.va -step 1 -af_min $2   2>> $my_log_file
+	stage_skip variants-filter-drawn "$f1/$1" "$f1/F2_control_comparison_drawn.va" "$2" || {
+		run_python $location/scripts_snp/variants-filter.py -a $f1/$1 -b $f1/F2_control_comparison_drawn.va -step 1 -af_min $2   2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': Error during third execution of variants-filter.py . ' >> $my_log_file
@@ -444,11 +465,12 @@ function cr_analysis {
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': Third VCF filtering step finished.' >> $my_log_file
 
 	# Draw candidates 
-	{
-		python3 $location/graphic_output/graphic-output.py -my_mut af_candidates -asnp $f1/F2_control_comparison.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $project_name  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+	stage_skip graphic-output-candidates "$f1/F2_control_comparison.va $f1/$my_gs" "" "" || {
+		run_python $location/graphic_output/graphic-output.py -my_mut af_candidates -asnp $f1/F2_control_comparison.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $project_name  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
 		
 	} || {
 		echo $(date "+%F > %T")': Error during execution of graphic-output.py .' >> $my_log_file
@@ -456,12 +478,13 @@ function cr_analysis {
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': Graphic output created.' >> $my_log_file
 
 	# python3 ./graphic_output/graphic-output.py -my_mut snp -asnp ./user_projects/project/1_intermediate_files/F2_control_comparison_drawn.va -bsnp ./user_projects/project/1_intermediate_files/gnm_ref_merged/genome.fa -rrl 150 -iva ./user_projects/project/1_intermediate_files/varanalyzer_output.txt -gff ./user_data/complete.gff -pname user_projects/project  -cross bc -snp_analysis_type par  
 	# (6) Create graphic output
-	{
-		python3 $location/graphic_output/graphic-output.py -my_mut $my_mut  -interval_width $interval_width  -asnp $f1/F2_control_comparison_drawn.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $project_name/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $project_name  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+	stage_skip graphic-output "$f1/F2_control_comparison_drawn.va $f1/varanalyzer_output.txt $f1/$my_gs" "" "" || {
+		run_python $location/graphic_output/graphic-output.py -my_mut $my_mut  -interval_width $interval_width  -asnp $f1/F2_control_comparison_drawn.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $project_name/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $project_name  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
 		
 	} || {
 		echo $(date "+%F > %T")': Error during execution of graphic-output.py .' >> $my_log_file
@@ -469,6 +492,7 @@ function cr_analysis {
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': Graphic output created.' >> $my_log_file
 
 	# (7) Create report
@@ -482,8 +506,8 @@ function cr_analysis {
 		echo $(date "+%F > %T")': Error during zip compression of report images. Please check that the zip program is installed in your system. Continuing anyway.' >> $my_log_file
 	}
 
-	{
-		python3 $location/graphic_output/report.py -files_dir $f3 -variants $f3/candidate_variants.txt -log $f2/log.log -output_html $f3/report.html -project $project_name -mut_type $my_mut  2>> $my_log_file
+	stage_skip report "$f3/candidate_variants.txt" "" "" || {
+		run_python $location/graphic_output/report.py -files_dir $f3 -variants $f3/candidate_variants.txt -log $f2/log.log -output_html $f3/report.html -project $project_name -mut_type $my_mut  2>> $my_log_file
 		
 	} || {
 		echo $(date "+%F > %T")': Error during report generation.' >> $my_log_file
@@ -491,6 +515,7 @@ function cr_analysis {
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': Report file created.' >> $my_log_file
 }
 
@@ -513,17 +538,19 @@ if [ $my_pseq == mut ] && [ $my_cross == bc ]  && [ $snp_analysis_type == par ]
 then
 
 	# (1) Get problem and control VA files
-	get_problem_va 
-	get_control_va
+	get_problem_and_control_va
 
 	#draw snps
-	python3 $location/graphic_output/graphic-output.py -my_mut af_control -asnp $f1/control_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
-	python3 $location/graphic_output/graphic-output.py -my_mut af_sample -asnp $f1/F2_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+	stage_skip graphic-output-af "$f1/control_filtered.va $f1/F2_filtered.va $f1/$my_gs" "" "" || {
+		run_python $location/graphic_output/graphic-output.py -my_mut af_control -asnp $f1/control_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+		run_python $location/graphic_output/graphic-output.py -my_mut af_sample -asnp $f1/F2_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+	}
+	stage_done
 
 	# (2) Run VA operations: Remove control SNPs from problem file
 	my_operation_mode=A
-	{
-		python3 $location/scripts_snp/variants-operations.py -a $f1/F2_filtered.va -b $f1/control_filtered.va -c $f1/F2_control_comparison.va -mode $my_operation_mode -primary 1  2>> $my_log_file
+	stage_skip variants-operations "$f1/F2_filtered.va $f1/control_filtered.va" "$f1/F2_control_comparison.va" "$my_operation_mode" || {
+		run_python $location/scripts_snp/variants-operations.py -a $f1/F2_filtered.va -b $f1/control_filtered.va -c $f1/F2_control_comparison.va -mode $my_operation_mode -primary 1  2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': Error during first execution of variants-operations.py .' >> $my_log_file
@@ -531,6 +558,7 @@ then
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': VCF operations finished.' >> $my_log_file
 
 	# (3) Run mapping analysis
@@ -538,8 +566,8 @@ then
 
 	if [ $(wc -l < $f1/F2_control_comparison.va) -gt 1 ]
 	then 
-		{
-			python3 $location/scripts_snp/map-mutation.py -file $f1/F2_control_comparison.va -fasta $f1/$my_gs -mode $my_analysis_mode -window_size 600000 -window_space 500000 -output $f1/map_info.txt -control_modality $my_mutbackgroud -interval_width $interval_width -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+		stage_skip map-mutation "$f1/F2_control_comparison.va $f1/$my_gs" "$f1/map_info.txt $f1/map_sweep.txt" "$my_analysis_mode $my_mutbackgroud $interval_width" || {
+			run_python $location/scripts_snp/map-mutation.py -file $f1/F2_control_comparison.va -fasta $f1/$my_gs -mode $my_analysis_mode -window_size 600000 -window_space 500000 -output $f1/map_info.txt -control_modality $my_mutbackgroud -interval_width $interval_width -snp_analysis_type $snp_analysis_type -sweep 600000:500000 350000:250000 250000:25000 -sweep_output $f1/map_sweep.txt -threads $threads  2>> $my_log_file
 
 		} || {
 			echo $(date "+%F > %T")': Error during execution of map-mutation.py .' >> $my_log_file
@@ -547,6 +575,7 @@ then
 			echo $exit_code
 			exit
 		}
+		stage_done
 		echo $(date "+%F > %T")': Mutation mapping module finished.' >> $my_log_file
 
 		# (4) Candidate region analysis function
@@ -572,28 +601,20 @@ if [ $my_cross == bc ]  && [ $snp_analysis_type == f2wt ]
 then
 
 	# (1) Get problem and control VA files
-	get_problem_va
-	get_control_va
+	get_problem_and_control_va
 
 	#draw snps
-	python3 $location/graphic_output/graphic-output.py -my_mut af_control -asnp $f1/control_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
-	python3 $location/graphic_output/graphic-output.py -my_mut af_sample -asnp $f1/F2_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
-
-	# (2) Run VA filter: eliminate SNPs with FA > 0.5 from control reads
-	{
-		python3 $location/scripts_snp/variants-filter.py -a $f1/control_filtered.va -b $f1/control_filtered2.va -step 3 -fasta $f1/$my_gs -af_max 0.5 2>> $my_log_file
-
-	} || {
-		echo $(date "+%F > %T")': Error during execution of variants-filter.py with control data.' >> $my_log_file
-		exit_code=1
-		echo $exit_code
-		exit
+	stage_skip graphic-output-af "$f1/control_filtered.va $f1/F2_filtered.va $f1/$my_gs" "" "" || {
+		run_python $location/graphic_output/graphic-output.py -my_mut af_control -asnp $f1/control_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+		run_python $location/graphic_output/graphic-output.py -my_mut af_sample -asnp $f1/F2_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
 	}
-	echo $(date "+%F > %T")': First VCF filtering step of control data finished.' >> $my_log_file
+	stage_done
+
+	# (2) VA filter to eliminate SNPs with FA > 0.5 from control reads: control_filtered2.va is written by get_control_va
 
 	# (3) Run af-comparison: Intersection of filtered control SNPs with problem reads: outputs VA file with 4 columns of allele absolute frequence
-	{
-		python3 $location/scripts_snp/af-comparison.py -mode $my_mutbackgroud -f2_mut $f1/F2_filtered.va -f2_wt $f1/control_filtered2.va -out $f1/F2_control_comparison.va -f_input $f1/$my_gs -step 1 2>> $my_log_file 
+	stage_skip af-comparison "$f1/F2_filtered.va $f1/control_filtered2.va $f1/$my_gs" "$f1/F2_control_comparison.va" "$my_mutbackgroud" || {
+		run_python $location/scripts_snp/af-comparison.py -mode $my_mutbackgroud -f2_mut $f1/F2_filtered.va -f2_wt $f1/control_filtered2.va -out $f1/F2_control_comparison.va -f_input $f1/$my_gs -step 1 2>> $my_log_file 
 
 	} || {
 		echo $(date "+%F > %T")': Error during execution of af_comparison.py .' >> $my_log_file
@@ -601,6 +622,7 @@ then
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': Allelic frequence comparison finished.' >> $my_log_file
 
 	# (4) Run mapping analysis
@@ -608,8 +630,8 @@ then
 
 	if [ $(wc -l < $f1/F2_control_comparison.va) -gt 1 ]
 	then 
-		{
-			python3 $location/scripts_snp/map-mutation.py -file $f1/F2_control_comparison.va -fasta $f1/$my_gs -mode $my_analysis_mode -window_size 350000 -window_space 250000 -output $f1/map_info.txt -control_modality $my_mutbackgroud -interval_width $interval_width -snp_analysis_type par  2>> $my_log_file
+		stage_skip map-mutation "$f1/F2_control_comparison.va $f1/$my_gs" "$f1/map_info.txt $f1/map_sweep.txt" "$my_analysis_mode $my_mutbackgroud $interval_width" || {
+			run_python $location/scripts_snp/map-mutation.py -file $f1/F2_control_comparison.va -fasta $f1/$my_gs -mode $my_analysis_mode -window_size 350000 -window_space 250000 -output $f1/map_info.txt -control_modality $my_mutbackgroud -interval_width $interval_width -snp_analysis_type par -sweep 600000:500000 350000:250000 250000:25000 -sweep_output $f1/map_sweep.txt -threads $threads  2>> $my_log_file
 
 		} || {
 			echo $(date "+%F > %T")': Error during execution of map-mutation.py .' >> $my_log_file
@@ -617,11 +639,12 @@ then
 			echo $exit_code
 			exit
 		}
+		stage_done
 		echo $(date "+%F > %T")': Mutation mapping module finished.' >> $my_log_file
 
 		# (5) Re-write F2_control_comparison.va
-		{
-			python3 $location/scripts_snp/af-comparison.py -mode $my_mutbackgroud -f2_mut $f1/F2_filtered.va -f2_wt $f1/control_filtered2.va -out $f1/F2_control_comparison.va -f_input $f1/$my_gs -step 2 2>> $my_log_file 
+		stage_skip af-comparison-rewrite "$f1/F2_filtered.va $f1/control_filtered2.va $f1/$my_gs" "$f1/F2_control_comparison.va" "$my_mutbackgroud" || {
+			run_python $location/scripts_snp/af-comparison.py -mode $my_mutbackgroud -f2_mut $f1/F2_filtered.va -f2_wt $f1/control_filtered2.va -out $f1/F2_control_comparison.va -f_input $f1/$my_gs -step 2 2>> $my_log_file 
 
 		} || {
 			echo $(date "+%F > %T")': Error during execution of af_comparison.py .' >> $my_log_file
@@ -629,12 +652,13 @@ then
 			echo $exit_code
 			exit
 		}
+		stage_done
 		echo $(date "+%F > %T")': Allelic frequence comparison finished.' >> $my_log_file
 
 		# Filler SNPs: AFs between 0.2 and 0.8 present in both samples, only for drawing 
 
-		{
-			python3 $location/scripts_snp/af-comparison.py -mode $my_mutbackgroud -f2_mut $f1/F2_filtered.va -f2_wt $f1/control_filtered.va -out $f1/filler_variants.va -f_input $f1/$my_gs -step 3 2>> $my_log_file 
+		stage_skip af-comparison-filler "$f1/F2_filtered.va $f1/control_filtered.va $f1/$my_gs" "$f1/filler_variants.va" "$my_mutbackgroud" || {
+			run_python $location/scripts_snp/af-comparison.py -mode $my_mutbackgroud -f2_mut $f1/F2_filtered.va -f2_wt $f1/control_filtered.va -out $f1/filler_variants.va -f_input $f1/$my_gs -step 3 2>> $my_log_file 
 
 		} || {
 			echo $(date "+%F > %T")': Error during execution of af_comparison.py .' >> $my_log_file
@@ -642,6 +666,7 @@ then
 			echo $exit_code
 			exit
 		}
+		stage_done
 		echo $(date "+%F > %T")': Allelic frequence comparison finished.' >> $my_log_file
 
 		# (7) Candidate region analysis funtion
@@ -666,17 +691,19 @@ if [ $my_mutbackgroud == ref ] && [ $my_pseq == mut ] && [ $my_cross == oc ]  &&
 then
 
 	# (1) Get problem and control VA files
-	get_problem_va
-	get_control_va
+	get_problem_and_control_va
 
 	#draw snps
-	python3 $location/graphic_output/graphic-output.py -my_mut af_control -asnp $f1/control_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
-	python3 $location/graphic_output/graphic-output.py -my_mut af_sample -asnp $f1/F2_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+	stage_skip graphic-output-af "$f1/control_filtered.va $f1/F2_filtered.va $f1/$my_gs" "" "" || {
+		run_python $location/graphic_output/graphic-output.py -my_mut af_control -asnp $f1/control_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+		run_python $location/graphic_output/graphic-output.py -my_mut af_sample -asnp $f1/F2_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+	}
+	stage_done
 
 	# (2) Run VA operations: Remove control SNPs from problem file
 	my_operation_mode=A
-	{
-		python3 $location/scripts_snp/variants-operations.py -a $f1/F2_filtered.va -b $f1/control_filtered.va -c $f1/F2_control_comparison.va -mode $my_operation_mode -primary 1  2>> $my_log_file
+	stage_skip variants-operations "$f1/F2_filtered.va $f1/control_filtered.va" "$f1/F2_control_comparison.va" "$my_operation_mode" || {
+		run_python $location/scripts_snp/variants-operations.py -a $f1/F2_filtered.va -b $f1/control_filtered.va -c $f1/F2_control_comparison.va -mode $my_operation_mode -primary 1  2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': Error during first execution of variants-operations.py .' >> $my_log_file
@@ -684,6 +711,7 @@ then
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': VCF operations finished.' >> $my_log_file
 
 	# (3) Run mapping analysis
@@ -691,8 +719,8 @@ then
 
 	if [ $(wc -l < $f1/F2_control_comparison.va) -gt 1 ]
 	then 
-		{
-			python3 $location/scripts_snp/map-mutation.py -file $f1/F2_control_comparison.va -fasta $f1/$my_gs -mode $my_analysis_mode -window_size 250000 -window_space 25000 -output $f1/map_info.txt -control_modality $my_mutbackgroud -interval_width $interval_width -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+		stage_skip map-mutation "$f1/F2_control_comparison.va $f1/$my_gs" "$f1/map_info.txt $f1/map_sweep.txt" "$my_analysis_mode $my_mutbackgroud $interval_width" || {
+			run_python $location/scripts_snp/map-mutation.py -file $f1/F2_control_comparison.va -fasta $f1/$my_gs -mode $my_analysis_mode -window_size 250000 -window_space 25000 -output $f1/map_info.txt -control_modality $my_mutbackgroud -interval_width $interval_width -snp_analysis_type $snp_analysis_type -sweep 600000:500000 350000:250000 250000:25000 -sweep_output $f1/map_sweep.txt -threads $threads  2>> $my_log_file
 
 
 		} || {
@@ -701,6 +729,7 @@ then
 			echo $exit_code
 			exit
 		}
+		stage_done
 		echo $(date "+%F > %T")': Mutation mapping module finished.' >> $my_log_file
 
 		# (4) Candidate region analysis function
@@ -727,27 +756,22 @@ then
 	# (1) Get control VA file
 	get_control_va
 
-	# (2) Run vcf filter to get SNPs with af > 0.75
-	{
-		python3 $location/scripts_snp/variants-filter.py -a $f1/control_filtered.va -b $f1/control_filtered2.va -step 3 -fasta $f1/$my_gs -af_min 0.75  2>> $my_log_file
+	# (2) VA filter to get SNPs with af > 0.75: control_filtered2.va is written by get_control_va
+	stage_skip graphic-output-af-control "$f1/control_filtered2.va $f1/$my_gs" "" "" || {
 		#draw snps
-		python3 $location/graphic_output/graphic-output.py -my_mut af_control -asnp $f1/control_filtered2.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
-
-	} || {
-		echo $(date "+%F > %T")': Error during the second execution of variants-filter.py .' >> $my_log_file
-		exit_code=1
-		echo $exit_code
-		exit
+		run_python $location/graphic_output/graphic-output.py -my_mut af_control -asnp $f1/control_filtered2.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
 	}
-	echo $(date "+%F > %T")': Second VCF filtering step finished.' >> $my_log_file
+	stage_done
 
 
 	# (3) Change ref seq, generate a "noref genome"
-	{
-		python3 $location/scripts_snp/change-snp.py -var $f1/control_filtered2.va  -gnm_ref $f1/$my_gs -out $f1/gnm_ref_merged/genome2.fa  2>> $my_log_file
+	stage_skip change-snp "$f1/control_filtered2.va" "$f1/$my_gs" "" || {
+		run_python $location/scripts_snp/change-snp.py -var $f1/control_filtered2.va  -gnm_ref $f1/$my_gs -out $f1/gnm_ref_merged/genome2.fa  2>> $my_log_file
 	
 		rm -rf $f1/$my_gs
 		mv $f1/gnm_ref_merged/genome2.fa $f1/gnm_ref_merged/genome.fa
+		mv $f1/gnm_ref_merged/genome2.fa.fai $f1/gnm_ref_merged/genome.fa.fai
+		mv $f1/gnm_ref_merged/genome2.fa.stats $f1/gnm_ref_merged/genome.fa.stats
 
 	} || {
 		echo $(date "+%F > %T")': Error during first execution of variants-operations.py .' >> $my_log_file
@@ -755,18 +779,22 @@ then
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': VCF operations finished.' >> $my_log_file
 
 	# (4) Get problem VA file
 	get_problem_va
 
 	#draw snps
-	python3 $location/graphic_output/graphic-output.py -my_mut af_sample -asnp $f1/F2_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+	stage_skip graphic-output-af "$f1/F2_filtered.va $f1/$my_gs" "" "" || {
+		run_python $location/graphic_output/graphic-output.py -my_mut af_sample -asnp $f1/F2_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+	}
+	stage_done
 
 	# (5) Run VA operations: Intersection to get SNPs for mapping the mutation
 	my_operation_mode=I
-	{
-		python3 $location/scripts_snp/variants-operations.py -a $f1/F2_filtered.va -b $f1/control_filtered2.va -c $f1/F2_control_comparison_mapping.va -mode $my_operation_mode -primary 1  2>> $my_log_file
+	stage_skip variants-operations-mapping "$f1/F2_filtered.va $f1/control_filtered2.va" "$f1/F2_control_comparison_mapping.va" "$my_operation_mode" || {
+		run_python $location/scripts_snp/variants-operations.py -a $f1/F2_filtered.va -b $f1/control_filtered2.va -c $f1/F2_control_comparison_mapping.va -mode $my_operation_mode -primary 1  2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': Error during first execution of variants-operations.py .' >> $my_log_file
@@ -774,6 +802,7 @@ then
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': VCF operations finished.' >> $my_log_file
 
 	# (6) Run mapping analysis
@@ -781,8 +810,8 @@ then
 
 	if [ $(wc -l < $f1/F2_control_comparison_mapping.va) -gt 1 ]
 	then 
-		{
-			python3 $location/scripts_snp/map-mutation.py -file $f1/F2_control_comparison_mapping.va -fasta $f1/$my_gs -mode $my_analysis_mode -window_size 250000 -window_space 25000 -output $f1/map_info.txt -control_modality noref -interval_width $interval_width -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+		stage_skip map-mutation "$f1/F2_control_comparison_mapping.va $f1/$my_gs" "$f1/map_info.txt $f1/map_sweep.txt" "$my_analysis_mode $my_mutbackgroud $interval_width" || {
+			run_python $location/scripts_snp/map-mutation.py -file $f1/F2_control_comparison_mapping.va -fasta $f1/$my_gs -mode $my_analysis_mode -window_size 250000 -window_space 25000 -output $f1/map_info.txt -control_modality noref -interval_width $interval_width -snp_analysis_type $snp_analysis_type -sweep 600000:500000 350000:250000 250000:25000 -sweep_output $f1/map_sweep.txt -threads $threads  2>> $my_log_file
 
 		} || {
 			echo $(date "+%F > %T")': Error during execution of map-mutation.py .' >> $my_log_file
@@ -790,12 +819,13 @@ then
 			echo $exit_code
 			exit
 		}
+		stage_done
 		echo $(date "+%F > %T")': Mutation mapping module finished.' >> $my_log_file
 
 		# (7) Run VA operations: Remove control SNPs from problem file 
 		my_operation_mode=A
-		{
-			python3 $location/scripts_snp/variants-operations.py -a $f1/F2_filtered.va -b $f1/control_filtered.va -c $f1/F2_control_comparison.va -mode $my_operation_mode -primary 1  2>> $my_log_file
+		stage_skip variants-operations "$f1/F2_filtered.va $f1/control_filtered.va" "$f1/F2_control_comparison.va" "$my_operation_mode" || {
+			run_python $location/scripts_snp/variants-operations.py -a $f1/F2_filtered.va -b $f1/control_filtered.va -c $f1/F2_control_comparison.va -mode $my_operation_mode -primary 1  2>> $my_log_file
 			#draw snps
 			#python3 $location/graphic_output/graphic-output.py -my_mut af_candidates -asnp $f1/F2_control_comparison.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  
 
@@ -805,6 +835,7 @@ then
 			echo $exit_code
 			exit
 		}
+		stage_done
 		echo $(date "+%F > %T")': VCF operations finished.' >> $my_log_file
 
 		# (8) Candidate region analysis function
@@ -828,17 +859,19 @@ if [ $my_mutbackgroud == noref ] && [ $my_pseq == mut ] && [ $my_cross == oc ]
 then
 
 	# (1) Get problem and control VA files
-	get_problem_va
-	get_control_va
+	get_problem_and_control_va
 
 	#draw snps
-	python3 $location/graphic_output/graphic-output.py -my_mut af_control -asnp $f1/control_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
-	python3 $location/graphic_output/graphic-output.py -my_mut af_sample -asnp $f1/F2_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+	stage_skip graphic-output-af "$f1/control_filtered.va $f1/F2_filtered.va $f1/$my_gs" "" "" || {
+		run_python $location/graphic_output/graphic-output.py -my_mut af_control -asnp $f1/control_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+		run_python $location/graphic_output/graphic-output.py -my_mut af_sample -asnp $f1/F2_filtered.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+	}
+	stage_done
 
 	# (2) Run VA operations: Intersection to get mapping SNPs
 	my_operation_mode=I
-	{
-		python3 $location/scripts_snp/variants-operations.py -a $f1/F2_filtered.va -b $f1/control_filtered.va -c $f1/F2_control_comparison_mapping.va -mode $my_operation_mode -primary 1  2>> $my_log_file
+	stage_skip variants-operations-mapping "$f1/F2_filtered.va $f1/control_filtered.va" "$f1/F2_control_comparison_mapping.va" "$my_operation_mode" || {
+		run_python $location/scripts_snp/variants-operations.py -a $f1/F2_filtered.va -b $f1/control_filtered.va -c $f1/F2_control_comparison_mapping.va -mode $my_operation_mode -primary 1  2>> $my_log_file
 
 	} || {
 		echo $(date "+%F > %T")': Error during first execution of variants-operations.py .' >> $my_log_file
@@ -846,6 +879,7 @@ then
 		echo $exit_code
 		exit
 	}
+	stage_done
 	echo $(date "+%F > %T")': VCF operations finished.' >> $my_log_file
 
 	# (3) Run mapping analysis
@@ -854,8 +888,8 @@ then
 
 	if [ $(wc -l < $f1/F2_control_comparison_mapping.va) -gt 1 ]
 	then 
-		{
-			python3 $location/scripts_snp/map-mutation.py -file $f1/F2_control_comparison_mapping.va -fasta $f1/$my_gs -mode $my_analysis_mode -window_size 250000 -window_space 25000 -output $f1/map_info.txt -control_modality $my_mutbackgroud -interval_width $interval_width -snp_analysis_type $snp_analysis_type  2>> $my_log_file
+		stage_skip map-mutation "$f1/F2_control_comparison_mapping.va $f1/$my_gs" "$f1/map_info.txt $f1/map_sweep.txt" "$my_analysis_mode $my_mutbackgroud $interval_width" || {
+			run_python $location/scripts_snp/map-mutation.py -file $f1/F2_control_comparison_mapping.va -fasta $f1/$my_gs -mode $my_analysis_mode -window_size 250000 -window_space 25000 -output $f1/map_info.txt -control_modality $my_mutbackgroud -interval_width $interval_width -snp_analysis_type $snp_analysis_type -sweep 600000:500000 350000:250000 250000:25000 -sweep_output $f1/map_sweep.txt -threads $threads  2>> $my_log_file
 
 		} || {
 			echo $(date "+%F > %T")': Error during execution of map-mutation.py .' >> $my_log_file
@@ -863,13 +897,14 @@ then
 			echo $exit_code
 			exit
 		}
+		stage_done
 		echo $(date "+%F > %T")': Mutation mapping module finished.' >> $my_log_file
 
 
 		# (4) Run VA operations: Remove control SNPs from problem
 		my_operation_mode=A
-		{
-			python3 $location/scripts_snp/variants-operations.py -a $f1/F2_filtered.va -b $f1/control_filtered.va -c $f1/F2_control_comparison.va -mode $my_operation_mode -primary 1  2>> $my_log_file
+		stage_skip variants-operations "$f1/F2_filtered.va $f1/control_filtered.va" "$f1/F2_control_comparison.va" "$my_operation_mode" || {
+			run_python $location/scripts_snp/variants-operations.py -a $f1/F2_filtered.va -b $f1/control_filtered.va -c $f1/F2_control_comparison.va -mode $my_operation_mode -primary 1  2>> $my_log_file
 			#draw snps
 			#python3 $location/graphic_output/graphic-output.py -my_mut af_candidates -asnp $f1/F2_control_comparison.va -bsnp $f1/$my_gs -rrl $my_rrl -iva $2/1_intermediate_files/varanalyzer_output.txt -gff $f0/$my_gff -pname $2  -cross $my_cross -snp_analysis_type $snp_analysis_type  
 
@@ -879,6 +914,7 @@ then
 			echo $exit_code
 			exit
 		}
+		stage_done
 		echo $(date "+%F > %T")': VCF operations finished.' >> $my_log_file
 
 		# (5) Candidate region analysis function